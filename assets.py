@@ -0,0 +1,230 @@
+"""
+In-memory static assets: loaded once, served with strong ETags and precompressed variants
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from aiohttp import web
+
+from cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are kept
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content codings we precompress, most preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+@dataclass
+class AssetConfig:
+    root: str = 'static'
+    watch: bool = False           # Poll the directory and reload changed files
+    watch_interval: float = 2.0   # Seconds between polls
+    max_memory_bytes: int = 1024 * 1024  # Larger files are sent from disk with sendfile
+    min_compress_bytes: int = 256        # Smaller files are not worth a variant
+
+def parse_accept_encoding(value: Optional[str]) -> Dict[str, float]:
+    """{coding: qvalue} from an Accept-Encoding header (lowercased codings)"""
+    accepted = {}
+    if not value:
+        return accepted
+    for part in value.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        name, _, argument = params.strip().partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                q = float(argument)
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """The acceptable coding with the highest qvalue (ties go to the earlier one), or None for identity"""
+    accepted = parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def compress(coding: str, body: bytes) -> bytes:
+    if coding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)  # mtime=0 keeps the bytes (and ETag) stable
+
+class Asset:
+    """One file: its bytes and compressed variants, or just its stat for sendfile"""
+    __slots__ = ('path', 'content_type', 'size', 'mtime_ns', 'etag', 'body', 'variants')
+
+    def __init__(self, path: str, content_type: str, size: int, mtime_ns: int):
+        self.path = path
+        self.content_type = content_type
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # Same format as aiohttp's FileResponse, so on-disk files validate either way
+        self.etag = f'"{mtime_ns:x}-{size:x}"'
+        self.body: Optional[bytes] = None  # None: too large to keep, served from disk
+        self.variants: Dict[str, Tuple[bytes, str]] = {}  # coding -> (body, etag)
+
+    @property
+    def memory_bytes(self) -> int:
+        if self.body is None:
+            return 0
+        return len(self.body) + sum(len(body) for body, _ in self.variants.values())
+
+def load_asset(path: str, config: AssetConfig) -> Asset:
+    """Read and precompress one file (blocking; runs at startup or in a thread)"""
+    stat = os.stat(path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        content_type += '; charset=utf-8'
+    asset = Asset(path, content_type, stat.st_size, stat.st_mtime_ns)
+    if stat.st_size > config.max_memory_bytes:
+        return asset
+    with open(path, 'rb') as f:
+        asset.body = f.read()
+    digest = hashlib.blake2b(asset.body, digest_size=12).hexdigest()
+    asset.etag = f'"{digest}"'
+    if compressible(content_type) and asset.size >= config.min_compress_bytes:
+        for coding in ENCODINGS:
+            body = compress(coding, asset.body)
+            if len(body) < asset.size:
+                asset.variants[coding] = (body, f'"{digest}-{coding}"')
+    return asset
+
+class StaticAssets:
+    """Serves a directory from memory
+
+    Every file under `root` is read once (load() at startup); small files are
+    kept in memory along with gzip (and brotli, if installed) variants, and
+    requests are answered without touching the disk or blocking the event
+    loop. Each representation has its own strong ETag, so If-None-Match gets
+    a 304. Files over max_memory_bytes are only stat'ed and go out through
+    FileResponse, which uses sendfile. Only names found by the scan are ever
+    served, so request paths cannot escape `root`.
+    """
+
+    def __init__(self, config: Optional[AssetConfig] = None):
+        self.config = config or AssetConfig()
+        self.assets: Dict[str, Asset] = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.sendfile = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _scan(self) -> Dict[str, Tuple[str, int, int]]:
+        """{name: (path, size, mtime_ns)} for every file under root, names relative with '/'"""
+        found = {}
+        root = self.config.root
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                found[name] = (path, stat.st_size, stat.st_mtime_ns)
+        return found
+
+    def _reload(self, current: Dict[str, Asset]) -> Optional[Dict[str, Asset]]:
+        """A new table with changed files re-read, or None if nothing changed (blocking)"""
+        found = self._scan()
+
+        def stale(name, size, mtime_ns):
+            asset = current.get(name)
+            return asset is None or (asset.size, asset.mtime_ns) != (size, mtime_ns)
+
+        if len(found) == len(current) and not any(stale(name, size, mtime_ns)
+                                                  for name, (_, size, mtime_ns) in found.items()):
+            return None
+        assets = {}
+        for name, (path, size, mtime_ns) in found.items():
+            if stale(name, size, mtime_ns):
+                try:
+                    assets[name] = load_asset(path, self.config)
+                except OSError as e:
+                    logger.warning(f"Could not load static asset {path}: {e}")
+            else:
+                assets[name] = current[name]
+        return assets
+
+    def load(self):
+        """Read the whole directory (blocking; call before serving)"""
+        self.assets = self._reload({}) or {}
+        logger.info(f"Loaded {len(self.assets)} static assets from {self.config.root}")
+
+    async def watch(self):
+        """Poll for changes and swap in a new table; file reads happen off the event loop"""
+        while True:
+            await asyncio.sleep(self.config.watch_interval)
+            try:
+                assets = await asyncio.to_thread(self._reload, self.assets)
+            except Exception as e:
+                logger.error(f"Static asset reload failed: {e}")
+                continue
+            if assets is not None:
+                self.assets = assets
+                self.reloads += 1
+                logger.info(f"Reloaded static assets ({len(assets)} files)")
+
+    def serve(self, request: web.Request, name: str) -> Optional[web.StreamResponse]:
+        """Response for asset `name`, or None if there is no such asset"""
+        asset = self.assets.get(name)
+        if asset is None:
+            self.misses += 1
+            return None
+        headers = {'Cache-Control': 'no-cache'}
+        if asset.body is None:
+            self.sendfile += 1
+            return web.FileResponse(asset.path, headers=headers)
+
+        body, etag = asset.body, asset.etag
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+            coding = choose_encoding(request.headers.get('Accept-Encoding'), asset.variants)
+            if coding is not None:
+                body, etag = asset.variants[coding]
+                headers['Content-Encoding'] = coding
+        headers['ETag'] = etag
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            headers.pop('Content-Encoding', None)
+            return web.Response(status=304, headers=headers)
+        self.hits += 1
+        headers['Content-Type'] = asset.content_type
+        return web.Response(body=body, headers=headers)
+
+    def get_stats(self) -> dict:
+        return {
+            "files": len(self.assets),
+            "memory_bytes": sum(asset.memory_bytes for asset in self.assets.values()),
+            "encodings": list(ENCODINGS),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "sendfile": self.sendfile,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
@@ -4,120 +4,367 @@ from aiohttp import web
 import json
 import time
 import hashlib
+import math
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Collection, Dict, List, Optional
 from dataclasses import dataclass, field
 from enum import Enum
 import logging
+from contextlib import AsyncExitStack
+
+from assets import AssetConfig, StaticAssets
+from cache import CONDITIONAL_HEADERS, SAFE_METHODS, STALE, CacheConfig, ResponseCache
+from compression import CompressionConfig, ResponseCompressor
+from coalesce import CoalescingConfig, RequestCoalescer
+from hashing import parse_hash_key, request_hash_key
+from healthcheck import HealthCheckConfig, HealthChecker
+from histogram import LatencyHistogram
+from history import AGGREGATE, StatsHistory
+from selection import PeakEwma, SelectionIndex
+from limiter import LimiterConfig, ConcurrencyLimits, LoadShed
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsExporter
+from outlier import OutlierConfig, OutlierDetector
+from ratelimit import RateLimiter, RateLimitRule
+from retry import RETRY_STATUSES, RetryConfig, RetryPolicy, is_retryable
+from sessions import SessionStore
+from statstream import StatsBroadcaster
+from streaming import StreamingConfig, filter_headers, is_upstream_error, relay_body, request_body, should_stream
+from upstream import UpstreamConfig, UpstreamManager
+from wsproxy import WebSocketConfig, WebSocketProxy, is_websocket
+from workers import ACTIVE, ERRORS, REQUESTS, SharedStats, sync_loop
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def valid_weight(weight) -> bool:
+    """Weights are positive integers (bools are not accepted)"""
+    return isinstance(weight, int) and not isinstance(weight, bool) and weight >= 1
+
+def load_servers(server_file: str) -> List[dict]:
+    """Read the servers file, rejecting entries whose weight the balancer could not use"""
+    with open(server_file) as f:
+        servers = json.load(f)
+    for server in servers:
+        if not valid_weight(server.get('weight', 1)):
+            raise ValueError(f"{server_file}: weight of {server.get('host')}:{server.get('port')} "
+                             f"must be a positive integer, got {server['weight']!r}")
+    return servers
+
 class BalancingAlgorithm(Enum):
     ROUND_ROBIN = "round_robin"
     LEAST_CONNECTIONS = "least_connections"
+    PEAK_EWMA = "peak_ewma"
+    P2C = "p2c"
+    WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+    CONSISTENT_HASH = "consistent_hash"
 
 @dataclass
 class ServerStats:
     host: str
     port: int
+    weight: int = 1
     active_connections: int = 0
     total_requests: int = 0
     total_errors: int = 0
-    response_times: List[float] = field(default_factory=list)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)        # Proxied requests
+    probe_latency: LatencyHistogram = field(default_factory=LatencyHistogram)  # Health probes
+    peak_ewma: PeakEwma = field(default_factory=PeakEwma)
+    retries: int = 0   # Attempts this backend received as a retry
+    hedges: int = 0    # Attempts this backend received as a hedge
     last_health_check: Optional[datetime] = None
     is_healthy: bool = True
+    ejected: bool = False  # Taken out of rotation by the outlier detector
     
     @property
     def avg_response_time(self) -> float:
-        return sum(self.response_times) / len(self.response_times) if self.response_times else 0
+        return self.latency.mean
     
     @property
     def error_rate(self) -> float:
         return (self.total_errors / self.total_requests) if self.total_requests > 0 else 0
 
+class _Claim(AsyncExitStack):
+    """A request's hold on the backend it was routed to (see LoadBalancer._claim)"""
+
+    def __init__(self):
+        super().__init__()
+        self.trial: Optional[str] = None  # Half-open backend whose trial slot is held, until an outcome
+
 class LoadBalancer:
-    def __init__(self, server_file: str, algorithm: BalancingAlgorithm = BalancingAlgorithm.ROUND_ROBIN):
-        with open(server_file) as f:
-            servers_config = json.load(f)
+    def __init__(self, server_file: str, algorithm: BalancingAlgorithm = BalancingAlgorithm.ROUND_ROBIN,
+                 upstream_config: Optional[UpstreamConfig] = None,
+                 streaming: Optional[StreamingConfig] = None,
+                 health_config: Optional[HealthCheckConfig] = None,
+                 hash_key: str = 'ip', hash_table_size: Optional[int] = None,
+                 max_sessions: int = 100_000, session_timeout: int = 3600,
+                 shared: Optional[SharedStats] = None, run_health_checks: bool = True,
+                 cache: Optional[CacheConfig] = None,
+                 coalescing: Optional[CoalescingConfig] = None,
+                 retry: Optional[RetryConfig] = None,
+                 outlier: Optional[OutlierConfig] = None,
+                 limiter: Optional[LimiterConfig] = None,
+                 rate_limits: Optional[List[RateLimitRule]] = None,
+                 stats_interval: float = 1.0, history: bool = True,
+                 static: Optional[AssetConfig] = None,
+                 compression: Optional[CompressionConfig] = None,
+                 websocket: Optional[WebSocketConfig] = None):
+        servers_config = load_servers(server_file)
         
         # Initialize server stats
         self.servers = {}
+        self.algorithm = algorithm
+        # Healthy servers only, updated incrementally
+        self.index = SelectionIndex(hash_table_size, consistent_hash=algorithm == BalancingAlgorithm.CONSISTENT_HASH)
         for server in servers_config:
             key = f"{server['host']}:{server['port']}"
-            self.servers[key] = ServerStats(host=server['host'], port=server['port'])
+            weight = server.get('weight', 1)
+            self.servers[key] = ServerStats(host=server['host'], port=server['port'], weight=weight)
+            self.index.add(key, weight=weight)
         
-        self.current = 0
-        self.algorithm = algorithm
-        self.sessions = {}  # Session persistence: session_id -> server_key
-        self.session_timeout = 3600  # 1 hour session timeout
+        if algorithm == BalancingAlgorithm.CONSISTENT_HASH:
+            self.index.consistent_hash.rebuild()  # At startup rather than on the first request
+        self.hash_key_source, self.hash_key_name = parse_hash_key(hash_key)
+        self.session_timeout = int(session_timeout)  # Idle seconds before a session expires (cookie Max-Age)
+        self.sessions = SessionStore(max_sessions, session_timeout)  # Session persistence: session_id -> server_key
         self._background_tasks = []  # Store background tasks
+        self.upstream_config = upstream_config or UpstreamConfig()
+        self.upstream: Optional[UpstreamManager] = None  # Created in the app startup hook
+        self.streaming = streaming or StreamingConfig()
+        self.latency = LatencyHistogram()        # All proxied requests
+        self.probe_latency = LatencyHistogram()  # All health probes
+        self.health_checker = HealthChecker(self.servers, self.set_server_health, health_config,
+                                            probe_latency=self.probe_latency)
+        # Worker mode: fleet-wide counters and membership live in shared memory,
+        # and only the designated worker runs active health checks
+        self.shared = shared
+        self.run_health_checks = run_health_checks
+        # Optional GET/HEAD response cache, consulted before backend selection
+        self.cache = ResponseCache(cache) if cache else None
+        self._cache_refreshes = set()  # Keeps stale-while-revalidate tasks referenced
+        # Optional singleflight: identical concurrent GET/HEADs share one upstream request
+        self.coalescer = RequestCoalescer(coalescing) if coalescing else None
+        # Optional retries (idempotent requests, budgeted) and hedging
+        self.retry = RetryPolicy(retry) if retry else None
+        # Optional circuit breakers fed by live traffic outcomes
+        self.outliers = OutlierDetector(self.servers, self._eject_server, self._restore_server,
+                                        outlier) if outlier else None
+        # Optional adaptive per-backend concurrency limits with queueing and shedding
+        self.limits = ConcurrencyLimits(limiter) if limiter else None
+        # Optional per-client token buckets, checked before anything else
+        self.rate_limiter = RateLimiter(rate_limits) if rate_limits else None
+        # Live stats for /lb/stats/stream: built once per tick, shared by all subscribers
+        self.stats_stream = StatsBroadcaster(self.build_stats, stats_interval)
+        # Prometheus exposition, rendered from the existing counters on scrape
+        self.metrics = MetricsExporter(self)
+        # Per-backend time series for /lb/stats/history, sampled once a second
+        self.history = StatsHistory() if history else None
+        # Dashboard and static files, served from memory once load() has run
+        self.assets = StaticAssets(static)
+        # Optional gzip/brotli of proxied responses, negotiated per client
+        self.compressor = ResponseCompressor(compression) if compression else None
+        # WebSocket upgrades are tunnelled to a backend and count as active connections
+        self.websockets = WebSocketProxy(websocket)
+        self.tcp = None  # The TcpProxy feeding this balancer in --mode tcp
     
     def start_background_tasks(self):
         """Start background tasks - call this when event loop is running"""
         if not self._background_tasks:
-            self._background_tasks.append(asyncio.create_task(self._health_check_loop()))
-            self._background_tasks.append(asyncio.create_task(self._cleanup_sessions()))
+            if self.run_health_checks:
+                self._background_tasks.append(asyncio.create_task(self.health_checker.run()))
+            if self.shared:
+                self._background_tasks.append(asyncio.create_task(sync_loop(self, self.shared)))
+            self._background_tasks.append(asyncio.create_task(self.sessions.run()))
+            if self.outliers is not None:
+                self._background_tasks.append(asyncio.create_task(self.outliers.run()))
+            if self.history is not None:
+                self._background_tasks.append(asyncio.create_task(self.history.run(self.sample_history)))
+            if self.assets.config.watch:
+                self._background_tasks.append(asyncio.create_task(self.assets.watch()))
+    
+    def start_upstream(self):
+        """Create the keep-alive upstream pools - call this when event loop is running"""
+        if self.upstream is None:
+            self.upstream = UpstreamManager(self.upstream_config)
+            for server in self.servers.values():
+                self.upstream.add_pool(server.host, server.port)
+    
+    async def shutdown(self):
+        """Stop background tasks and close all upstream pools"""
+        for task in self._background_tasks + list(self._cache_refreshes):
+            task.cancel()
+        self._background_tasks = []
+        await self.stats_stream.close()
+        await self.websockets.close()
+        if self.compressor is not None:
+            self.compressor.close()
+        if self.upstream:
+            await self.upstream.close()
+            self.upstream = None
     
     def get_server_key(self, server_stats: ServerStats) -> str:
         return f"{server_stats.host}:{server_stats.port}"
     
-    def add_server(self, host: str, port: int):
+    def add_server(self, host: str, port: int, weight: int = 1, publish: bool = True):
         """Dynamic scaling: Add a new server"""
         key = f"{host}:{port}"
         if key not in self.servers:
-            self.servers[key] = ServerStats(host=host, port=port)
+            if self.shared and publish:
+                self.shared.register(key, weight)
+            self.servers[key] = ServerStats(host=host, port=port, weight=weight)
+            self.index.add(key, weight=weight)
+            self.health_checker.track(key)
+            if self.outliers is not None:
+                self.outliers.track(key)
+            if self.upstream:
+                self.upstream.add_pool(host, port)
             logger.info(f"Added new server: {key}")
     
-    def remove_server(self, host: str, port: int):
+    def remove_server(self, host: str, port: int, publish: bool = True):
         """Dynamic scaling: Remove a server"""
         key = f"{host}:{port}"
-        if key in self.servers and len(self.servers) > 1:
+        if key in self.servers and (len(self.servers) > 1 or not publish):
+            if self.shared and publish:
+                self.shared.unregister(key)
             del self.servers[key]
+            self.index.remove(key)
+            self.health_checker.untrack(key)
+            if self.outliers is not None:
+                self.outliers.untrack(key)
+            if self.limits is not None:
+                self.limits.remove(key)
+            if self.upstream:
+                self.upstream.remove_pool(host, port)
             logger.info(f"Removed server: {key}")
     
+    def set_server_weight(self, host: str, port: int, weight: int, publish: bool = True) -> bool:
+        """Change a server's weight at runtime"""
+        key = f"{host}:{port}"
+        server = self.servers.get(key)
+        if server is None:
+            return False
+        if self.shared and publish:
+            self.shared.set_weight(key, weight)
+        server.weight = weight
+        self.index.update_weight(key, weight)
+        logger.info(f"Set weight of {key} to {weight}")
+        return True
+    
+    def set_server_health(self, server: ServerStats, healthy: bool, publish: bool = True):
+        """Apply a health state change decided by the health checker"""
+        server.is_healthy = healthy
+        key = self.get_server_key(server)
+        if self.shared and publish:
+            self.shared.set_healthy(key, healthy)
+        if healthy and not server.ejected:
+            self.index.add(key, server.active_connections, server.weight)
+        else:
+            self.index.remove(key)
+    
+    def _eject_server(self, key: str):
+        """Outlier detector callback: stop routing to a backend without marking it down"""
+        server = self.servers[key]
+        server.ejected = True
+        self.index.remove(key)
+    
+    def _restore_server(self, key: str):
+        server = self.servers[key]
+        server.ejected = False
+        if server.is_healthy:
+            self.index.add(key, server.active_connections, server.weight)
+    
+    def connection_started(self, server: ServerStats):
+        server.active_connections += 1
+        self._connections_changed(server, 1)
+    
+    def connection_finished(self, server: ServerStats):
+        server.active_connections -= 1
+        self._connections_changed(server, -1)
+    
+    def _connections_changed(self, server: ServerStats, delta: int):
+        key = self.get_server_key(server)
+        if self.shared:
+            self.shared.add(key, ACTIVE, delta)
+            self.index.update_connections(key, self.shared.total(key, ACTIVE))
+        else:
+            self.index.update_connections(key, server.active_connections)
+    
     def get_next_server_round_robin(self) -> Optional[ServerStats]:
-        """Round robin algorithm"""
-        healthy_servers = [s for s in self.servers.values() if s.is_healthy]
-        if not healthy_servers:
-            return None
-        
-        server = healthy_servers[self.current % len(healthy_servers)]
-        self.current = (self.current + 1) % len(healthy_servers)
-        return server
+        """Round robin algorithm (O(1), stable across health changes)"""
+        key = self.index.round_robin.next()
+        return self.servers[key] if key else None
     
     def get_next_server_least_connections(self) -> Optional[ServerStats]:
-        """Least connections algorithm"""
-        healthy_servers = [s for s in self.servers.values() if s.is_healthy]
-        if not healthy_servers:
+        """Least connections algorithm (O(1) peek, O(log N) updates)"""
+        key = self.index.least_connections.peek()
+        return self.servers[key] if key else None
+    
+    def get_next_server_weighted_round_robin(self) -> Optional[ServerStats]:
+        """Smooth weighted round robin (interleaved, O(1) amortized)"""
+        key = self.index.weighted.next()
+        return self.servers[key] if key else None
+    
+    def get_next_server_consistent_hash(self, hash_key: Optional[str]) -> Optional[ServerStats]:
+        """Consistent hashing (Maglev table lookup, O(1))"""
+        key = self.index.consistent_hash.lookup(hash_key or '')
+        return self.servers[key] if key else None
+    
+    def get_next_server_peak_ewma(self) -> Optional[ServerStats]:
+        """Peak-EWMA algorithm: lowest decayed latency x (in-flight + 1)"""
+        best = None
+        best_cost = 0.0
+        for key in self.index.members:
+            server = self.servers[key]
+            cost = server.peak_ewma.cost(server.active_connections)
+            if best is None or cost < best_cost:
+                best, best_cost = server, cost
+        return best
+    
+    def get_next_server_p2c(self) -> Optional[ServerStats]:
+        """Power of two choices: sample two healthy servers, keep the cheaper by peak-EWMA cost"""
+        first_key, second_key = self.index.sample_two()
+        if first_key is None:
             return None
-        
-        return min(healthy_servers, key=lambda s: s.active_connections)
+        first = self.servers[first_key]
+        if second_key is None:
+            return first
+        second = self.servers[second_key]
+        if second.peak_ewma.cost(second.active_connections) < first.peak_ewma.cost(first.active_connections):
+            return second
+        return first
     
-    def get_next_server(self, session_id: Optional[str] = None) -> Optional[ServerStats]:
+    def get_next_server(self, session_id: Optional[str] = None, hash_key: Optional[str] = None) -> Optional[ServerStats]:
         """Get next server based on algorithm and session persistence"""
         
         # Check for session persistence
-        if session_id and session_id in self.sessions:
-            server_key = self.sessions[session_id]
-            if server_key in self.servers and self.servers[server_key].is_healthy:
-                return self.servers[server_key]
-            else:
+        if session_id:
+            server_key = self.sessions.get(session_id)
+            if server_key:
+                server = self.servers.get(server_key)
+                if server and server.is_healthy and not server.ejected:
+                    return server
                 # Remove invalid session
-                del self.sessions[session_id]
+                self.sessions.discard(session_id)
         
         # Use balancing algorithm
         if self.algorithm == BalancingAlgorithm.ROUND_ROBIN:
             server = self.get_next_server_round_robin()
         elif self.algorithm == BalancingAlgorithm.LEAST_CONNECTIONS:
             server = self.get_next_server_least_connections()
+        elif self.algorithm == BalancingAlgorithm.PEAK_EWMA:
+            server = self.get_next_server_peak_ewma()
+        elif self.algorithm == BalancingAlgorithm.P2C:
+            server = self.get_next_server_p2c()
+        elif self.algorithm == BalancingAlgorithm.WEIGHTED_ROUND_ROBIN:
+            server = self.get_next_server_weighted_round_robin()
+        elif self.algorithm == BalancingAlgorithm.CONSISTENT_HASH:
+            server = self.get_next_server_consistent_hash(hash_key)
         else:
             server = self.get_next_server_round_robin()
         
         # Create session if needed
         if session_id and server:
-            self.sessions[session_id] = self.get_server_key(server)
+            self.sessions.set(session_id, self.get_server_key(server))
         
         return server
     
@@ -128,127 +375,601 @@ class LoadBalancer:
         session_data = f"{client_ip}:{user_agent}:{time.time()}"
         return hashlib.md5(session_data.encode()).hexdigest()
     
-    async def _health_check_loop(self):
-        """Background task to check server health"""
-        while True:
-            for server in self.servers.values():
-                try:
-                    start_time = time.time()
-                    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                        async with session.get(f"http://{server.host}:{server.port}/health") as resp:
-                            response_time = time.time() - start_time
-                            server.is_healthy = resp.status == 200
-                            server.last_health_check = datetime.now()
-                            
-                            # Keep only last 100 response times
-                            server.response_times.append(response_time)
-                            if len(server.response_times) > 100:
-                                server.response_times.pop(0)
-                                
-                except Exception as e:
-                    server.is_healthy = False
-                    server.last_health_check = datetime.now()
-                    logger.warning(f"Health check failed for {server.host}:{server.port}: {e}")
+    async def _refresh_cache(self, request, key: tuple):
+        """Background stale-while-revalidate refresh of one cached response"""
+        try:
+            hash_key = None
+            if self.algorithm == BalancingAlgorithm.CONSISTENT_HASH:
+                hash_key = request_hash_key(request, self.hash_key_source, self.hash_key_name)
+            server = self.get_next_server(hash_key=hash_key)
+            if not server:
+                return
+            server_key = self.get_server_key(server)
+            headers = filter_headers(request.headers)
+            for name in CONDITIONAL_HEADERS:
+                headers.popall(name, None)
+            self.connection_started(server)
+            try:
+                async with self.upstream.get_pool(server_key).session() as session:
+                    async with session.get(f"http://{server.host}:{server.port}{request.rel_url}",
+                                           headers=headers) as resp:
+                        body = await resp.read()
+                        if resp.status < 500:
+                            self.cache.store(request, resp.status, filter_headers(resp.headers), body)
+            finally:
+                self.connection_finished(server)
+        except Exception as e:
+            logger.warning(f"Cache refresh for {request.path_qs} failed: {e}")
+        finally:
+            self.cache.end_revalidation(key)
+    
+    def _serve_from_cache(self, request):
+        """Cached response for the request, or None to go to a backend"""
+        state, entry = self.cache.lookup(request)
+        if entry is None:
+            return None
+        if state == STALE:
+            key = self.cache.begin_revalidation(request)
+            if key is not None:
+                task = asyncio.create_task(self._refresh_cache(request, key))
+                self._cache_refreshes.add(task)
+                task.add_done_callback(self._cache_refreshes.discard)
+        return self.cache.respond(request, entry)
+    
+    async def _compress(self, request, response: web.Response) -> web.Response:
+        """Compress a buffered response for the client when compression is enabled"""
+        if self.compressor is None:
+            return response
+        return await self.compressor.apply(request, response)
+    
+    def record_failure(self, server: ServerStats, start_time: float):
+        """Count a failed exchange against a backend"""
+        server_key = self.get_server_key(server)
+        server.total_errors += 1
+        if self.shared:
+            self.shared.add(server_key, ERRORS)
+        # Failures cost time too; make slow failures count against the backend
+        server.peak_ewma.observe(time.time() - start_time)
+        self.health_checker.report_failure(server_key)
+        if self.outliers is not None:
+            self.outliers.record(server_key, False)
+    
+    def record_success(self, server: ServerStats, start_time: float):
+        """Count a successful exchange (or connect, or handshake) against a backend"""
+        server_key = self.get_server_key(server)
+        elapsed = time.time() - start_time
+        server.latency.record(elapsed)
+        server.peak_ewma.observe(elapsed)
+        self.latency.record(elapsed)
+        self.health_checker.report_success(server_key)
+        if self.outliers is not None:
+            self.outliers.record(server_key, True)
+    
+    def _claim(self, server: ServerStats) -> _Claim:
+        """Count a connection to `server` from the moment it is picked
+        
+        Concurrent picks see the backend as busy while this request is still
+        reading its body or queueing at the limiter. Closing the returned
+        stack releases the count; it may be closed more than once. A claim
+        on a half-open backend holds a trial slot, which closing gives back
+        unless an outcome was recorded first (shed, rejected, cancelled...).
+        """
+        self.connection_started(server)
+        stack = _Claim()
+        stack.callback(self.connection_finished, server)
+        server_key = self.get_server_key(server)
+        if self.outliers is not None and self.outliers.is_half_open(server_key):
+            # Half-open backends are out of the index, so only a trial picks one
+            stack.trial = server_key
+            stack.callback(self._end_trial, stack)
+        return stack
+    
+    def _end_trial(self, stack: _Claim):
+        if stack.trial is not None:
+            self.outliers.abandon(stack.trial)
+            stack.trial = None
+    
+    async def _attempt(self, request, server: ServerStats, stack: _Claim, headers, body):
+        """Send one upstream attempt and return (resp, stack) once the response head arrives
+        
+        `stack` comes from _claim(server). The attempt adds the response and
+        the pooled session to it, so closing it releases everything and the
+        caller decides how long the attempt lives. It is closed here if the
+        attempt fails; callers close it too when they abandon the attempt.
+        """
+        server_key = self.get_server_key(server)
+        limiter = self.limits.get(server_key) if self.limits is not None else None
+        if limiter is not None:
+            try:
+                await limiter.acquire()  # May queue, or raise LoadShed before the request is counted
+            except BaseException:
+                await stack.aclose()
+                raise
+            stack.callback(limiter.release)
+        server.total_requests += 1
+        if self.shared:
+            self.shared.add(server_key, REQUESTS)
+        start_time = time.time()
+        try:
+            session = await stack.enter_async_context(self.upstream.get_pool(server_key).session())
+            resp = await stack.enter_async_context(session.request(
+                method=request.method,
+                url=f"http://{server.host}:{server.port}{request.rel_url}",
+                headers=headers,
+                data=body
+            ))
+        except asyncio.CancelledError:
+            # A hedge loser; how long it took still informs the latency-aware algorithms
+            server.peak_ewma.observe(time.time() - start_time)
+            await stack.aclose()  # Gives back a trial slot
+            raise
+        except Exception as e:
+            self.record_failure(server, start_time)
+            stack.trial = None
+            if limiter is not None:
+                limiter.observe(time.time() - start_time, dropped=True)
+            logger.error(f"Backend error for {server.host}:{server.port}: {e}")
+            await stack.aclose()
+            raise
+        
+        response_time = time.time() - start_time
+        server.latency.record(response_time)
+        server.peak_ewma.observe(response_time)
+        self.latency.record(response_time)
+        if self.retry is not None:
+            self.retry.routes.record(request.path, response_time)
+        if limiter is not None:
+            limiter.observe(response_time, dropped=resp.status in RETRY_STATUSES)
+        
+        # Passive health signal: 5xx counts against the backend
+        if resp.status >= 500:
+            self.health_checker.report_failure(server_key)
+        else:
+            self.health_checker.report_success(server_key)
+        if self.outliers is not None:
+            self.outliers.record(server_key, resp.status < 500)
+        stack.trial = None
+        return resp, stack
+    
+    def pick_server(self, tried: Collection[str] = (), hash_key: Optional[str] = None) -> Optional[ServerStats]:
+        """A healthy backend not in `tried`, for a connection or attempt without a session
+        
+        A half-open backend's trial slot comes first when nothing pins the
+        request (no consistent-hash key); the caller must report the outcome
+        to the outlier detector, or abandon the trial. Otherwise the
+        algorithm's pick if it is new, else the cheapest untried backend.
+        """
+        if self.outliers is not None and (hash_key is None or self.algorithm != BalancingAlgorithm.CONSISTENT_HASH):
+            trial = self.outliers.take_trial(exclude=tried)
+            if trial is not None:
+                return self.servers[trial]
+        server = self.get_next_server(hash_key=hash_key)
+        if server is not None and self.get_server_key(server) not in tried:
+            return server
+        best = None
+        best_cost = 0.0
+        for key in self.index.members:
+            if key in tried:
+                continue
+            candidate = self.servers[key]
+            cost = candidate.peak_ewma.cost(candidate.active_connections)
+            if best is None or cost < best_cost:
+                best, best_cost = candidate, cost
+        return best
+    
+    async def _hedged(self, request, server: ServerStats, stack: _Claim, headers, body,
+                      hash_key, tried: set):
+        """First attempt, plus a hedge on another backend if it outlives the route's p95"""
+        delay = self.retry.hedge_delay(request.path)
+        if delay is None:
+            resp, stack = await self._attempt(request, server, stack, headers, body)
+            return server, resp, stack
+        
+        # Task -> (server, stack); a task cancelled before it starts never closes its own stack
+        attempts = {asyncio.create_task(self._attempt(request, server, stack, headers, body)): (server, stack)}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                hedge = self.pick_server(tried, hash_key)
+                if hedge is not None and self.retry.budget.withdraw():
+                    tried.add(self.get_server_key(hedge))
+                    hedge.hedges += 1
+                    self.retry.hedges += 1
+                    hedge_stack = self._claim(hedge)
+                    attempts[asyncio.create_task(
+                        self._attempt(request, hedge, hedge_stack, headers, body))] = (hedge, hedge_stack)
             
-            await asyncio.sleep(30)  # Check every 30 seconds
+            error = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+                if winner is not None:
+                    if attempts[winner][0] is not server:
+                        self.retry.hedge_wins += 1
+                    resp, stack = winner.result()
+                    return attempts[winner][0], resp, stack
+            raise error
+        finally:
+            # Cancel the loser; one that already answered just gets released
+            losers = [task for task in attempts if task is not winner]
+            for task in losers:
+                task.cancel()
+            for task in losers:
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await attempts[task][1].aclose()
     
-    async def _cleanup_sessions(self):
-        """Background task to cleanup expired sessions"""
+    async def _send(self, request, server: ServerStats, stack: _Claim, headers, body,
+                    hash_key: Optional[str]):
+        """Forward to `server`, retrying idempotent requests on other backends within budget
+        
+        `stack` is the claim on `server` (see _claim). Returns (server, resp,
+        stack) for the attempt whose response is relayed.
+        """
+        policy = self.retry
+        if policy is None or not is_retryable(request, body):
+            resp, stack = await self._attempt(request, server, stack, headers, body)
+            return server, resp, stack
+        
+        policy.budget.deposit()
+        tried = {self.get_server_key(server)}
+        retries_left = policy.config.max_retries
         while True:
-            current_time = time.time()
-            expired_sessions = [
-                session_id for session_id, _ in self.sessions.items()
-                if current_time - float(session_id.split(':')[-1] if ':' in session_id else 0) > self.session_timeout
-            ]
+            attempt = None
+            error = None
+            try:
+                attempt = await self._hedged(request, server, stack, headers, body, hash_key, tried)
+            except Exception as e:
+                error = e
+            else:
+                if attempt[1].status not in RETRY_STATUSES:
+                    return attempt
             
-            for session_id in expired_sessions:
-                del self.sessions[session_id]
+            retry_server = self.pick_server(tried, hash_key) if retries_left else None
+            if retry_server is None or not policy.budget.withdraw():
+                if attempt is not None:
+                    return attempt  # Out of retries: relay the backend's own error response
+                raise error
+            if attempt is not None:
+                await attempt[2].aclose()
+            retries_left -= 1
+            tried.add(self.get_server_key(retry_server))
+            retry_server.retries += 1
+            policy.retries += 1
+            server = retry_server
+            stack = self._claim(server)
+    
+    def _route(self, request, trial: bool = True):
+        """(server, session_id, hash_key) for a request; server is None if none is available
+        
+        With `trial`, a request nothing pins to a backend (no consistent-hash
+        key, no live session) may be sent to a half-open backend instead.
+        """
+        session_id = None
+        hash_key = None
+        if self.algorithm == BalancingAlgorithm.CONSISTENT_HASH:
+            # Affinity comes from the hash, so no session state is kept
+            hash_key = request_hash_key(request, self.hash_key_source, self.hash_key_name)
+        else:
+            # Generate or extract session ID
+            session_id = request.cookies.get('lb_session_id')
+            if not session_id:
+                session_id = self.generate_session_id(request)
+        
+        # Checked before get_next_server, which pins new sessions
+        trial = (trial and self.outliers is not None and hash_key is None
+                 and not (session_id and session_id in self.sessions))
+        server = self.get_next_server(session_id, hash_key)
+        if server and trial:
+            # Half-open backends get a few trial requests before rejoining rotation
+            trial_key = self.outliers.take_trial()
+            if trial_key is not None:
+                server = self.servers[trial_key]
+        return server, session_id, hash_key
+    
+    async def _proxy_websocket(self, request):
+        """Tunnel a WebSocket to a backend; it counts as one active connection while open"""
+        # A tunnel outlives any trial, so it never takes one
+        server, session_id, _ = self._route(request, trial=False)
+        if not server:
+            return web.Response(text="No healthy servers available", status=503)
+        server_key = self.get_server_key(server)
+        self.connection_started(server)
+        server.total_requests += 1
+        if self.shared:
+            self.shared.add(server_key, REQUESTS)
+        start_time = time.time()
+        try:
+            try:
+                backend = await self.websockets.connect(
+                    request, f"http://{server.host}:{server.port}{request.rel_url}", filter_headers(request.headers))
+            except aiohttp.WSServerHandshakeError as e:
+                # The backend answered, just not with an upgrade
+                if e.status >= 500:
+                    self.record_failure(server, start_time)
+                return web.Response(text=f"Backend refused WebSocket upgrade: {e.message}",
+                                    status=e.status if e.status >= 400 else 502)
+            except Exception as e:
+                self.record_failure(server, start_time)
+                logger.error(f"Backend error for {server.host}:{server.port}: {e}")
+                return web.Response(text=f"Backend error: {e}", status=502)
             
-            await asyncio.sleep(300)  # Cleanup every 5 minutes
-
+            # The handshake is the only request/response exchange a tunnel has
+            self.record_success(server, start_time)
+            
+            response = self.websockets.accept(backend)
+            if session_id:
+                response.set_cookie('lb_session_id', session_id, max_age=self.session_timeout)
+            return await self.websockets.relay(request, backend, response)
+        finally:
+            self.connection_finished(server)
+    
     async def forward_request(self, request):
-        # Generate or extract session ID
-        session_id = request.cookies.get('lb_session_id')
-        if not session_id:
-            session_id = self.generate_session_id(request)
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.check(request)
+            if wait:
+                return web.Response(text="Rate limit exceeded", status=429,
+                                    headers={'Retry-After': str(max(1, math.ceil(wait)))})
+        
+        if is_websocket(request):
+            return await self._proxy_websocket(request)
+        
+        cacheable = False
+        if self.cache is not None:
+            if self.cache.accepts(request):
+                cached = self._serve_from_cache(request)
+                if cached is not None:
+                    return await self._compress(request, cached)
+                cacheable = True
+            elif request.method not in SAFE_METHODS:
+                self.cache.invalidate(request)
         
-        server = self.get_next_server(session_id)
+        flight, leader = None, False
+        if self.coalescer is not None:
+            flight, leader = self.coalescer.join(request)
+            if flight is not None and not leader:
+                response = await self.coalescer.follow(request, flight)
+                if response is not None:
+                    if isinstance(response, web.Response):
+                        response = await self._compress(request, response)
+                    return response
+                # The leader failed before responding; go upstream alone
+        
+        server, session_id, hash_key = self._route(request)
         if not server:
+            if leader:
+                self.coalescer.release(flight)
             return web.Response(text="No healthy servers available", status=503)
         
-        backend_url = f"http://{server.host}:{server.port}{request.rel_url}"
+        # Remove hop-by-hop headers
+        headers = filter_headers(request.headers)
+        if cacheable:
+            # Conditionals are answered from the stored copy, so fetch it in full
+            for name in CONDITIONAL_HEADERS:
+                headers.popall(name, None)
         
-        # Track connection
-        server.active_connections += 1
-        server.total_requests += 1
+        claim = self._claim(server)
         start_time = time.time()
-        
+        response = None
+        stack = None
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = dict(request.headers)
-                # Remove hop-by-hop headers
-                headers.pop('connection', None)
-                headers.pop('upgrade', None)
-                
-                body = await request.read()
-                async with session.request(
-                    method=request.method,
-                    url=backend_url,
-                    headers=headers,
-                    data=body
-                ) as resp:
-                    response_time = time.time() - start_time
-                    server.response_times.append(response_time)
-                    if len(server.response_times) > 100:
-                        server.response_times.pop(0)
-                    
-                    response_body = await resp.read()
-                    response_headers = dict(resp.headers)
-                    
-                    # Add session cookie
+            body = await request_body(request, self.streaming)
+            server, resp, stack = await self._send(request, server, claim, headers, body, hash_key)
+            response_headers = filter_headers(resp.headers)
+            
+            # Responses small enough to cache are buffered so they can be stored
+            cache_candidate = (cacheable and resp.content_length is not None
+                               and resp.content_length <= self.cache.config.max_object_bytes)
+            if cache_candidate or not should_stream(resp, self.streaming, request.method):
+                # Small bodies keep the buffered fast path
+                response_body = await resp.read()
+                entry = None
+                if cacheable:
+                    entry = self.cache.store(request, resp.status, response_headers, response_body)
+                if entry is not None:
+                    response = self.cache.respond(request, entry)
+                else:
                     response = web.Response(
                         body=response_body, 
                         status=resp.status, 
                         headers=response_headers
                     )
+                if session_id:
                     response.set_cookie('lb_session_id', session_id, max_age=self.session_timeout)
+                if leader:
+                    flight.start(resp.status, response_headers, streamed=False)
+                    flight.finish(response_body)
+                return await self._compress(request, response)
+            
+            # Large or unsized bodies are relayed chunk by chunk
+            client_headers = response_headers
+            encoder = None
+            if self.compressor is not None:
+                coding = self.compressor.encoding_for(request, resp.status, response_headers, resp.content_length)
+                if coding is not None:
+                    # Followers replay the backend's representation, so only this client's copy changes
+                    client_headers = response_headers.copy()
+                    self.compressor.mark_encoded(client_headers, coding)
+                    encoder = self.compressor.encoder(coding)
+            response = web.StreamResponse(status=resp.status, headers=client_headers)
+            if session_id:
+                response.set_cookie('lb_session_id', session_id, max_age=self.session_timeout)
+            if leader:
+                flight.start(resp.status, response_headers, streamed=True)
+            await relay_body(request, resp, response, self.streaming.chunk_size,
+                             on_chunk=flight.feed if leader else None, encoder=encoder)
+            if leader:
+                flight.finish()
+            return response
                     
-                    return response
-                    
+        except LoadShed as e:
+            # Shed early rather than queue inside an overloaded backend
+            return web.Response(text="Backend overloaded, retry later", status=503,
+                                headers={'Retry-After': str(max(1, round(e.retry_after)))})
         except Exception as e:
-            server.total_errors += 1
-            logger.error(f"Backend error for {server.host}:{server.port}: {e}")
+            if stack is not None:
+                # The backend answered, then the relay failed; attempt failures are counted in _attempt
+                if is_upstream_error(e):
+                    self.record_failure(server, start_time)
+                    logger.error(f"Backend error for {server.host}:{server.port}: {e}")
+                else:
+                    logger.info(f"Relay from {server.host}:{server.port} stopped on the client side: {e!r}")
+            if response is not None and response.prepared:
+                # Headers already went out; abort rather than fake a complete body
+                raise
             return web.Response(text=f"Backend error: {e}", status=502)
         finally:
-            server.active_connections -= 1
+            if stack is not None:
+                await stack.aclose()
+            await claim.aclose()  # Already closed unless the body read failed first
+            if leader:
+                self.coalescer.release(flight)
 
-    async def get_stats(self, request):
-        """Endpoint to get load balancer statistics"""
+    def get_server_counters(self, key: str, server: ServerStats):
+        """(active, requests, errors) - fleet-wide in worker mode, else this process's"""
+        if self.shared:
+            return (self.shared.total(key, ACTIVE), self.shared.total(key, REQUESTS),
+                    self.shared.total(key, ERRORS))
+        return server.active_connections, server.total_requests, server.total_errors
+
+    def sample_history(self):
+        """Feed the current counters of every backend to the stats history"""
+        readings = []
+        for key, server in self.servers.items():
+            active, requests, errors = self.get_server_counters(key, server)
+            readings.append((key, requests, errors, active, server.latency))
+        self.history.sample(readings, self.latency)
+
+    def build_stats(self) -> dict:
+        """Snapshot of load balancer statistics, shared by /lb/stats and the stream"""
         stats = {
             "algorithm": self.algorithm.value,
             "total_servers": len(self.servers),
-            "healthy_servers": len([s for s in self.servers.values() if s.is_healthy]),
+            "healthy_servers": len(self.index),
+            "weighted_cycle_length": self.index.weighted.cycle_length,
             "active_sessions": len(self.sessions),
+            "sessions": self.sessions.get_stats(),
+            "upstream": self.upstream.get_stats() if self.upstream else None,
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "coalescing": self.coalescer.get_stats() if self.coalescer is not None else None,
+            "retry": self.retry.get_stats() if self.retry is not None else None,
+            "outliers": self.outliers.get_stats() if self.outliers is not None else None,
+            "concurrency": self.limits.get_stats() if self.limits is not None else None,
+            "rate_limits": self.rate_limiter.get_stats() if self.rate_limiter is not None else None,
+            "stream": self.stats_stream.get_stats(),
+            "history": self.history.get_stats() if self.history is not None else None,
+            "static": self.assets.get_stats(),
+            "compression": self.compressor.get_stats() if self.compressor is not None else None,
+            "websockets": self.websockets.get_stats(),
+            "tcp": self.tcp.get_stats() if self.tcp is not None else None,
+            "health_check": self.health_checker.get_stats(),
+            "latency": {
+                "proxy": self.latency.summary(),
+                "proxy_window": self.latency.summary(windowed=True),
+                "health_probes": self.probe_latency.summary(),
+            },
             "servers": {}
         }
         
+        if self.shared:
+            stats["workers"] = {"count": self.shared.workers, "worker_id": self.shared.worker_id}
+        
+        if self.algorithm == BalancingAlgorithm.CONSISTENT_HASH:
+            stats["consistent_hash"] = {
+                "key": f"{self.hash_key_source}:{self.hash_key_name}" if self.hash_key_name else self.hash_key_source,
+                **self.index.consistent_hash.get_stats(),
+            }
+        
         for key, server in self.servers.items():
+            active, requests, errors = self.get_server_counters(key, server)
             stats["servers"][key] = {
                 "host": server.host,
                 "port": server.port,
                 "is_healthy": server.is_healthy,
-                "active_connections": server.active_connections,
-                "total_requests": server.total_requests,
-                "total_errors": server.total_errors,
-                "error_rate": f"{server.error_rate:.2%}",
+                "weight": server.weight,
+                "effective_weight": self.index.weighted.effective_weight(key),
+                "active_connections": active,
+                "total_requests": requests,
+                "total_errors": errors,
+                "error_rate": f"{(errors / requests) if requests else 0:.2%}",
+                "retries": server.retries,
+                "hedges": server.hedges,
                 "avg_response_time": f"{server.avg_response_time:.3f}s",
-                "last_health_check": server.last_health_check.isoformat() if server.last_health_check else None
+                "peak_ewma": f"{server.peak_ewma.value:.3f}s",
+                "latency": server.latency.summary(),
+                "latency_window": server.latency.summary(windowed=True),
+                "probe_latency": server.probe_latency.summary(),
+                "last_health_check": server.last_health_check.isoformat() if server.last_health_check else None,
+                "health": self.health_checker.get_server_stats(key),
+                "breaker": self.outliers.get_server_stats(key) if self.outliers is not None else None,
+                "concurrency": self.limits.get(key).get_stats() if self.limits is not None else None,
             }
+            pool = self.upstream.pools.get(key) if self.upstream else None
+            if pool:
+                stats["servers"][key]["pool"] = pool.get_stats()
         
-        return web.json_response(stats)
+        return stats
+
+    async def get_stats(self, request):
+        """Endpoint to get load balancer statistics"""
+        return web.json_response(self.build_stats())
+
+    async def history_endpoint(self, request):
+        """Downsampled time series: ?server=host:port&from=&to=&step= (Unix seconds)"""
+        if self.history is None:
+            return web.json_response({"error": "Stats history is disabled"}, status=404)
+        key = request.query.get('server') or AGGREGATE
+        if key not in self.history:
+            return web.json_response({"error": f"No history for server {key}"}, status=404)
+        try:
+            end = float(request.query.get('to') or time.time())
+            start = float(request.query.get('from') or end - 900)
+            step = int(request.query['step']) if request.query.get('step') else None
+        except ValueError:
+            return web.json_response({"error": "from and to must be numbers, step an integer"}, status=400)
+        if not (math.isfinite(start) and math.isfinite(end)):
+            return web.json_response({"error": "from and to must be finite"}, status=400)
+        if start >= end or (step is not None and step < 1):
+            return web.json_response({"error": "from must be before to and step at least 1"}, status=400)
+        return web.json_response(self.history.query(key, start, end, step))
+
+    async def metrics_endpoint(self, request):
+        """Prometheus text format exposition"""
+        return web.Response(body=self.metrics.render(), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+    async def stats_stream_endpoint(self, request):
+        """Server-Sent Events: a full snapshot, then one JSON merge patch per tick"""
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Keep intermediaries from buffering the stream
+        })
+        await response.prepare(request)
+        frames = self.stats_stream.subscribe()
+        try:
+            async for frame in frames:
+                await response.write(frame)
+        except ConnectionResetError:
+            pass  # Client went away
+        finally:
+            await frames.aclose()
+        return response
+
+    def _parse_weight(self, data) -> Optional[int]:
+        """Validate an optional weight from a request body (None if invalid)"""
+        weight = data.get('weight', 1)
+        return weight if valid_weight(weight) else None
 
     async def add_server_endpoint(self, request):
-        """Endpoint to dynamically add a server"""
+        """Endpoint to dynamically add a server (or update its weight if it exists)"""
         data = await request.json()
         host = data.get('host')
         port = data.get('port')
@@ -256,9 +977,36 @@ class LoadBalancer:
         if not host or not port:
             return web.json_response({"error": "Host and port required"}, status=400)
         
-        self.add_server(host, port)
+        weight = self._parse_weight(data)
+        if weight is None:
+            return web.json_response({"error": "Weight must be a positive integer"}, status=400)
+        
+        if f"{host}:{port}" in self.servers:
+            if 'weight' not in data:
+                return web.json_response({"message": f"Server {host}:{port} already exists"})
+            self.set_server_weight(host, port, weight)
+            return web.json_response({"message": f"Server {host}:{port} weight set to {weight}"})
+        
+        self.add_server(host, port, weight)
         return web.json_response({"message": f"Server {host}:{port} added successfully"})
 
+    async def update_server_endpoint(self, request):
+        """Endpoint to change a server's weight at runtime"""
+        data = await request.json()
+        host = data.get('host')
+        port = data.get('port')
+        
+        if not host or not port or 'weight' not in data:
+            return web.json_response({"error": "Host, port and weight required"}, status=400)
+        
+        weight = self._parse_weight(data)
+        if weight is None:
+            return web.json_response({"error": "Weight must be a positive integer"}, status=400)
+        
+        if not self.set_server_weight(host, port, weight):
+            return web.json_response({"error": f"Server {host}:{port} not found"}, status=404)
+        return web.json_response({"message": f"Server {host}:{port} weight set to {weight}"})
+
     async def remove_server_endpoint(self, request):
         """Endpoint to dynamically remove a server"""
         data = await request.json()
@@ -273,54 +1021,60 @@ class LoadBalancer:
 
     async def dashboard(self, request):
         """Serve the monitoring dashboard"""
-        try:
-            with open('static/advanced_dashboard.html', 'r') as f:
-                html_content = f.read()
-            return web.Response(text=html_content, content_type='text/html')
-        except FileNotFoundError:
+        response = self.assets.serve(request, 'advanced_dashboard.html')
+        if response is None:
             return web.Response(text="Dashboard not found", status=404)
+        return response
 
     async def serve_static(self, request):
-        """Serve static files"""
-        filename = request.match_info['filename']
-        try:
-            with open(f'static/{filename}', 'r') as f:
-                content = f.read()
-            
-            # Determine content type
-            if filename.endswith('.css'):
-                content_type = 'text/css'
-            elif filename.endswith('.js'):
-                content_type = 'application/javascript'
-            elif filename.endswith('.html'):
-                content_type = 'text/html'
-            else:
-                content_type = 'text/plain'
-                
-            return web.Response(text=content, content_type=content_type)
-        except FileNotFoundError:
+        """Serve static files (from memory; only files found under the static root)"""
+        response = self.assets.serve(request, request.match_info['filename'])
+        if response is None:
             return web.Response(text="File not found", status=404)
+        return response
 
     def get_app(self):
+        """HTTP mode: management endpoints plus the proxy catch-all"""
+        app = self.get_admin_app()
+        
+        # Main routing (catch-all - must be last)
+        app.router.add_route('*', '/{tail:.*}', self.forward_request)
+        
+        return app
+
+    def get_admin_app(self):
+        """Dashboard, stats and management endpoints only (the admin port in --mode tcp)"""
         app = web.Application()
         
         # Start background tasks when the app starts
         async def init_background_tasks(app):
+            self.assets.load()
+            self.start_upstream()
             self.start_background_tasks()
         
+        async def shutdown(app):
+            await self.shutdown()
+        
+        async def drain_websockets(app):
+            # Before the server stops waiting on handlers, so tunnels close with 1001
+            await self.websockets.close()
+        
         app.on_startup.append(init_background_tasks)
+        app.on_shutdown.append(drain_websockets)
+        app.on_cleanup.append(shutdown)
         
         # Dashboard endpoints (serve before catch-all route)
         app.router.add_get('/dashboard', self.dashboard)
         app.router.add_get('/', self.dashboard)  # Root serves dashboard
-        app.router.add_get('/static/{filename}', self.serve_static)  # Static files
+        app.router.add_get('/static/{filename:.+}', self.serve_static)  # Static files
         
         # Management endpoints  
         app.router.add_get('/lb/stats', self.get_stats)
+        app.router.add_get('/lb/stats/stream', self.stats_stream_endpoint)
+        app.router.add_get('/lb/stats/history', self.history_endpoint)
+        app.router.add_get('/metrics', self.metrics_endpoint)
         app.router.add_post('/lb/add-server', self.add_server_endpoint)
+        app.router.add_post('/lb/update-server', self.update_server_endpoint)
         app.router.add_post('/lb/remove-server', self.remove_server_endpoint)
         
-        # Main routing (catch-all - must be last)
-        app.router.add_route('*', '/{tail:.*}', self.forward_request)
-        
         return app
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tail-latency comparison of balancing algorithms against a fast/slow backend mix
+
+Starts test_server.py backends (some with an artificial delay) and one main.py
+per algorithm, drives the same concurrent load through each, and prints the
+latency percentiles and how much traffic reached the slow backends.
+"""
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from histogram import LatencyHistogram
+
+ALGORITHMS = ['round_robin', 'least_connections', 'peak_ewma', 'p2c']
+
+def start_process(args):
+    return subprocess.Popen([sys.executable] + args, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_for(url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+async def drive(url, requests, concurrency):
+    """Closed-loop load; no cookie jar, so session stickiness never kicks in"""
+    histogram = LatencyHistogram()
+    by_port = {}
+    errors = 0
+    queue = iter(range(requests))
+
+    async def worker(session):
+        nonlocal errors
+        for i in queue:
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{url}/bench/{i}") as resp:
+                    body = await resp.json()
+                    histogram.record(time.perf_counter() - start)
+                    port = body.get('server_port')
+                    by_port[port] = by_port.get(port, 0) + 1
+            except Exception:
+                errors += 1
+
+    async with aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar()) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return histogram, by_port, errors
+
+async def run(args):
+    fast_ports = [args.base_port + i for i in range(args.fast)]
+    slow_ports = [args.base_port + args.fast + i for i in range(args.slow)]
+    backends = [start_process(['test_server.py', '--port', str(p)]) for p in fast_ports]
+    backends += [start_process(['test_server.py', '--port', str(p), '--delay', str(args.slow_delay)])
+                 for p in slow_ports]
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump([{"host": "localhost", "port": p} for p in fast_ports + slow_ports], f)
+        servers_file = f.name
+
+    try:
+        for port in fast_ports + slow_ports:
+            await wait_for(f"http://localhost:{port}/health")
+
+        print(f"{args.fast} fast backends, {args.slow} slow backends ({args.slow_delay}s delay), "
+              f"{args.requests} requests at concurrency {args.concurrency}\n")
+        print(f"{'Algorithm':<18} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'slow %':>7} {'errors':>7}")
+        for algorithm in args.algorithms.split(','):
+            lb_port = args.lb_port
+            lb = start_process(['main.py', '--algorithm', algorithm, '--port', str(lb_port),
+                                '--servers', servers_file])
+            try:
+                await wait_for(f"http://localhost:{lb_port}/lb/stats")
+                # Warm-up lets the latency-aware algorithms take their first samples
+                await drive(f"http://localhost:{lb_port}", args.concurrency * 4, args.concurrency)
+                histogram, by_port, errors = await drive(f"http://localhost:{lb_port}",
+                                                         args.requests, args.concurrency)
+            finally:
+                lb.terminate()
+                lb.wait()
+            summary = histogram.summary()
+            slow_share = sum(by_port.get(p, 0) for p in slow_ports) / max(histogram.total, 1)
+            print(f"{algorithm:<18} {summary['p50_ms']:>8.1f} {summary['p90_ms']:>8.1f} "
+                  f"{summary['p99_ms']:>8.1f} {summary['max_ms']:>8.1f} {slow_share:>7.1%} {errors:>7}")
+    finally:
+        for process in backends:
+            process.terminate()
+        for process in backends:
+            process.wait()
+        os.unlink(servers_file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Balancing algorithm tail-latency benchmark')
+    parser.add_argument('--algorithms', default=','.join(ALGORITHMS), help='Comma-separated algorithms')
+    parser.add_argument('--fast', type=int, default=2, help='Number of fast backends')
+    parser.add_argument('--slow', type=int, default=1, help='Number of slow backends')
+    parser.add_argument('--slow-delay', type=float, default=0.2, help='Delay of slow backends in seconds')
+    parser.add_argument('--requests', type=int, default=2000, help='Measured requests per algorithm')
+    parser.add_argument('--concurrency', type=int, default=20, help='Concurrent requests')
+    parser.add_argument('--base-port', type=int, default=3101, help='First backend port')
+    parser.add_argument('--lb-port', type=int, default=8181, help='Load balancer port')
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
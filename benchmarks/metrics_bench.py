@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for /metrics render cost as the backend count grows
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balancer import BalancingAlgorithm
+from selection_bench import make_balancer
+
+def touch(lb, keys):
+    """Simulate one proxied request to each of `keys` between scrapes"""
+    for key in keys:
+        server = lb.servers[key]
+        server.total_requests += 1
+        server.latency.record(random.uniform(0.0005, 0.2))
+
+def bench_scrapes(lb, scrapes, dirty):
+    """Average microseconds per render with `dirty` backends changed before each scrape"""
+    keys = list(lb.servers)
+    elapsed = 0.0
+    size = 0
+    for _ in range(scrapes):
+        touch(lb, random.sample(keys, dirty))
+        start = time.perf_counter()
+        size = len(lb.metrics.render())
+        elapsed += time.perf_counter() - start
+    return elapsed / scrapes * 1e6, size
+
+def main():
+    parser = argparse.ArgumentParser(description='/metrics render microbenchmark')
+    parser.add_argument('--scrapes', type=int, default=200, help='Renders per measurement')
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='Comma-separated backend counts')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"{'Backends':>9} {'Bytes':>10} {'Idle us':>10} {'1% dirty':>10} {'10% dirty':>10} {'All dirty':>10}")
+    for count in sizes:
+        lb = make_balancer(count, BalancingAlgorithm.ROUND_ROBIN)
+        touch(lb, list(lb.servers))
+        lb.metrics.render()  # Build the per-backend templates once
+        idle, size = bench_scrapes(lb, args.scrapes, 0)
+        one, _ = bench_scrapes(lb, args.scrapes, max(1, count // 100))
+        ten, _ = bench_scrapes(lb, args.scrapes, max(1, count // 10))
+        full, _ = bench_scrapes(lb, max(args.scrapes // 10, 5), count)
+        print(f"{count:>9} {size:>10} {idle:>10.0f} {one:>10.0f} {ten:>10.0f} {full:>10.0f}")
+
+if __name__ == "__main__":
+    main()
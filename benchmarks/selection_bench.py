@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for server selection cost as the backend count grows
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balancer import LoadBalancer, BalancingAlgorithm
+
+def make_balancer(count, algorithm):
+    """Build a LoadBalancer over `count` fake backends"""
+    servers = [{"host": "10.0.0.1", "port": 10000 + i} for i in range(count)]
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(servers, f)
+    try:
+        return LoadBalancer(f.name, algorithm)
+    finally:
+        os.unlink(f.name)
+
+def bench_picks(lb, picks, with_connections):
+    """Average nanoseconds per pick (including connection bookkeeping if requested)"""
+    start = time.perf_counter()
+    for _ in range(picks):
+        server = lb.get_next_server()
+        if with_connections:
+            lb.connection_started(server)
+            lb.connection_finished(server)
+    return (time.perf_counter() - start) / picks * 1e9
+
+def bench_legacy(lb, picks):
+    """The old per-request list comprehension, for comparison"""
+    start = time.perf_counter()
+    for _ in range(picks):
+        healthy_servers = [s for s in lb.servers.values() if s.is_healthy]
+        min(healthy_servers, key=lambda s: s.active_connections)
+    return (time.perf_counter() - start) / picks * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description='Server selection microbenchmark')
+    parser.add_argument('--picks', type=int, default=20000, help='Picks per measurement')
+    parser.add_argument('--sizes', default='3,10,100,1000,10000', help='Comma-separated backend counts')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"{'Backends':>9} {'RR ns/pick':>12} {'LC ns/pick':>12} {'LC+conn ns':>12} {'Legacy ns':>12}")
+    for count in sizes:
+        rr = bench_picks(make_balancer(count, BalancingAlgorithm.ROUND_ROBIN), args.picks, False)
+        lc_lb = make_balancer(count, BalancingAlgorithm.LEAST_CONNECTIONS)
+        lc = bench_picks(lc_lb, args.picks, False)
+        lc_conn = bench_picks(lc_lb, args.picks, True)
+        legacy = bench_legacy(lc_lb, max(args.picks // max(count // 10, 1), 100))
+        print(f"{count:>9} {rr:>12.0f} {lc:>12.0f} {lc_conn:>12.0f} {legacy:>12.0f}")
+
+if __name__ == "__main__":
+    main()
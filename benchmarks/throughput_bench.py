@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark: real test_server.py backends behind a real main.py
+
+Each scenario starts its own backends and balancer, warms up, then drives
+closed-loop load for a fixed time and records requests/s, latency
+percentiles, errors and the balancer's CPU time and memory. Results are
+written as JSON; with a baseline file, any scenario that got slower beyond
+the tolerances is reported and the exit status is 1.
+
+Load comes from --clients processes so the generator is less likely to
+saturate before the balancer does; still, compare only runs made on the same
+machine with the same options. With --runs N each scenario is repeated and the
+run with the median req/s is kept. CPU and RSS are read from /proc and are
+reported as null elsewhere.
+"""
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from latency_bench import ROOT, start_process, wait_for
+from histogram import LatencyHistogram
+
+MB = 1024 * 1024
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'throughput_baseline.json')
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    concurrency: int
+    path: str = '/bench'
+    method: str = 'GET'
+    body_bytes: int = 0
+    delays: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])  # One backend per entry
+    algorithm: str = 'round_robin'
+    lb_args: List[str] = field(default_factory=list)
+
+SCENARIOS = [
+    Scenario('small_json', 'Small JSON responses', concurrency=32),
+    Scenario('large_response', '1 MB response bodies', concurrency=8, path=f'/bytes/{MB}'),
+    Scenario('large_upload', '1 MB request bodies', concurrency=8, method='POST', body_bytes=MB),
+    Scenario('slow_mix', 'One backend 50 ms slower, least connections', concurrency=32,
+             delays=[0.0, 0.0, 0.05], algorithm='least_connections'),
+    Scenario('high_concurrency', 'Small JSON at 512 concurrent connections', concurrency=512),
+]
+
+# (metric, direction): +1 means bigger is worse
+CHECKS = [('rps', -1), ('p99_ms', +1), ('cpu_us_per_request', +1)]
+
+def process_usage(pid: int):
+    """(CPU seconds, RSS MB, peak RSS MB) of a process, or Nones off Linux"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime + stime
+        memory = {}
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM'):
+                    memory[name] = int(value.split()[0]) / 1024
+        return cpu, memory.get('VmRSS'), memory.get('VmHWM')
+    except (OSError, ValueError, IndexError):
+        return None, None, None
+
+async def drive(url: str, scenario: Scenario, seconds: float, concurrency: int):
+    """Closed-loop load for `seconds`: (histogram, completed, errors)"""
+    histogram = LatencyHistogram()
+    errors = 0
+    body = b'x' * scenario.body_bytes if scenario.body_bytes else None
+    deadline = time.perf_counter() + seconds
+
+    async def worker(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.request(scenario.method, url + scenario.path, data=body) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                        continue
+                histogram.record(time.perf_counter() - start)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                     timeout=aiohttp.ClientTimeout(total=30)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return histogram, histogram.total, errors
+
+def drive_process(url: str, scenario: Scenario, seconds: float, concurrency: int):
+    return asyncio.run(drive(url, scenario, seconds, concurrency))
+
+async def drive_clients(pool: ProcessPoolExecutor, clients: int, url: str, scenario: Scenario, seconds: float):
+    """drive() in `clients` processes at once, splitting the concurrency, with the results merged"""
+    loop = asyncio.get_running_loop()
+    shares = [scenario.concurrency // clients + (i < scenario.concurrency % clients) for i in range(clients)]
+    results = await asyncio.gather(*(loop.run_in_executor(pool, drive_process, url, scenario, seconds, share)
+                                     for share in shares if share))
+    histogram = LatencyHistogram()
+    errors = 0
+    for part, _, part_errors in results:
+        histogram.merge(part)
+        errors += part_errors
+    return histogram, histogram.total, errors
+
+async def run_scenario(scenario: Scenario, args, pool: ProcessPoolExecutor) -> dict:
+    ports = [args.base_port + i for i in range(len(scenario.delays))]
+    backends = [start_process(['test_server.py', '--port', str(port), '--delay', str(delay)])
+                for port, delay in zip(ports, scenario.delays)]
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump([{"host": "localhost", "port": port} for port in ports], f)
+        servers_file = f.name
+    lb = None
+    try:
+        for port in ports:
+            await wait_for(f"http://localhost:{port}/health")
+        lb = start_process(['main.py', '--algorithm', scenario.algorithm, '--port', str(args.lb_port),
+                            '--servers', servers_file] + scenario.lb_args)
+        url = f"http://localhost:{args.lb_port}"
+        await wait_for(f"{url}/lb/stats")
+        await drive_clients(pool, args.clients, url, scenario, args.warmup)
+
+        cpu_before, _, _ = process_usage(lb.pid)
+        start = time.perf_counter()
+        histogram, completed, errors = await drive_clients(pool, args.clients, url, scenario, args.duration)
+        elapsed = time.perf_counter() - start
+        cpu_after, rss_mb, peak_rss_mb = process_usage(lb.pid)
+    finally:
+        for process in backends + ([lb] if lb else []):
+            process.terminate()
+        for process in backends + ([lb] if lb else []):
+            process.wait()
+        os.unlink(servers_file)
+
+    summary = histogram.summary()
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "description": scenario.description,
+        "concurrency": scenario.concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": completed,
+        "errors": errors,
+        "rps": round(completed / elapsed, 1),
+        **{name: summary[name] for name in ('mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms')},
+        "lb_cpu_percent": round(cpu / elapsed * 100, 1) if cpu is not None else None,
+        "cpu_us_per_request": round(cpu / completed * 1e6, 1) if cpu is not None and completed else None,
+        "lb_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "lb_peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+    }
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float, latency_tolerance: float) -> List[str]:
+    """Regression messages for scenarios present in both result sets"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+        for metric, direction in CHECKS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            limit = latency_tolerance if metric.endswith('_ms') else tolerance
+            change = (new - old) / old
+            if change * direction > limit:
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%}, limit {limit:.0%})")
+    return regressions
+
+def print_row(name: str, result: dict, previous: Optional[dict]):
+    def delta(metric):
+        if not previous or not previous.get(metric) or result.get(metric) is None:
+            return ''
+        return f"{(result[metric] - previous[metric]) / previous[metric]:+.0%}"
+
+    cpu = result['lb_cpu_percent']
+    rss = result['lb_peak_rss_mb']
+    print(f"{name:<18} {result['rps']:>9.0f} {delta('rps'):>6} {result['p50_ms']:>8.1f} "
+          f"{result['p99_ms']:>8.1f} {delta('p99_ms'):>6} {result['errors']:>7} "
+          f"{cpu if cpu is not None else '-':>6} {rss if rss is not None else '-':>8}")
+
+async def run(args) -> int:
+    names = args.scenarios.split(',') if args.scenarios else [scenario.name for scenario in SCENARIOS]
+    scenarios = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(scenarios)})")
+        return 2
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {"meta": metadata(), "duration": args.duration, "clients": args.clients, "runs": args.runs,
+               "scenarios": {}}
+    print(f"{args.duration:g}s per scenario after {args.warmup:g}s warm-up"
+          + (f", comparing with {args.baseline}" if baseline else '') + "\n")
+    print(f"{'Scenario':<18} {'req/s':>9} {'':>6} {'p50 ms':>8} {'p99 ms':>8} {'':>6} {'errors':>7} "
+          f"{'LB cpu%':>6} {'peak MB':>8}")
+    with ProcessPoolExecutor(args.clients) as pool:
+        for name in names:
+            runs = [await run_scenario(scenarios[name], args, pool) for _ in range(args.runs)]
+            runs.sort(key=lambda run: run["rps"])
+            result = runs[len(runs) // 2]
+            result["runs_rps"] = [run["rps"] for run in runs]
+            results["scenarios"][name] = result
+            print_row(name, result, baseline and baseline.get("scenarios", {}).get(name))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.tolerance, args.latency_tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end balancer throughput benchmark')
+    parser.add_argument('--scenarios', help=f"Comma-separated subset of: {', '.join(s.name for s in SCENARIOS)}")
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before each scenario')
+    parser.add_argument('--clients', type=int, default=2, help='Load generator processes')
+    parser.add_argument('--runs', type=int, default=1, help='Runs per scenario; the median by req/s is kept')
+    parser.add_argument('--output', help='Write results JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline results to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Save this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed fractional drop in req/s or rise in CPU per request')
+    parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                        help='Allowed fractional rise in p99 latency')
+    parser.add_argument('--base-port', type=int, default=3201, help='First backend port')
+    parser.add_argument('--lb-port', type=int, default=8281, help='Load balancer port')
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Shared HTTP response cache for GET/HEAD in front of backend selection
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Set, Tuple
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+SAFE_METHODS = frozenset({'GET', 'HEAD'})
+
+# Statuses that are cacheable by default when they carry explicit freshness (RFC 9111 section 3)
+CACHEABLE_STATUSES = frozenset({200, 203, 300, 301, 308, 404, 410})
+
+# Headers a 304 repeats from the stored response (RFC 9110 section 15.4.5)
+NOT_MODIFIED_HEADERS = frozenset({'cache-control', 'content-location', 'date', 'etag', 'expires', 'vary'})
+
+# Request headers the cache answers itself, so they are not sent upstream on a miss
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+FRESH, STALE, MISS = 'fresh', 'stale', 'miss'
+
+@dataclass
+class CacheConfig:
+    max_bytes: int = 64 * 1024 * 1024     # Total body + header budget
+    max_object_bytes: int = 1024 * 1024   # Larger responses are never stored
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Split a Cache-Control header into {directive: argument or None}"""
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+def _seconds(directives: Dict[str, Optional[str]], name: str) -> Optional[int]:
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def etag_matches(if_none_match: str, etag: Optional[str]) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith('W/') else candidate) == opaque:
+            return True
+    return False
+
+class CachedResponse:
+    __slots__ = ('status', 'headers', 'body', 'etag', 'vary', 'stored_at', 'initial_age',
+                 'fresh_until', 'stale_until', 'size')
+
+    def __init__(self, status: int, headers: CIMultiDict, body: bytes, vary: Tuple[str, ...],
+                 initial_age: int, lifetime: int, stale_while_revalidate: int):
+        now = time.monotonic()
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = headers.get('ETag')
+        self.vary = vary
+        self.stored_at = now
+        self.initial_age = initial_age
+        self.fresh_until = now + lifetime - initial_age
+        self.stale_until = self.fresh_until + stale_while_revalidate
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers.items())
+
+    def age(self, now: float) -> int:
+        return self.initial_age + int(now - self.stored_at)
+
+class ResponseCache:
+    """Byte-budgeted LRU of backend responses, keyed by host + path + query
+
+    Entries are further keyed by the request values of the headers named in the
+    response's Vary. Only responses with explicit freshness (s-maxage, max-age
+    or Expires) are stored; no-store, private, no-cache and Set-Cookie
+    responses never are. A stale entry inside its stale-while-revalidate window
+    is still served while the caller refreshes it in the background.
+    """
+
+    def __init__(self, config: Optional[CacheConfig] = None):
+        self.config = config or CacheConfig()
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0   # 304s answered locally
+        self.stores = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self._entries: 'OrderedDict[Tuple[str, Tuple[str, ...]], CachedResponse]' = OrderedDict()
+        self._vary: Dict[str, Tuple[str, ...]] = {}        # Primary key -> Vary header names
+        self._variants: Dict[str, Set[Tuple[str, ...]]] = {}
+        self._revalidating: Set[Tuple[str, Tuple[str, ...]]] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def primary_key(request: web.Request) -> str:
+        return f"{request.host}{request.path_qs}"
+
+    @staticmethod
+    def accepts(request: web.Request) -> bool:
+        """Whether a request may be answered from (or fill) the cache"""
+        if request.method not in SAFE_METHODS or 'Authorization' in request.headers:
+            return False
+        directives = parse_cache_control(request.headers.get('Cache-Control'))
+        return 'no-store' not in directives
+
+    def _secondary_key(self, request: web.Request, vary: Tuple[str, ...]) -> Tuple[str, ...]:
+        return tuple(','.join(request.headers.getall(name, [])) for name in vary)
+
+    def lookup(self, request: web.Request) -> Tuple[str, Optional[CachedResponse]]:
+        """Classify a request as FRESH, STALE (servable while revalidating) or MISS"""
+        primary = self.primary_key(request)
+        vary = self._vary.get(primary)
+        request_directives = parse_cache_control(request.headers.get('Cache-Control'))
+        if vary is None or 'no-cache' in request_directives or request.headers.get('Pragma') == 'no-cache':
+            self.misses += 1
+            return MISS, None
+        key = (primary, self._secondary_key(request, vary))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS, None
+
+        now = time.monotonic()
+        max_age = _seconds(request_directives, 'max-age')
+        if now < entry.fresh_until and (max_age is None or entry.age(now) <= max_age):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return FRESH, entry
+        if now < entry.stale_until and max_age is None:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return STALE, entry
+        self.misses += 1
+        return MISS, None
+
+    def begin_revalidation(self, request: web.Request) -> Optional[tuple]:
+        """Claim the background refresh of a stale entry (None if one is already running)"""
+        primary = self.primary_key(request)
+        key = (primary, self._secondary_key(request, self._vary.get(primary, ())))
+        if key in self._revalidating:
+            return None
+        self._revalidating.add(key)
+        self.revalidations += 1
+        return key
+
+    def end_revalidation(self, key: tuple):
+        self._revalidating.discard(key)
+
+    def respond(self, request: web.Request, entry: CachedResponse) -> web.Response:
+        """Build the client response for a hit, answering If-None-Match locally"""
+        now = time.monotonic()
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            headers = CIMultiDict((name, value) for name, value in entry.headers.items()
+                                  if name.lower() in NOT_MODIFIED_HEADERS)
+            headers['Age'] = str(entry.age(now))
+            return web.Response(status=304, headers=headers)
+
+        headers = CIMultiDict(entry.headers)
+        headers['Age'] = str(entry.age(now))
+        if now >= entry.fresh_until:
+            headers['Warning'] = '110 - "Response is Stale"'
+        body = b'' if request.method == 'HEAD' else entry.body
+        return web.Response(body=body, status=entry.status, headers=headers)
+
+    def _freshness(self, headers) -> Optional[Tuple[int, int]]:
+        """(lifetime, stale-while-revalidate) in seconds, or None if not storable"""
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if {'no-store', 'private', 'no-cache'} & directives.keys():
+            return None
+        lifetime = _seconds(directives, 's-maxage')
+        if lifetime is None:
+            lifetime = _seconds(directives, 'max-age')
+        if lifetime is None:
+            expires = _http_date(headers.get('Expires'))
+            if expires is None:
+                return None  # No explicit freshness; no heuristic caching
+            date = _http_date(headers.get('Date')) or time.time()
+            lifetime = max(0, int(expires - date))
+        if 'must-revalidate' in directives or 'proxy-revalidate' in directives:
+            return lifetime, 0
+        return lifetime, _seconds(directives, 'stale-while-revalidate') or 0
+
+    def store(self, request: web.Request, status: int, headers: CIMultiDict, body: bytes) -> Optional[CachedResponse]:
+        """Store a buffered backend response if it is cacheable and fits the budget"""
+        if request.method != 'GET' or status not in CACHEABLE_STATUSES or 'Set-Cookie' in headers:
+            return None
+        if len(body) > self.config.max_object_bytes:
+            return None
+        vary = tuple(sorted({name.strip().lower() for value in headers.getall('Vary', [])
+                             for name in value.split(',') if name.strip()}))
+        if '*' in vary:
+            return None
+        freshness = self._freshness(headers)
+        if freshness is None:
+            return None
+        lifetime, stale_while_revalidate = freshness
+        if lifetime == 0 and stale_while_revalidate == 0:
+            return None
+        try:
+            age = max(0, int(headers.get('Age', 0)))
+        except ValueError:
+            age = 0
+
+        primary = self.primary_key(request)
+        if self._vary.get(primary, vary) != vary:
+            self.invalidate(request)  # The resource's Vary changed; old variants are unreachable
+        entry = CachedResponse(status, CIMultiDict(headers), body, vary, age,
+                               lifetime, stale_while_revalidate)
+        if entry.size > self.config.max_bytes:
+            return None
+
+        key = (primary, self._secondary_key(request, vary))
+        self._remove(key)
+        self._entries[key] = entry
+        self._vary[primary] = vary
+        self._variants.setdefault(primary, set()).add(key[1])
+        self.bytes += entry.size
+        self.stores += 1
+        while self.bytes > self.config.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key: Tuple[str, Tuple[str, ...]]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        primary = key[0]
+        variants = self._variants.get(primary)
+        if variants is not None:
+            variants.discard(key[1])
+            if not variants:
+                del self._variants[primary]
+                self._vary.pop(primary, None)
+
+    def invalidate(self, request: web.Request):
+        """Drop every variant of the request's URL (used after unsafe methods)"""
+        primary = self.primary_key(request)
+        for secondary in list(self._variants.get(primary, ())):
+            self._remove((primary, secondary))
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "capacity_bytes": self.config.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0,
+            "not_modified": self.not_modified,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+        }
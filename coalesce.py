@@ -0,0 +1,212 @@
+"""
+Request coalescing (singleflight) for identical concurrent GET/HEAD requests
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+# Requests whose answer depends on more than the URL are never shared
+_PERSONAL_HEADERS = ('Authorization', 'Cookie', 'If-None-Match', 'If-Modified-Since', 'If-Match',
+                     'If-Unmodified-Since', 'If-Range', 'Range')
+
+@dataclass
+class CoalescingConfig:
+    vary_headers: Tuple[str, ...] = ('Accept', 'Accept-Encoding', 'Accept-Language')
+    max_waiters: int = 100      # Followers per flight; later requests go upstream themselves
+    window: float = 5.0         # Seconds after a flight starts during which it can be joined
+    max_replay_bytes: int = 1024 * 1024  # Streamed bytes kept for followers before the flight closes to joiners
+
+class _Reader:
+    """A follower's position in a flight's chunks"""
+    __slots__ = ('position', 'cut_off')
+
+    def __init__(self):
+        self.position = 0
+        self.cut_off = False
+
+class Flight:
+    """One upstream request whose response is replayed to every follower
+
+    The leader publishes the status and headers, then either the whole body
+    (buffered) or each chunk as it is relayed (streamed). Chunks are kept so a
+    follower that joins mid-stream still gets the full body, but only up to
+    max_replay_bytes: past that the flight stops admitting followers, and
+    chunks every attached follower has read are dropped. A follower that
+    falls more than max_replay_bytes behind is cut off.
+    """
+
+    def __init__(self, key: tuple, max_replay_bytes: int = CoalescingConfig.max_replay_bytes):
+        self.key = key
+        self.started = time.monotonic()
+        self.waiters = 0
+        self.status: Optional[int] = None
+        self.headers: Optional[CIMultiDict] = None
+        self.streamed = False
+        self.max_replay_bytes = max_replay_bytes
+        self.chunks: Deque[bytes] = deque()
+        self.first = 0          # Index of chunks[0] in the whole body; earlier chunks were dropped
+        self.retained = 0       # Bytes held in chunks
+        self.joinable = True
+        self.readers: Set[_Reader] = set()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._ready = asyncio.Event()        # Set once status/headers (or an error) are known
+        self._changed = asyncio.Event()      # Replaced after every chunk
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def start(self, status: int, headers: CIMultiDict, streamed: bool):
+        self.status = status
+        self.headers = headers
+        self.streamed = streamed
+        self._ready.set()
+
+    def attach(self) -> _Reader:
+        reader = _Reader()
+        self.readers.add(reader)
+        return reader
+
+    def feed(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.retained += len(chunk)
+        if self.retained > self.max_replay_bytes:
+            self.joinable = False
+            self._trim()
+        self._notify()
+
+    def _trim(self):
+        """Drop chunks every reader has passed, cutting off the slowest while still over the limit"""
+        while True:
+            end = self.first + len(self.chunks)
+            keep_from = min((reader.position for reader in self.readers), default=end)
+            while self.first < keep_from:
+                self.retained -= len(self.chunks.popleft())
+                self.first += 1
+            if self.retained <= self.max_replay_bytes or not self.readers or len(self.chunks) == 1:
+                return
+            slowest = min(self.readers, key=lambda reader: reader.position)
+            slowest.cut_off = True
+            self.readers.discard(slowest)
+
+    def finish(self, body: Optional[bytes] = None):
+        if body is not None:
+            self.chunks = deque([body])
+            self.first = 0
+            self.retained = len(body)
+        self.done = True
+        self._ready.set()
+        self._notify()
+
+    def fail(self, error: BaseException):
+        if not self.done:
+            self.error = error
+            self.done = True
+            self._ready.set()
+            self._notify()
+
+    async def wait_started(self) -> bool:
+        """Wait for the leader's response head; False if it failed before sending one"""
+        await self._ready.wait()
+        return self.status is not None
+
+    async def iter_chunks(self, reader: _Reader) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                changed = self._changed
+                while not reader.cut_off and reader.position < self.first + len(self.chunks):
+                    chunk = self.chunks[reader.position - self.first]
+                    reader.position += 1
+                    yield chunk
+                if reader.cut_off:
+                    raise ConnectionError("Coalesced follower fell too far behind the upstream response")
+                if self.done:
+                    if self.error is not None:
+                        raise ConnectionError(f"Coalesced upstream request failed: {self.error}")
+                    return
+                await changed.wait()
+        finally:
+            self.readers.discard(reader)
+
+class RequestCoalescer:
+    """Tracks in-flight upstream requests by method, path, query and configured headers"""
+
+    def __init__(self, config: Optional[CoalescingConfig] = None):
+        self.config = config or CoalescingConfig()
+        self.flights: Dict[tuple, Flight] = {}
+        self.leaders = 0       # Upstream requests made on behalf of a flight
+        self.followers = 0     # Requests answered from another request's flight (calls saved)
+        self.overflow = 0      # Requests that found a full flight and went upstream alone
+        self.fallbacks = 0     # Followers whose leader failed before responding
+
+    def key(self, request: web.Request) -> Optional[tuple]:
+        if request.method not in ('GET', 'HEAD') or request.body_exists:
+            return None
+        if any(name in request.headers for name in _PERSONAL_HEADERS):
+            return None
+        return (request.method, request.host, request.path_qs,
+                tuple(request.headers.get(name, '') for name in self.config.vary_headers))
+
+    def join(self, request: web.Request) -> Tuple[Optional[Flight], bool]:
+        """(flight, is_leader); flight is None when the request must not be coalesced"""
+        key = self.key(request)
+        if key is None:
+            return None, False
+        flight = self.flights.get(key)
+        if flight is not None and flight.joinable and time.monotonic() - flight.started < self.config.window:
+            if flight.waiters >= self.config.max_waiters:
+                self.overflow += 1
+                return None, False
+            flight.waiters += 1
+            self.followers += 1
+            return flight, False
+        # Nothing joinable: this request leads a new flight
+        flight = self.flights[key] = Flight(key, self.config.max_replay_bytes)
+        self.leaders += 1
+        return flight, True
+
+    def release(self, flight: Flight):
+        """Leader is finished; stop new requests joining (followers keep their reference)"""
+        if not flight.done:
+            flight.fail(ConnectionError("Leader request ended without a response"))
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+    async def follow(self, request: web.Request, flight: Flight) -> Optional[web.StreamResponse]:
+        """Replay a flight's response to a follower; None if it should go upstream itself"""
+        reader = flight.attach()  # Before the first await, so no chunk can be dropped unread
+        if not await flight.wait_started():
+            flight.readers.discard(reader)
+            self.followers -= 1
+            self.fallbacks += 1
+            return None
+        headers = CIMultiDict(flight.headers)
+        # Cookies the backend set were meant for the leader's client only
+        headers.popall('Set-Cookie', None)
+        if not flight.streamed:
+            body = b''.join([chunk async for chunk in flight.iter_chunks(reader)])
+            return web.Response(body=body, status=flight.status, headers=headers)
+
+        response = web.StreamResponse(status=flight.status, headers=headers)
+        await response.prepare(request)
+        async for chunk in flight.iter_chunks(reader):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    def get_stats(self) -> dict:
+        requests = self.leaders + self.followers
+        return {
+            "in_flight": len(self.flights),
+            "upstream_calls": self.leaders,
+            "saved_calls": self.followers,
+            "saved_ratio": round(self.followers / requests, 4) if requests else 0,
+            "overflow": self.overflow,
+            "fallbacks": self.fallbacks,
+        }
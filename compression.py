@@ -0,0 +1,154 @@
+"""
+On-the-fly compression of proxied responses, negotiated from Accept-Encoding
+"""
+import asyncio
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from aiohttp import web
+
+from assets import COMPRESSIBLE_TYPES, ENCODINGS, brotli, choose_encoding
+from streaming import BODYLESS_STATUSES
+
+@dataclass
+class CompressionConfig:
+    min_bytes: int = 1024                # Smaller bodies are sent as they are
+    content_types: Tuple[str, ...] = COMPRESSIBLE_TYPES  # Content-Type prefixes worth compressing
+    gzip_level: int = 6
+    brotli_quality: int = 4              # Brotli's fast end; 11 is for precompressed assets
+    thread_threshold: int = 32 * 1024    # Bodies and chunks this large compress in the pool
+    threads: int = 2                     # Pool size; also bounds queued jobs to 4 per thread
+
+class _Encoder:
+    """Incremental gzip or brotli encoder for one response"""
+    __slots__ = ('compress', 'sync', 'flush')
+
+    def __init__(self, coding: str, config: CompressionConfig):
+        if coding == 'br':
+            encoder = brotli.Compressor(quality=config.brotli_quality)
+            self.compress, self.sync, self.flush = encoder.process, encoder.flush, encoder.finish
+        else:
+            encoder = zlib.compressobj(config.gzip_level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+            self.compress, self.flush = encoder.compress, encoder.flush
+            self.sync = lambda: encoder.flush(zlib.Z_SYNC_FLUSH)
+
+class ResponseCompressor:
+    """Compresses proxied bodies the client accepts, off the event loop when they are large
+
+    Buffered bodies are compressed in one call and streamed bodies chunk by
+    chunk through an incremental encoder. Work on anything at least
+    thread_threshold bytes runs in a small thread pool (zlib and brotli
+    release the GIL), with at most 4 jobs per thread queued before callers
+    wait; smaller pieces are cheaper to compress inline than to hand off.
+    """
+
+    def __init__(self, config: Optional[CompressionConfig] = None):
+        self.config = config or CompressionConfig()
+        self._executor = ThreadPoolExecutor(self.config.threads, thread_name_prefix='compress')
+        self._slots = asyncio.Semaphore(self.config.threads * 4)
+        self.responses = {coding: 0 for coding in ENCODINGS}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.offloaded = 0
+
+    def encoding_for(self, request: web.Request, status: int, headers, length: Optional[int]) -> Optional[str]:
+        """Coding to apply to this response, or None to relay it untouched"""
+        if request.method == 'HEAD' or status < 200 or status in BODYLESS_STATUSES or status == 206:
+            return None
+        if 'Content-Encoding' in headers or 'no-transform' in headers.get('Cache-Control', ''):
+            return None
+        if not headers.get('Content-Type', '').lower().startswith(self.config.content_types):
+            return None
+        if length is not None and length < self.config.min_bytes:
+            return None
+        return choose_encoding(request.headers.get('Accept-Encoding'), ENCODINGS)
+
+    @staticmethod
+    def mark_encoded(headers, coding: str):
+        """Headers for the compressed representation (length unknown, ETag no longer byte-exact)"""
+        headers['Content-Encoding'] = coding
+        headers.popall('Content-Length', None)
+        vary = headers.get('Vary')
+        if not vary:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower() and vary.strip() != '*':
+            headers['Vary'] = f"{vary}, Accept-Encoding"
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = f"W/{etag}"
+
+    async def _run(self, work: Callable[[], bytes], size: int) -> bytes:
+        def timed():
+            start = time.thread_time()
+            output = work()
+            return output, time.thread_time() - start
+
+        if size >= self.config.thread_threshold:
+            async with self._slots:
+                output, cpu = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+            self.offloaded += 1
+        else:
+            output, cpu = timed()
+        self.cpu_seconds += cpu
+        self.bytes_in += size
+        self.bytes_out += len(output)
+        return output
+
+    async def compress(self, coding: str, body: bytes) -> bytes:
+        encoder = _Encoder(coding, self.config)
+        self.responses[coding] += 1
+        return await self._run(lambda: encoder.compress(body) + encoder.flush(), len(body))
+
+    async def apply(self, request: web.Request, response: web.Response) -> web.Response:
+        """Compress a buffered response in place if the client and content allow it"""
+        body = response.body
+        if not isinstance(body, bytes):
+            return response
+        coding = self.encoding_for(request, response.status, response.headers, len(body))
+        if coding is None:
+            return response
+        compressed = await self.compress(coding, body)
+        self.mark_encoded(response.headers, coding)
+        response.body = compressed
+        return response
+
+    def encoder(self, coding: str) -> 'StreamEncoder':
+        self.responses[coding] += 1
+        return StreamEncoder(self, _Encoder(coding, self.config))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> dict:
+        return {
+            "responses": dict(self.responses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "offloaded": self.offloaded,
+        }
+
+class StreamEncoder:
+    """Compresses one streamed body chunk by chunk; calls are awaited one at a time
+
+    Each chunk is flushed, so whatever the backend has sent reaches the
+    client right away (event streams, long polls) instead of sitting in the
+    encoder until enough data piles up.
+    """
+    __slots__ = ('_compressor', '_encoder')
+
+    def __init__(self, compressor: ResponseCompressor, encoder: _Encoder):
+        self._compressor = compressor
+        self._encoder = encoder
+
+    async def feed(self, chunk: bytes) -> bytes:
+        encoder = self._encoder
+        return await self._compressor._run(lambda: encoder.compress(chunk) + encoder.sync(), len(chunk))
+
+    async def finish(self) -> bytes:
+        return await self._compressor._run(self._encoder.flush, 0)
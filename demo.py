@@ -4,6 +4,7 @@ Demo script to showcase all load balancer features
 Run this to see the load balancer in action!
 """
 
+import shlex
 import subprocess
 import time
 import signal
@@ -14,7 +15,7 @@ from pathlib import Path
 class Demo:
     def __init__(self):
         self.processes = []
-        self.python_cmd = "/Users/abinas/Desktop/all/code/updated_load_balancer/.venv/bin/python"
+        self.python_cmd = shlex.quote(sys.executable)
     
     def start_process(self, cmd, name):
         """Start a background process"""
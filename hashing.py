@@ -0,0 +1,221 @@
+"""
+Maglev consistent hashing for stateless request affinity
+"""
+import asyncio
+import hashlib
+from typing import Dict, Generator, List, Optional, Set, Tuple
+
+DEFAULT_TABLE_SIZE = 65537  # Prime, and well above 100x any expected backend count
+BUILD_CHUNK = 4096          # Slot probes between yields to the event loop during a rebuild (~2 ms)
+MAX_PROBES = 64             # Slots a lookup walks past departed backends before falling back
+
+HASH_KEY_SOURCES = ('ip', 'path', 'header', 'cookie')
+
+def hash64(data: str, salt: bytes = b'') -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8, salt=salt).digest(), 'little')
+
+def parse_hash_key(spec: str):
+    """Parse 'ip', 'path', 'header:<name>' or 'cookie:<name>' into (source, name)"""
+    source, _, name = spec.partition(':')
+    source = source.strip().lower()
+    if source not in HASH_KEY_SOURCES:
+        raise ValueError(f"Unknown hash key source '{source}' (expected one of {', '.join(HASH_KEY_SOURCES)})")
+    if source in ('header', 'cookie') and not name:
+        raise ValueError(f"Hash key '{spec}' needs a name, e.g. {source}:X-User-Id")
+    return source, name
+
+def request_hash_key(request, source: str, name: str = '') -> str:
+    """Extract the affinity key from a request, falling back to the client IP"""
+    if source == 'path':
+        return request.path
+    if source == 'header':
+        value = request.headers.get(name)
+    elif source == 'cookie':
+        value = request.cookies.get(name)
+    else:
+        value = None
+    return value or request.remote or 'unknown'
+
+def is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    if n % 2 == 0:
+        return n == 2
+    divisor = 3
+    while divisor * divisor <= n:
+        if n % divisor == 0:
+            return False
+        divisor += 2
+    return True
+
+def iter_build(members: List[str], size: int,
+               chunk: int = BUILD_CHUNK) -> Generator[None, None, Tuple[List[int], List[int]]]:
+    """build_table in steps: yields after every `chunk` slot probes, returns (table, slots per member)
+
+    Each member fills slots along its own permutation in turn. `size` must be
+    prime, so every skip is coprime with it and each permutation visits every
+    slot.
+    """
+    count = len(members)
+    if not count:
+        return [], []
+    offsets = [hash64(key, b'offset') % size for key in members]
+    skips = [hash64(key, b'skip') % (size - 1) + 1 for key in members]
+    positions = [0] * count
+    table = [-1] * size
+    filled = 0
+    probes = 0
+    while True:
+        for i in range(count):
+            offset, skip = offsets[i], skips[i]
+            slot = (offset + positions[i] * skip) % size
+            while table[slot] >= 0:
+                positions[i] += 1
+                slot = (offset + positions[i] * skip) % size
+                probes += 1
+                if probes >= chunk:
+                    # Fills and probes both count: late in a build one fill can take many probes
+                    probes = 0
+                    yield
+            table[slot] = i
+            positions[i] += 1
+            filled += 1
+            probes += 1
+            if filled == size:
+                counts = [0] * count
+                for index in table:
+                    counts[index] += 1
+                return table, counts
+
+def build_table(members: List[str], size: int) -> Tuple[List[int], List[int]]:
+    """(table, slots per member), built in one go"""
+    steps = iter_build(members, size)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+class MaglevTable:
+    """Maglev lookup table (Eisenbud et al., NSDI 2016)
+
+    Every backend fills table slots in the order of its own permutation until
+    the table is full, so each gets ~table_size/N slots and a membership change
+    only moves a small share of slots. Lookups are a single list index.
+
+    The first lookup builds the table. After that, a membership change
+    rebuilds it as a task on the event loop, BUILD_CHUNK probes at a time (one
+    rebuild at a time, repeated while changes keep coming), and swaps it in
+    when done. The build is pure Python and holds the GIL, so a worker thread
+    would stall the loop just the same; chunking bounds each pause instead.
+    Meanwhile the old table stays in use: slots of backends that have since
+    left fall through to the next slot, for at most MAX_PROBES slots, after
+    which the key is spread over the current members directly.
+    """
+
+    def __init__(self, table_size: int = DEFAULT_TABLE_SIZE):
+        if not is_prime(table_size):
+            raise ValueError(f"Maglev table size must be prime, got {table_size}")
+        self.table_size = table_size
+        self.members: List[str] = []
+        self._member_set: Set[str] = set()
+        self._table: List[int] = []
+        self._table_members: List[str] = []  # Members the current table was built from
+        self._slot_counts: List[int] = []
+        self._version = 0        # Bumped on every membership change
+        self._built_version = -1
+        self._active = False     # Set by the first lookup; until then changes just wait for it
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def add(self, key: str):
+        if key not in self._member_set:
+            self._member_set.add(key)
+            self.members.append(key)
+            self._changed()
+
+    def remove(self, key: str):
+        if key in self._member_set:
+            self._member_set.discard(key)
+            self.members.remove(key)
+            self._changed()
+
+    def _changed(self):
+        self._version += 1
+        if not self._active or self._rebuild_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No event loop: the next lookup rebuilds
+        self._rebuild_task = loop.create_task(self._rebuild_in_steps())
+
+    def _install(self, version: int, members: List[str], table: List[int], counts: List[int]):
+        if version > self._built_version:
+            self._built_version = version
+            self._table_members = members
+            self._table = table
+            self._slot_counts = counts
+            self.rebuilds += 1
+
+    async def _rebuild_in_steps(self):
+        try:
+            while self._built_version != self._version:
+                version = self._version
+                # Sorted so the table does not depend on the order servers were added
+                members = sorted(self.members)
+                steps = iter_build(members, self.table_size)
+                while True:
+                    try:
+                        next(steps)
+                    except StopIteration as done:
+                        table, counts = done.value
+                        break
+                    await asyncio.sleep(0)
+                self._install(version, members, table, counts)
+        finally:
+            self._rebuild_task = None
+
+    def rebuild(self):
+        """Build the table for the current members now (blocking)"""
+        members = sorted(self.members)
+        self._install(self._version, members, *build_table(members, self.table_size))
+        self._active = True
+
+    def lookup(self, key: str) -> Optional[str]:
+        if self._built_version != self._version and (self._rebuild_task is None or not self._table):
+            self.rebuild()  # First use, no event loop to rebuild on, or nothing to serve from yet
+        table = self._table
+        if not table or not self._member_set:
+            return None
+        digest = hash64(key)
+        slot = digest % self.table_size
+        member = self._table_members[table[slot]]
+        if member not in self._member_set:
+            # A rebuild is under way and this backend has left; use the next slot's
+            for _ in range(MAX_PROBES):
+                slot = (slot + 1) % self.table_size
+                member = self._table_members[table[slot]]
+                if member in self._member_set:
+                    return member
+            # Most of the table has left (e.g. all but one backend failed at once)
+            return self.members[digest % len(self.members)]
+        return member
+
+    def get_stats(self) -> dict:
+        """Slot distribution across backends; imbalance is max share over ideal share"""
+        if self._built_version != self._version and self._rebuild_task is None:
+            self.rebuild()
+        slots: Dict[str, int] = dict(zip(self._table_members, self._slot_counts))
+        ideal = self.table_size / len(slots) if slots else 0
+        return {
+            "table_size": self.table_size,
+            "max_slots": max(slots.values(), default=0),
+            "min_slots": min(slots.values(), default=0),
+            "imbalance": round(max(slots.values()) / ideal, 4) if ideal else 0,
+            "rebuilds": self.rebuilds,
+            "slots": slots,
+        }
@@ -0,0 +1,220 @@
+"""
+Concurrent health-check engine with adaptive intervals and passive signals
+"""
+import asyncio
+import aiohttp
+import heapq
+import random
+import time
+import logging
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class HealthCheckConfig:
+    path: str = '/health'
+    interval: float = 10.0           # Starting interval for a healthy server
+    failing_interval: float = 2.0    # Interval while a server is failing or recovering
+    stable_interval: float = 30.0    # Interval a long-stable server backs off to
+    backoff: float = 1.5             # Interval growth factor per successful probe
+    jitter: float = 0.1              # +/- fraction applied to every interval
+    timeout: float = 2.0
+    rise: int = 2                    # Consecutive successes to mark a server up
+    fall: int = 3                    # Consecutive failures to mark a server down
+    passive_fall: int = 3            # Consecutive live-traffic failures to mark a server down
+    max_concurrency: int = 50        # Probes in flight at once
+
+class _ProbeState:
+    __slots__ = ('successes', 'failures', 'passive_failures', 'interval', 'next_due', 'in_progress')
+
+    def __init__(self, interval: float):
+        self.successes = 0
+        self.failures = 0
+        self.passive_failures = 0
+        self.interval = interval
+        self.next_due = 0.0
+        self.in_progress = False
+
+class HealthChecker:
+    """Schedules active /health probes and folds in passive signals from live traffic
+
+    `servers` is the balancer's live server dict; `set_health(server, healthy)` is
+    called only when a server crosses its rise/fall threshold.
+    """
+
+    def __init__(self, servers: Dict, set_health: Callable, config: Optional[HealthCheckConfig] = None,
+                 probe_latency=None):
+        self.servers = servers
+        self.set_health = set_health
+        self.config = config or HealthCheckConfig()
+        self.probe_latency = probe_latency  # Optional global histogram for all probes
+        self.probes_total = 0
+        self.probe_failures = 0
+        self._states: Dict[str, _ProbeState] = {}
+        self._schedule: List[Tuple[float, str]] = []  # Min-heap of (due time, server key)
+        self._wakeup = asyncio.Event()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._probes = set()
+        for key in servers:
+            self.track(key)
+
+    def _jittered(self, interval: float) -> float:
+        jitter = self.config.jitter
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def _schedule_probe(self, key: str, state: _ProbeState, delay: float):
+        state.next_due = time.monotonic() + delay
+        heapq.heappush(self._schedule, (state.next_due, key))
+        self._wakeup.set()
+
+    def track(self, key: str):
+        """Start probing a server (first probe is spread over the failing interval)"""
+        if key not in self._states:
+            state = self._states[key] = _ProbeState(self.config.interval)
+            self._schedule_probe(key, state, random.uniform(0, self.config.failing_interval))
+
+    def untrack(self, key: str):
+        # Stale heap entries for this key are skipped when popped
+        self._states.pop(key, None)
+
+    def report_success(self, key: str):
+        """Passive signal: a proxied request to this server succeeded"""
+        state = self._states.get(key)
+        if state:
+            state.passive_failures = 0
+
+    def report_failure(self, key: str):
+        """Passive signal: a proxied request failed or returned 5xx"""
+        state = self._states.get(key)
+        server = self.servers.get(key)
+        if not state or not server:
+            return
+        state.passive_failures += 1
+        if server.is_healthy and state.passive_failures >= self.config.passive_fall:
+            logger.warning(f"Marking {key} down after {state.passive_failures} failed requests")
+            state.successes = 0
+            state.failures = self.config.fall
+            state.interval = self.config.failing_interval
+            self.set_health(server, False)
+            # Re-probe soon so the server can rise again without waiting a full interval
+            self._schedule_probe(key, state, self._jittered(self.config.failing_interval))
+
+    def _record(self, key: str, state: _ProbeState, healthy: bool):
+        server = self.servers.get(key)
+        if server is None:
+            return
+        server.last_health_check = datetime.now()
+        config = self.config
+
+        if healthy:
+            state.successes += 1
+            state.failures = 0
+            if not server.is_healthy and state.successes >= config.rise:
+                logger.info(f"Server {key} is back up")
+                state.passive_failures = 0
+                self.set_health(server, True)
+        else:
+            state.failures += 1
+            state.successes = 0
+            if server.is_healthy and state.failures >= config.fall:
+                logger.warning(f"Server {key} failed {state.failures} health checks, marking down")
+                self.set_health(server, False)
+
+        # Probe often while failing or recovering, back off while stable
+        if state.failures or not server.is_healthy:
+            state.interval = config.failing_interval
+        elif state.successes < config.rise:
+            state.interval = config.interval
+        else:
+            state.interval = min(max(state.interval, config.interval) * config.backoff, config.stable_interval)
+
+    async def _probe(self, key: str, state: _ProbeState):
+        server = self.servers.get(key)
+        healthy = False
+        try:
+            async with self._semaphore:
+                # Timed from here, so waiting for a probe slot is not charged to the backend
+                start_time = time.time()
+                async with self._session.get(f"http://{server.host}:{server.port}{self.config.path}") as resp:
+                    await resp.read()
+                    healthy = resp.status == 200
+                response_time = time.time() - start_time
+            server.probe_latency.record(response_time)
+            if self.probe_latency is not None:
+                self.probe_latency.record(response_time)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Health check failed for {key}: {e!r}")
+        finally:
+            state.in_progress = False
+
+        self.probes_total += 1
+        if not healthy:
+            self.probe_failures += 1
+        if self._states.get(key) is state:
+            self._record(key, state, healthy)
+            self._schedule_probe(key, state, self._jittered(state.interval))
+
+    def _dispatch_due(self) -> float:
+        """Start every probe that is due; return seconds until the next one"""
+        now = time.monotonic()
+        while self._schedule:
+            due, key = self._schedule[0]
+            if due > now:
+                return due - now
+            heapq.heappop(self._schedule)
+            state = self._states.get(key)
+            # Skip entries superseded by a reschedule or a removed server
+            if state is None or state.in_progress or state.next_due != due:
+                continue
+            state.in_progress = True
+            task = asyncio.create_task(self._probe(key, state))
+            self._probes.add(task)
+            task.add_done_callback(self._probes.discard)
+        return self.config.stable_interval
+
+    async def run(self):
+        """Background task: one shared session, bounded fan-out"""
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.config.timeout),
+            connector=aiohttp.TCPConnector(limit=self.config.max_concurrency),
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        try:
+            while True:
+                self._wakeup.clear()
+                delay = self._dispatch_due()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._probes):
+                task.cancel()
+            await self._session.close()
+
+    def get_server_stats(self, key: str) -> dict:
+        state = self._states.get(key)
+        if state is None:
+            return {}
+        return {
+            "consecutive_successes": state.successes,
+            "consecutive_failures": state.failures,
+            "passive_failures": state.passive_failures,
+            "check_interval": f"{state.interval:.1f}s",
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "probes_total": self.probes_total,
+            "probe_failures": self.probe_failures,
+            "rise": self.config.rise,
+            "fall": self.config.fall,
+            "max_concurrency": self.config.max_concurrency,
+        }
@@ -0,0 +1,229 @@
+"""
+Fixed-memory, log-bucketed (HDR-style) latency histograms
+"""
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Values are recorded in whole microseconds. Below 2**SUB_BUCKET_BITS each
+# microsecond has its own bucket; above that every power of two is split into
+# 2**(SUB_BUCKET_BITS - 1) linear sub-buckets, bounding relative error to ~3%.
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+MAX_VALUE_US = (1 << 32) - 1  # ~71 minutes; larger values are clamped
+BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_VALUE_US.bit_length() - SUB_BUCKET_BITS) * SUB_BUCKET_HALF
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Fixed upper bounds (seconds) counted alongside the fine buckets so /metrics can
+# export a Prometheus histogram without walking BUCKET_COUNT counters per scrape
+EXPORT_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_BOUNDS_US = tuple(int(bound * 1_000_000) for bound in EXPORT_BOUNDS)
+
+def bucket_index(value_us: int) -> int:
+    if value_us < SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + ((value_us >> shift) - SUB_BUCKET_HALF)
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """Inclusive lower and exclusive upper bound of a bucket, in microseconds"""
+    if index < SUB_BUCKET_COUNT:
+        return index, index + 1
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    mantissa = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+    return mantissa << shift, (mantissa + 1) << shift
+
+def _empty_counts() -> array:
+    return array('Q', bytes(8 * BUCKET_COUNT))
+
+class _Slice:
+    """Counts for one time slice of the rolling window"""
+    __slots__ = ('epoch', 'counts', 'total', 'sum_us', 'max_us')
+
+    def __init__(self):
+        self.epoch = -1
+        self.counts = _empty_counts()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def reset(self, epoch: int):
+        self.epoch = epoch
+        self.counts = _empty_counts()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+class LatencyHistogram:
+    """Lifetime histogram plus a rolling window made of `slices` time slices
+
+    record() is O(1) and memory is fixed at (slices + 2) * BUCKET_COUNT counters.
+    Window slices are allocated on first use, so idle histograms stay small.
+    The window's merged counts are kept up to date as values are recorded and
+    slices expire, so windowed reads never merge slices, and summaries are
+    reused until something is recorded or the window moves.
+    """
+
+    def __init__(self, window: float = 60.0, slices: int = 6):
+        self.window = window
+        self.slice_seconds = window / slices
+        self.counts = _empty_counts()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+        # Lifetime counts per EXPORT_BOUNDS bucket (value <= bound); the last is +Inf
+        self.export_counts = array('Q', bytes(8 * (len(EXPORT_BOUNDS) + 1)))
+        self._slices: List[Optional[_Slice]] = [None] * slices
+        self._current: Optional[_Slice] = None
+        self._current_end = 0.0  # Monotonic time at which the current slice closes
+        self._window: Optional[_Slice] = None  # Sum of the slices not yet expired
+        self._summaries: Dict[bool, Tuple[tuple, dict]] = {}  # windowed -> (state, summary)
+
+    def record(self, seconds: float):
+        value_us = int(seconds * 1_000_000)
+        if value_us < 0:
+            value_us = 0
+        elif value_us > MAX_VALUE_US:
+            value_us = MAX_VALUE_US
+        index = bucket_index(value_us)
+
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+        self.export_counts[bisect_left(EXPORT_BOUNDS_US, value_us)] += 1
+
+        now = time.monotonic()
+        if now >= self._current_end:
+            self._advance(now)
+        current = self._current
+        current.counts[index] += 1
+        current.total += 1
+        current.sum_us += value_us
+        if value_us > current.max_us:
+            current.max_us = value_us
+        window = self._window
+        window.counts[index] += 1
+        window.total += 1
+        window.sum_us += value_us
+
+    def _advance(self, now: float):
+        epoch = int(now // self.slice_seconds)
+        position = epoch % len(self._slices)
+        current = self._slices[position]
+        if current is None:
+            current = self._slices[position] = _Slice()
+            if self._window is None:
+                self._window = _Slice()
+        if current.epoch != epoch:
+            if current.total:
+                self._drop(current)
+            current.reset(epoch)
+        self._current = current
+        self._current_end = (epoch + 1) * self.slice_seconds
+
+    def _drop(self, expired: _Slice):
+        """Subtract a slice that left the window from the window's counts"""
+        window = self._window
+        counts = window.counts
+        for i, count in enumerate(expired.counts):
+            if count:
+                counts[i] -= count
+        window.total -= expired.total
+        window.sum_us -= expired.sum_us
+
+    def _expire(self) -> int:
+        """Drop slices that aged out of the window since the last record; returns the current epoch"""
+        epoch = int(time.monotonic() // self.slice_seconds)
+        oldest = epoch - len(self._slices) + 1
+        for s in self._slices:
+            if s is not None and s.total and s.epoch < oldest:
+                self._drop(s)
+                s.reset(s.epoch)
+        return epoch
+
+    def _live_slices(self) -> List[_Slice]:
+        epoch = int(time.monotonic() // self.slice_seconds)
+        oldest = epoch - len(self._slices) + 1
+        return [s for s in self._slices if s is not None and oldest <= s.epoch <= epoch]
+
+    @property
+    def mean(self) -> float:
+        """Lifetime mean in seconds"""
+        return self.sum_us / self.total / 1_000_000 if self.total else 0
+
+    def snapshot(self, windowed: bool = False) -> Tuple[Iterable[int], int, int, int]:
+        """(counts, total, sum_us, max_us) for the lifetime or the rolling window"""
+        if not windowed:
+            return self.counts, self.total, self.sum_us, self.max_us
+        if self._window is None:
+            return _empty_counts(), 0, 0, 0
+        self._expire()
+        window = self._window
+        return (window.counts, window.total, window.sum_us,
+                max((s.max_us for s in self._live_slices()), default=0))
+
+    def window_totals(self) -> Tuple[int, int]:
+        """(count, sum_us) over the rolling window"""
+        if self._window is None:
+            return 0, 0
+        self._expire()
+        return self._window.total, self._window.sum_us
+
+    def percentiles(self, quantiles: Iterable[float] = DEFAULT_QUANTILES, windowed: bool = False) -> Dict[float, float]:
+        counts, total, _, max_us = self.snapshot(windowed)
+        return _percentiles(counts, total, max_us, quantiles)
+
+    def summary(self, windowed: bool = False) -> dict:
+        """Count, mean, p50/p90/p99/p999 and max in milliseconds"""
+        # Unchanged until a value is recorded (or merged), or the window moves on
+        state = (self.total, int(time.monotonic() // self.slice_seconds) if windowed else 0)
+        cached = self._summaries.get(windowed)
+        if cached is not None and cached[0] == state:
+            return dict(cached[1])
+        counts, total, sum_us, max_us = self.snapshot(windowed)
+        values = _percentiles(counts, total, max_us, DEFAULT_QUANTILES)
+        summary = {
+            "count": total,
+            "mean_ms": round(sum_us / total / 1000, 3) if total else 0,
+            "p50_ms": round(values[0.5] * 1000, 3),
+            "p90_ms": round(values[0.9] * 1000, 3),
+            "p99_ms": round(values[0.99] * 1000, 3),
+            "p999_ms": round(values[0.999] * 1000, 3),
+            "max_ms": round(max_us / 1000, 3),
+        }
+        self._summaries[windowed] = (state, summary)
+        return dict(summary)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's lifetime counts into this one"""
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        for i, count in enumerate(other.export_counts):
+            self.export_counts[i] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+def _percentiles(counts, total: int, max_us: int, quantiles: Iterable[float]) -> Dict[float, float]:
+    """Each quantile as the midpoint (seconds) of the bucket holding its rank
+
+    The running totals are built in C and stop at max_us's bucket, so the
+    cost is one pass plus a binary search per quantile rather than a Python
+    loop over the buckets.
+    """
+    quantiles = sorted(quantiles)
+    result = {q: 0.0 for q in quantiles}
+    if not total:
+        return result
+    cumulative = list(accumulate(counts[:bucket_index(max_us) + 1]))  # Nothing lies above max_us
+    for q in quantiles:
+        low, high = bucket_bounds(bisect_left(cumulative, max(1, int(q * total + 0.5))))
+        result[q] = min((low + high - 1) / 2, max_us) / 1_000_000
+    return result
@@ -0,0 +1,287 @@
+"""
+Fixed-memory stats history: per-backend time series at 1s, 1m and 10m resolution
+"""
+import asyncio
+import logging
+import math
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from histogram import EXPORT_BOUNDS, LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# (seconds per point, points kept): 1s for an hour, 1m and 10m for a day
+LEVELS = ((1, 3600), (60, 1440), (600, 144))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Most points a query returns; longer ranges get a coarser step
+MAX_POINTS = 1440
+
+AGGREGATE = '*'  # Series key for all backends together
+
+_NO_LATENCY = array('f', [math.nan] * len(QUANTILES))
+
+# Per export bucket: lower bound and width in milliseconds (the +Inf bucket reports the last bound)
+_LOWER_MS = [0.0] + [bound * 1000 for bound in EXPORT_BOUNDS]
+_WIDTH_MS = [(upper - lower) * 1000 for lower, upper in zip((0.0,) + EXPORT_BOUNDS, EXPORT_BOUNDS)] + [0.0]
+
+def delta_quantiles(counts, start_counts, total: int, quantiles: Iterable[float] = QUANTILES) -> List[float]:
+    """Quantiles in milliseconds of the samples added between two EXPORT_BOUNDS count snapshots
+
+    `total` is how many samples were added (at least one). Values are
+    interpolated within buckets, and values past the last bound report that
+    bound, as Prometheus' histogram_quantile does. One pass over the buckets.
+    """
+    ranks = [q * total for q in quantiles]
+    result = []
+    rank = ranks[0]
+    below = 0
+    for index in range(len(counts)):
+        n = counts[index] - start_counts[index]
+        if not n:
+            continue
+        reached = below + n
+        while reached >= rank:
+            result.append(_LOWER_MS[index] + _WIDTH_MS[index] * (rank - below) / n)
+            if len(result) == len(ranks):
+                return result
+            rank = ranks[len(result)]
+        below = reached
+    return result
+
+def bucket_quantiles(counts, quantiles: Iterable[float] = QUANTILES) -> List[float]:
+    """Quantiles in milliseconds from EXPORT_BOUNDS bucket counts, interpolated within buckets"""
+    return delta_quantiles(counts, [0] * len(counts), sum(counts), quantiles)
+
+class _Ring:
+    """One resolution of one series: parallel fixed-size arrays indexed by epoch % size"""
+    __slots__ = ('requests', 'errors', 'in_flight', 'latency')
+
+    def __init__(self, size: int):
+        self.requests = array('I', bytes(4 * size))
+        self.errors = array('I', bytes(4 * size))
+        self.in_flight = array('f', bytes(4 * size))
+        # p50, p95, p99 in milliseconds per slot, interleaved; NaN when nothing completed
+        self.latency = _NO_LATENCY * size
+
+class _Series:
+    """Rings for every level, plus the readings each level's open point started from
+
+    A reading is (requests, errors, latency export counts, latency total,
+    in-flight sum, in-flight samples), all running totals, so any point is
+    the difference between two readings.
+    """
+    __slots__ = ('created', 'rings', 'marks', 'in_flight_sum', 'in_flight_samples')
+
+    def __init__(self, created: int, reading: tuple):
+        self.created = created  # First second with data; earlier points read as gaps
+        self.rings = [_Ring(size) for _, size in LEVELS]
+        self.marks = [reading] * len(LEVELS)
+        self.in_flight_sum = 0.0
+        self.in_flight_samples = 0
+
+    def close(self, level: int, slot: int, reading: tuple):
+        """Write the point running from marks[level] to `reading` and start the next one there"""
+        requests, errors, counts, total, in_flight, samples = reading
+        start_requests, start_errors, start_counts, start_total, start_in_flight, start_samples = self.marks[level]
+        ring = self.rings[level]
+        ring.requests[slot] = max(0, requests - start_requests)
+        ring.errors[slot] = max(0, errors - start_errors)
+        samples -= start_samples
+        ring.in_flight[slot] = (in_flight - start_in_flight) / samples if samples else 0.0
+        base = slot * len(QUANTILES)
+        latency = ring.latency
+        if total > start_total:
+            # Histogram counts only grow, so the difference is the point's own samples
+            p50, p95, p99 = delta_quantiles(counts, start_counts, total - start_total)
+            latency[base] = p50
+            latency[base + 1] = p95
+            latency[base + 2] = p99
+        else:
+            latency[base:base + len(QUANTILES)] = _NO_LATENCY
+        self.marks[level] = reading
+
+class StatsHistory:
+    """Per-backend request/error rates, in-flight counts and latency percentiles over time
+
+    sample() runs once a second and writes one 1s point per backend, plus an
+    all-backends series, from the counter deltas since the previous sample.
+    When a minute (or ten) boundary passes, the 1m (10m) point is closed the
+    same way, straight from the counters rather than by re-reading finer
+    points. Latency percentiles are interpolated from the histograms' export
+    buckets in one pass, so no point walks the fine buckets, and a backend
+    with no completed requests is not looked at beyond its counters. Memory
+    is fixed at about 125 KB per backend.
+
+    Points are labelled with the wall-clock time they start at. A slot holds
+    data for a time only if its level's epoch table says so; anything else,
+    including seconds the sampler missed, reads as a gap. A late sample's
+    point carries the traffic of the seconds it missed.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self._series: Dict[str, _Series] = {}
+        self._epochs = [array('q', [-1]) * size for _, size in LEVELS]
+        self._open: List[Optional[int]] = [None] * len(LEVELS)  # Epoch of each level's open point
+        self._last_second: Optional[int] = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._series
+
+    def sample(self, readings: Iterable[Tuple[str, int, int, int, LatencyHistogram]],
+               aggregate_latency: LatencyHistogram, now: Optional[float] = None):
+        """Record (key, requests, errors, in_flight, latency) for every backend
+
+        Counters are lifetime totals. The sample closes the second before
+        `now`; backends missing from `readings` are dropped.
+        """
+        now = time.time() if now is None else now
+        second = int(now) - 1
+        if self._last_second is not None and second <= self._last_second:
+            return
+        self._last_second = second
+        self.samples += 1
+
+        # Rollup points that ended before this second close on the previous readings
+        closing = []
+        for level in range(1, len(LEVELS)):
+            step, size = LEVELS[level]
+            epoch = second // step
+            if self._open[level] != epoch:
+                if self._open[level] is not None:
+                    closing.append((level, self._open[level] % size))
+                    self._epochs[level][self._open[level] % size] = self._open[level]
+                self._open[level] = epoch
+
+        seen = {AGGREGATE}
+        totals = [0, 0, 0]
+        rows = []
+        for key, requests, errors, in_flight, latency in readings:
+            seen.add(key)
+            totals[0] += requests
+            totals[1] += errors
+            totals[2] += in_flight
+            rows.append((key, requests, errors, in_flight, latency))
+        rows.append((AGGREGATE, *totals, aggregate_latency))
+        for key in [key for key in self._series if key not in seen]:
+            del self._series[key]
+
+        slot = second % LEVELS[0][1]
+        for key, requests, errors, in_flight, latency in rows:
+            series = self._series.get(key)
+            if series is None:
+                reading = (requests, errors, tuple(latency.export_counts), latency.total, 0.0, 0)
+                self._series[key] = _Series(second + 1, reading)
+                continue
+            previous = series.marks[0]
+            for level, level_slot in closing:
+                series.close(level, level_slot, previous)
+            series.in_flight_sum += in_flight
+            series.in_flight_samples += 1
+            # Unchanged histograms share the previous snapshot instead of copying the counts
+            counts = tuple(latency.export_counts) if latency.total != previous[3] else previous[2]
+            series.close(0, slot, (requests, errors, counts, latency.total,
+                                   series.in_flight_sum, series.in_flight_samples))
+        self._epochs[0][slot] = second
+
+    def _pick_level(self, start: int, step: int) -> Tuple[int, int]:
+        """(level, step): the coarsest level that still covers `start` at `step`"""
+        covering = []
+        for level, (level_step, size) in enumerate(LEVELS):
+            oldest = (self._last_second // level_step - size + 1) * level_step
+            if oldest <= start or level == len(LEVELS) - 1:
+                covering.append(level)
+        for level in reversed(covering):
+            level_step = LEVELS[level][0]
+            if level_step <= step and step % level_step == 0:
+                return level, step
+        level = covering[0]
+        level_step = LEVELS[level][0]
+        return level, -(-step // level_step) * level_step
+
+    def query(self, key: str, start: float, end: float, step: Optional[int] = None) -> dict:
+        """Downsampled points for `key` between `start` and `end` (Unix seconds)
+
+        Each point sums requests and errors over its step and reports them per
+        second; in-flight is averaged. Percentiles come from the stored
+        points, request-weighted when a step spans several of them, and are
+        null for steps where nothing completed. Steps with no data are left out.
+        The range is clamped to what is retained: from the oldest point of the
+        coarsest level to the last sampled second.
+        """
+        series = self._series[key]
+        result = {
+            "server": "all" if key == AGGREGATE else key,
+            "timestamps": [], "requests_per_sec": [], "errors_per_sec": [], "in_flight": [],
+            **{f"p{round(q * 100)}_ms": [] for q in QUANTILES},
+        }
+        if self._last_second is None:
+            return result
+        coarsest_step, coarsest_size = LEVELS[-1]
+        oldest = (self._last_second // coarsest_step - coarsest_size + 1) * coarsest_step
+        start = max(int(start), oldest)
+        end = min(int(end), self._last_second + 1)
+        if start >= end:
+            return result
+        span = end - start
+        step = max(int(step or 1), -(-span // MAX_POINTS))
+        level, step = self._pick_level(start, step)
+        level_step, size = LEVELS[level]
+        ring = series.rings[level]
+        epochs = self._epochs[level]
+        latency_names = [f"p{round(q * 100)}_ms" for q in QUANTILES]
+        result.update({"from": start, "to": end, "step": step, "resolution": level_step})
+        # Epochs the ring still holds; a wide step never walks past them
+        last_epoch = self._last_second // level_step
+        first_epoch = last_epoch - size + 1
+
+        for bucket in range(start // step * step, end, step):
+            requests = errors = points = 0
+            in_flight = 0.0
+            weights = 0
+            latency = [0.0] * len(QUANTILES)
+            for epoch in range(max(bucket // level_step, first_epoch),
+                               min((bucket + step) // level_step, last_epoch + 1)):
+                slot = epoch % size
+                if epochs[slot] != epoch or epoch * level_step < series.created:
+                    continue
+                points += 1
+                requests += ring.requests[slot]
+                errors += ring.errors[slot]
+                in_flight += ring.in_flight[slot]
+                base = slot * len(QUANTILES)
+                if not math.isnan(ring.latency[base]):
+                    weight = max(ring.requests[slot], 1)
+                    weights += weight
+                    for i in range(len(QUANTILES)):
+                        latency[i] += ring.latency[base + i] * weight
+            if not points:
+                continue
+            seconds = points * level_step
+            result["timestamps"].append(bucket)
+            result["requests_per_sec"].append(round(requests / seconds, 3))
+            result["errors_per_sec"].append(round(errors / seconds, 3))
+            result["in_flight"].append(round(in_flight / points, 3))
+            for name, total in zip(latency_names, latency):
+                result[name].append(round(total / weights, 3) if weights else None)
+        return result
+
+    async def run(self, sample: Callable[[], None]):
+        """Call `sample` just after every wall-clock second"""
+        while True:
+            await asyncio.sleep(1.0 - time.time() % 1.0 + 0.01)
+            try:
+                sample()
+            except Exception as e:
+                logger.error(f"Stats history sample failed: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "series": len(self._series),
+            "samples": self.samples,
+            "levels": [{"step": step, "points": size} for step, size in LEVELS],
+        }
@@ -0,0 +1,174 @@
+"""
+Adaptive per-backend concurrency limits with bounded queueing and load shedding
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+LIMIT_ALGORITHMS = ('gradient', 'aimd')
+
+class LoadShed(Exception):
+    """A backend is at its concurrency limit and its queue is full or timed out"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"{key} is over its concurrency limit")
+        self.retry_after = retry_after
+
+@dataclass
+class LimiterConfig:
+    algorithm: str = 'gradient'
+    initial_limit: int = 20
+    min_limit: int = 1
+    max_limit: int = 1000
+    queue_size: int = 50          # Requests allowed to wait per backend
+    queue_timeout: float = 1.0    # Seconds a queued request waits before it is shed
+    retry_after: float = 1.0      # Seconds suggested to shed clients
+    tolerance: float = 2.0        # gradient: recent RTT may reach this multiple of the baseline
+    smoothing: float = 0.2        # gradient: weight of each new limit estimate
+    baseline_window: float = 30.0  # gradient: seconds over which the minimum RTT is tracked
+    backoff: float = 0.9          # aimd: multiplier applied on a drop
+    latency_threshold: float = 2.0  # aimd: samples slower than this (seconds) count as drops
+
+class ConcurrencyLimiter:
+    """Concurrency limit for one backend, adapted from observed latency
+
+    gradient (after Netflix's concurrency-limits): the minimum RTT over the
+    last one to two baseline windows approximates the no-load latency and a
+    fast EWMA the current one. Their ratio shrinks the limit as queueing inside
+    the backend inflates latency, and a sqrt(limit) allowance lets it probe
+    upwards while latency stays flat.
+
+    aimd: the limit grows by 1/limit per successful sample (about one per
+    round trip) and is multiplied by `backoff` on an error or slow sample.
+    """
+
+    def __init__(self, key: str, config: LimiterConfig):
+        self.key = key
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.in_flight = 0
+        self.rtt_min = 0.0           # Baseline: min of the current and previous window
+        self.rtt_short = 0.0
+        self._window_min = math.inf
+        self._previous_min = math.inf
+        self._window_end = 0.0
+        self.shed = 0
+        self.queue_timeouts = 0
+        self._queue: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def acquire(self):
+        """Take a slot, waiting in the bounded queue if needed; raises LoadShed"""
+        if self.in_flight < int(self.limit) and not self._queue:
+            self.in_flight += 1
+            return
+        if len(self._queue) >= self.config.queue_size:
+            self.shed += 1
+            raise LoadShed(self.key, self.config.retry_after)
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue.append(waiter)
+        try:
+            # The slot is handed over (in_flight already counted) when the future resolves
+            await asyncio.wait_for(asyncio.shield(waiter), self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.queue_timeouts += 1
+            self.shed += 1
+            raise LoadShed(self.key, self.config.retry_after)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self.release()  # Granted just as we gave up; pass the slot on
+        else:
+            waiter.cancel()
+            try:
+                self._queue.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self):
+        while self._queue and self.in_flight < int(self.limit):
+            waiter = self._queue.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def observe(self, rtt: float, dropped: bool = False):
+        """Feed one response-head latency (or a failure) into the limit"""
+        config = self.config
+        if config.algorithm == 'aimd':
+            if dropped or rtt > config.latency_threshold:
+                self.limit = max(config.min_limit, self.limit * config.backoff)
+            elif self.in_flight * 2 >= self.limit:
+                # Only grow when the limit is actually being used
+                self.limit = min(config.max_limit, self.limit + 1 / self.limit)
+        else:
+            if dropped:
+                self.limit = max(config.min_limit, self.limit * 0.9)
+                return
+            now = time.monotonic()
+            if now >= self._window_end:
+                # Rotate windows so the baseline can rise if the backend got slower
+                self._previous_min, self._window_min = self._window_min, math.inf
+                self._window_end = now + config.baseline_window
+            self._window_min = min(self._window_min, rtt)
+            self.rtt_min = min(self._window_min, self._previous_min)
+            self.rtt_short = rtt if not self.rtt_short else self.rtt_short + (rtt - self.rtt_short) * 0.1
+            if self.in_flight * 2 < self.limit:
+                return  # App-limited: latency says nothing about the limit
+            gradient = max(0.5, min(1.0, config.tolerance * self.rtt_min / self.rtt_short))
+            estimate = self.limit * gradient + math.sqrt(self.limit)
+            self.limit = self.limit * (1 - config.smoothing) + estimate * config.smoothing
+            self.limit = max(config.min_limit, min(config.max_limit, self.limit))
+        self._grant()
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "shed": self.shed,
+            "queue_timeouts": self.queue_timeouts,
+            "rtt_baseline_ms": round(self.rtt_min * 1000, 3),
+            "rtt_recent_ms": round(self.rtt_short * 1000, 3),
+        }
+
+class ConcurrencyLimits:
+    """One ConcurrencyLimiter per backend"""
+
+    def __init__(self, config: Optional[LimiterConfig] = None):
+        self.config = config or LimiterConfig()
+        if self.config.algorithm not in LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown limit algorithm '{self.config.algorithm}'")
+        self.limiters: Dict[str, ConcurrencyLimiter] = {}
+
+    def get(self, key: str) -> ConcurrencyLimiter:
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = ConcurrencyLimiter(key, self.config)
+        return limiter
+
+    def remove(self, key: str):
+        self.limiters.pop(key, None)
+
+    def get_stats(self) -> dict:
+        return {
+            "algorithm": self.config.algorithm,
+            "queue_size": self.config.queue_size,
+            "queue_timeout": self.config.queue_timeout,
+            "shed": sum(l.shed for l in self.limiters.values()),
+            "queued": sum(l.queued for l in self.limiters.values()),
+        }
@@ -1,134 +1,294 @@
 #!/usr/bin/env python3
 """
 Load testing script for the load balancer
+
+By default the test is closed-loop: a fixed number of requests is kept in
+flight, so a slower balancer is also sent fewer requests. With --rate or
+--ramp it is open-loop instead: requests go out on a fixed schedule whatever
+the responses do, and latency is measured from when each request was due
+rather than when it was sent, so stalls show up in the tail instead of being
+hidden by the generator waiting (coordinated omission).
 """
 import aiohttp
 import asyncio
 import time
 import argparse
-from statistics import mean, median
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+from histogram import LatencyHistogram
+
+REPORT_QUANTILES = (0.5, 0.75, 0.9, 0.99, 0.999, 0.9999)
+
+# Sends starting this late mean the generator, not the target, is the bottleneck
+LAG_WARNING = 0.01
+
+Stage = Tuple[float, float, float]  # (start rate, end rate, seconds); rate changes linearly
+
+class Results:
+    """Histograms and counters for one run; merged across generator processes"""
+
+    def __init__(self, open_loop: bool = False):
+        self.latency = LatencyHistogram()  # From the intended send time when open-loop
+        self.service = LatencyHistogram() if open_loop else None  # From the actual send time
+        self.by_port = {}
+        self.failed = 0
+        self.error_samples: List[str] = []
+        self.max_lag = 0.0
+        self.late_sends = 0
+
+    def success(self, body: bytes, due: float, sent: float, done: float):
+        self.latency.record(done - due)
+        if self.service is not None:
+            self.service.record(done - sent)
+        try:
+            port = json.loads(body).get('server_port', 'unknown')
+        except (ValueError, AttributeError):
+            port = 'unknown'
+        self.by_port[port] = self.by_port.get(port, 0) + 1
+
+    def failure(self, message: str):
+        self.failed += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(message)
+
+    def merge(self, other: 'Results'):
+        self.latency.merge(other.latency)
+        if self.service is not None and other.service is not None:
+            self.service.merge(other.service)
+        for port, count in other.by_port.items():
+            self.by_port[port] = self.by_port.get(port, 0) + count
+        self.failed += other.failed
+        self.error_samples.extend(other.error_samples[:5 - len(self.error_samples)])
+        self.max_lag = max(self.max_lag, other.max_lag)
+        self.late_sends += other.late_sends
+
+async def send(session, url: str, request_id: int, due: float, results: Results):
+    """Make a single request and record the result"""
+    sent = time.perf_counter()
+    try:
+        async with session.get(f"{url}/test/{request_id}") as resp:
+            body = await resp.read()
+            if 200 <= resp.status < 300:
+                results.success(body, due, sent, time.perf_counter())
+            else:
+                results.failure(f"Request {request_id}: HTTP {resp.status}")
+    except Exception as e:
+        results.failure(f"Request {request_id}: {e!r}")
 
 class LoadTester:
     def __init__(self, url, concurrent_requests=10, total_requests=100):
         self.url = url
         self.concurrent_requests = concurrent_requests
         self.total_requests = total_requests
-        self.results = []
-        self.errors = []
-    
-    async def make_request(self, session, request_id):
-        """Make a single request and record the result"""
-        start_time = time.time()
-        try:
-            async with session.get(f"{self.url}/test/{request_id}") as resp:
-                end_time = time.time()
-                response_time = end_time - start_time
-                result = {
-                    'request_id': request_id,
-                    'status': resp.status,
-                    'response_time': response_time,
-                    'success': 200 <= resp.status < 300
-                }
-                
-                if result['success']:
-                    try:
-                        body = await resp.json()
-                        result['server_port'] = body.get('server_port', 'unknown')
-                    except:
-                        result['server_port'] = 'unknown'
-                
-                self.results.append(result)
-                return result
-        except Exception as e:
-            end_time = time.time()
-            error = {
-                'request_id': request_id,
-                'error': str(e),
-                'response_time': end_time - start_time
-            }
-            self.errors.append(error)
-            return error
-    
+        self.results = Results()
+
     async def run_load_test(self):
         """Run the load test"""
         print(f"Starting load test: {self.total_requests} requests with {self.concurrent_requests} concurrent")
         print(f"Target URL: {self.url}")
-        
+
         start_time = time.time()
-        
-        # Create semaphore to limit concurrent requests
-        semaphore = asyncio.Semaphore(self.concurrent_requests)
-        
-        async def bounded_request(session, request_id):
-            async with semaphore:
-                return await self.make_request(session, request_id)
-        
-        # Run all requests
+        queue = iter(range(self.total_requests))
+
+        async def worker(session):
+            for request_id in queue:
+                await send(session, self.url, request_id, time.perf_counter(), self.results)
+
         async with aiohttp.ClientSession() as session:
-            tasks = [
-                bounded_request(session, i) 
-                for i in range(self.total_requests)
-            ]
-            await asyncio.gather(*tasks)
-        
-        end_time = time.time()
-        total_time = end_time - start_time
-        
-        self.print_results(total_time)
-    
-    def print_results(self, total_time):
-        """Print test results"""
-        successful_requests = [r for r in self.results if r.get('success', False)]
-        failed_requests = len(self.errors) + len([r for r in self.results if not r.get('success', False)])
-        
-        response_times = [r['response_time'] for r in successful_requests]
-        
-        print("\n" + "="*60)
-        print("LOAD TEST RESULTS")
-        print("="*60)
-        
-        print(f"Total Requests: {self.total_requests}")
-        print(f"Successful Requests: {len(successful_requests)}")
-        print(f"Failed Requests: {failed_requests}")
-        print(f"Success Rate: {len(successful_requests)/self.total_requests:.2%}")
-        print(f"Total Time: {total_time:.2f} seconds")
-        print(f"Requests per Second: {self.total_requests/total_time:.2f}")
-        
-        if response_times:
+            await asyncio.gather(*(worker(session) for _ in range(self.concurrent_requests)))
+
+        total_time = time.time() - start_time
+        print_results(self.results, self.total_requests, total_time)
+
+def make_stage(start: float, end: float, seconds: float, label: str) -> Stage:
+    """A stage with finite rates >= 0 and a duration > 0; ValueError naming `label` otherwise"""
+    stage = (start, end, seconds)
+    if not all(math.isfinite(value) and value >= 0 for value in stage) or seconds == 0:
+        raise ValueError(f"Bad rate stage {label!r}: rates must be >= 0 and seconds > 0")
+    return stage
+
+def parse_stages(spec: str) -> List[Stage]:
+    """'100:10,100-1000:30' -> [(100, 100, 10), (100, 1000, 30)]: rate (or start-end ramp) : seconds"""
+    stages = []
+    for part in spec.split(','):
+        rates, _, seconds = part.strip().partition(':')
+        start, _, end = rates.partition('-')
+        try:
+            values = float(start), float(end or start), float(seconds)
+        except ValueError:
+            raise ValueError(f"Bad rate stage {part!r}") from None
+        stages.append(make_stage(*values, part))
+    return stages
+
+def send_times(stages: List[Stage]) -> Iterator[float]:
+    """Intended send offsets in seconds from the start, following the schedule exactly"""
+    offset = 0.0
+    carry = 0.0  # Fraction of a request already accrued by earlier stages
+    for start_rate, end_rate, seconds in stages:
+        slope = (end_rate - start_rate) / seconds
+        # Requests due t seconds into the stage: start_rate * t + slope * t^2 / 2
+        due = start_rate * seconds + slope * seconds * seconds / 2
+        count = int(due + carry + 1e-9)  # Fractions summed over stages can land just under a whole request
+        for n in range(1, count + 1):
+            needed = n - carry
+            if slope:
+                # Never below zero in exact arithmetic; rounding can dip under it when ramping down to 0
+                t = (math.sqrt(max(0.0, start_rate * start_rate + 2 * slope * needed)) - start_rate) / slope
+            else:
+                t = needed / start_rate
+            yield offset + t
+        carry = carry + due - count
+        offset += seconds
+
+def process_share(stages: List[Stage], index: int, processes: int) -> Iterator[Tuple[int, float]]:
+    """(request_id, offset) for every `processes`-th request of the schedule, starting at `index`"""
+    for request_id, offset in enumerate(send_times(stages)):
+        if request_id % processes == index:
+            yield request_id, offset
+
+async def generate(url: str, stages: List[Stage], index: int, processes: int,
+                   start_at: float, timeout: float) -> Results:
+    """Send this process's share (every `processes`-th request) of the schedule starting at `start_at`"""
+    results = Results(open_loop=True)
+    base = time.perf_counter() + (start_at - time.time())
+    in_flight = set()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        for request_id, offset in process_share(stages, index, processes):
+            due = base + offset
+            wait = due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                if -wait > LAG_WARNING:
+                    results.late_sends += 1
+                    results.max_lag = max(results.max_lag, -wait)
+                await asyncio.sleep(0)  # Behind schedule: still let started requests make progress
+            task = asyncio.create_task(send(session, url, request_id, due, results))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+    return results
+
+def generate_process(url: str, stages: List[Stage], index: int, processes: int,
+                     start_at: float, timeout: float) -> Results:
+    return asyncio.run(generate(url, stages, index, processes, start_at, timeout))
+
+class OpenLoopTester:
+    """Sends requests on a rate schedule from one or more processes"""
+
+    def __init__(self, url: str, stages: List[Stage], processes: int = 1, timeout: float = 30.0):
+        self.url = url
+        self.stages = stages
+        self.processes = processes
+        self.timeout = timeout
+
+    async def run_load_test(self) -> Results:
+        schedule = ', '.join(f"{start:g}/s for {seconds:g}s" if start == end
+                             else f"{start:g}->{end:g}/s over {seconds:g}s"
+                             for start, end, seconds in self.stages)
+        expected = sum(1 for _ in send_times(self.stages))
+        print(f"Starting open-loop load test: {schedule} ({expected} requests, {self.processes} process(es))")
+        print(f"Target URL: {self.url}")
+
+        start_at = time.time() + 0.5  # Lets every process start before the first send is due
+        if self.processes == 1:
+            results = await generate(self.url, self.stages, 0, 1, start_at, self.timeout)
+        else:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(self.processes) as pool:
+                parts = await asyncio.gather(*(
+                    loop.run_in_executor(pool, generate_process, self.url, self.stages, index,
+                                         self.processes, start_at, self.timeout)
+                    for index in range(self.processes)))
+            results = parts[0]
+            for part in parts[1:]:
+                results.merge(part)
+
+        print_results(results, expected, time.time() - start_at)
+        return results
+
+def format_latency(histogram: LatencyHistogram) -> List[str]:
+    values = histogram.percentiles(REPORT_QUANTILES)
+    lines = [f"  {'mean':>8}: {histogram.mean * 1000:10.2f} ms"]
+    for q in REPORT_QUANTILES:
+        lines.append(f"  {f'p{q * 100:g}':>8}: {values[q] * 1000:10.2f} ms")
+    lines.append(f"  {'max':>8}: {histogram.max_us / 1000:10.2f} ms")
+    return lines
+
+def print_results(results: Results, total_requests: int, total_time: float):
+    """Print test results"""
+    successful = results.latency.total
+
+    print("\n" + "="*60)
+    print("LOAD TEST RESULTS")
+    print("="*60)
+
+    print(f"Total Requests: {total_requests}")
+    print(f"Successful Requests: {successful}")
+    print(f"Failed Requests: {results.failed}")
+    print(f"Success Rate: {successful/total_requests:.2%}" if total_requests else "Success Rate: n/a")
+    print(f"Total Time: {total_time:.2f} seconds")
+    print(f"Requests per Second: {total_requests/total_time:.2f}")
+
+    if successful:
+        if results.service is None:
             print(f"\nResponse Times:")
-            print(f"  Average: {mean(response_times):.3f}s")
-            print(f"  Median: {median(response_times):.3f}s")
-            print(f"  Min: {min(response_times):.3f}s")
-            print(f"  Max: {max(response_times):.3f}s")
-        
-        # Server distribution
-        server_distribution = {}
-        for request in successful_requests:
-            server = request.get('server_port', 'unknown')
-            server_distribution[server] = server_distribution.get(server, 0) + 1
-        
-        if server_distribution:
-            print(f"\nLoad Distribution:")
-            for server, count in server_distribution.items():
-                percentage = count / len(successful_requests) * 100
-                print(f"  Server {server}: {count} requests ({percentage:.1f}%)")
-        
-        if self.errors:
-            print(f"\nErrors:")
-            for error in self.errors[:5]:  # Show first 5 errors
-                print(f"  Request {error['request_id']}: {error['error']}")
-            if len(self.errors) > 5:
-                print(f"  ... and {len(self.errors) - 5} more errors")
+            print('\n'.join(format_latency(results.latency)))
+        else:
+            print(f"\nResponse Times (from intended send time):")
+            print('\n'.join(format_latency(results.latency)))
+            print(f"\nService Times (from actual send time, uncorrected):")
+            print('\n'.join(format_latency(results.service)))
+
+    if results.late_sends:
+        print(f"\nWarning: {results.late_sends} requests were sent more than {LAG_WARNING * 1000:g} ms late "
+              f"(max {results.max_lag * 1000:.1f} ms); the generator may be the bottleneck, try --processes")
+
+    if results.by_port:
+        print(f"\nLoad Distribution:")
+        for server, count in results.by_port.items():
+            percentage = count / successful * 100
+            print(f"  Server {server}: {count} requests ({percentage:.1f}%)")
+
+    if results.error_samples:
+        print(f"\nErrors:")
+        for message in results.error_samples:
+            print(f"  {message}")
+        if results.failed > len(results.error_samples):
+            print(f"  ... and {results.failed - len(results.error_samples)} more errors")
 
 async def main():
     parser = argparse.ArgumentParser(description='Load Balancer Load Tester')
     parser.add_argument('--url', default='http://localhost:8080', help='Load balancer URL')
-    parser.add_argument('--requests', type=int, default=100, help='Total number of requests')
-    parser.add_argument('--concurrent', type=int, default=10, help='Concurrent requests')
-    
+    parser.add_argument('--requests', type=int, default=100, help='Total number of requests (closed-loop)')
+    parser.add_argument('--concurrent', type=int, default=10, help='Concurrent requests (closed-loop)')
+    parser.add_argument('--rate', type=float, help='Open-loop: requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Open-loop: seconds to run at --rate')
+    parser.add_argument('--ramp', help="Open-loop rate schedule, e.g. '100:10,100-1000:30,1000:60' "
+                                       "(rate or start-end:seconds per stage); overrides --rate")
+    parser.add_argument('--processes', type=int, default=1, help='Open-loop: generator processes')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Open-loop: per-request timeout in seconds')
+
     args = parser.parse_args()
-    
-    tester = LoadTester(args.url, args.concurrent, args.requests)
+
+    if args.ramp or args.rate is not None:
+        try:
+            if args.ramp:
+                stages = parse_stages(args.ramp)
+            else:
+                stages = [make_stage(args.rate, args.rate, args.duration,
+                                     f"--rate {args.rate:g} --duration {args.duration:g}")]
+        except ValueError as e:
+            parser.error(str(e))
+        tester = OpenLoopTester(args.url, stages, max(args.processes, 1), args.timeout)
+    else:
+        tester = LoadTester(args.url, args.concurrent, args.requests)
     await tester.run_load_test()
 
 if __name__ == "__main__":
@@ -1,28 +1,232 @@
 from aiohttp import web
-from balancer import LoadBalancer, BalancingAlgorithm
+from balancer import LoadBalancer, BalancingAlgorithm, load_servers
+from assets import AssetConfig
+from cache import CacheConfig
+from coalesce import CoalescingConfig
+from compression import CompressionConfig
+from limiter import LIMIT_ALGORITHMS, LimiterConfig
+from outlier import OutlierConfig
+from ratelimit import RateLimitRule
+from retry import RetryConfig
+from healthcheck import HealthCheckConfig
+from streaming import StreamingConfig
+from tcpproxy import TcpConfig, TcpProxy
+from wsproxy import WebSocketConfig
+from upstream import UpstreamConfig
+from workers import SharedStats, run_workers
+from hashing import is_prime
 import argparse
+import json
 
-def create_app():
+def prime(value: str) -> int:
+    n = int(value)
+    if not is_prime(n):
+        raise argparse.ArgumentTypeError(f"{value} is not a prime number")
+    return n
+
+def parse_args():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Advanced Load Balancer')
-    parser.add_argument('--algorithm', choices=['round_robin', 'least_connections'], 
+    parser.add_argument('--algorithm', choices=[a.value for a in BalancingAlgorithm], 
                        default='round_robin', help='Load balancing algorithm')
     parser.add_argument('--port', type=int, default=8081, help='Port to run the load balancer on')
+    parser.add_argument('--mode', choices=['http', 'tcp'], default='http',
+                       help='http: proxy HTTP requests; tcp: splice TCP connections without parsing them')
+    parser.add_argument('--admin-port', type=int, default=8090,
+                       help='Port for the dashboard, stats and management endpoints in --mode tcp')
+    parser.add_argument('--tcp-idle-timeout', type=float, default=300.0,
+                       help='Close a TCP connection after this many seconds without traffic (0: never)')
     parser.add_argument('--servers', default='servers.json', help='Path to servers configuration file')
+    parser.add_argument('--max-connections', type=int, default=100, help='Max keep-alive connections per backend')
+    parser.add_argument('--idle-timeout', type=float, default=30.0, help='Seconds to keep idle upstream connections')
+    parser.add_argument('--max-lifetime', type=float, default=300.0, help='Seconds before upstream pools are recycled')
+    parser.add_argument('--no-streaming', action='store_true', help='Buffer every request and response body')
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024, help='Bytes per chunk when streaming bodies')
+    parser.add_argument('--buffer-threshold', type=int, default=64 * 1024,
+                       help='Bodies up to this many bytes are buffered instead of streamed')
+    parser.add_argument('--hash-key', default='ip',
+                       help="Affinity key for consistent_hash: ip, path, header:<name> or cookie:<name>")
+    parser.add_argument('--hash-table-size', type=prime, default=65537, help='Maglev lookup table size (a prime)')
+    parser.add_argument('--max-sessions', type=int, default=100_000, help='Max sticky sessions kept (LRU evicted)')
+    parser.add_argument('--session-ttl', type=int, default=3600, help='Idle seconds before a sticky session expires')
+    parser.add_argument('--health-interval', type=float, default=10.0, help='Seconds between health checks')
+    parser.add_argument('--health-timeout', type=float, default=2.0, help='Health check timeout in seconds')
+    parser.add_argument('--rise', type=int, default=2, help='Consecutive passing checks to mark a server up')
+    parser.add_argument('--fall', type=int, default=3, help='Consecutive failing checks to mark a server down')
+    parser.add_argument('--cache', action='store_true', help='Cache cacheable GET/HEAD responses in the balancer')
+    parser.add_argument('--cache-max-bytes', type=int, default=64 * 1024 * 1024,
+                       help='Byte budget of the response cache (LRU evicted)')
+    parser.add_argument('--cache-max-object-bytes', type=int, default=1024 * 1024,
+                       help='Responses larger than this are never cached')
+    parser.add_argument('--coalesce', action='store_true',
+                       help='Share one upstream request among identical concurrent GET/HEAD requests')
+    parser.add_argument('--coalesce-vary', default='Accept,Accept-Encoding,Accept-Language',
+                       help='Comma-separated request headers that must match for requests to be coalesced')
+    parser.add_argument('--coalesce-max-waiters', type=int, default=100, help='Max followers per coalesced request')
+    parser.add_argument('--coalesce-window', type=float, default=5.0,
+                       help='Seconds after an upstream request starts during which others may join it')
+    parser.add_argument('--coalesce-max-replay-bytes', type=int, default=1024 * 1024,
+                       help='Streamed bytes a coalesced request keeps for late joiners; past this it takes no more')
+    parser.add_argument('--retries', type=int, default=0,
+                       help='Retries of idempotent requests on other backends after a failure or 502/503/504')
+    parser.add_argument('--retry-budget', type=float, default=0.1,
+                       help='Retries + hedges allowed as a fraction of proxied requests')
+    parser.add_argument('--hedge', action='store_true',
+                       help="Send a second attempt to another backend once the first outlives the route's p95")
+    parser.add_argument('--outlier-detection', action='store_true',
+                       help='Eject backends that fail or lag on live traffic (circuit breaker)')
+    parser.add_argument('--outlier-consecutive-errors', type=int, default=5,
+                       help='Consecutive failed requests that eject a backend')
+    parser.add_argument('--outlier-error-rate', type=float, default=0.5,
+                       help='Error rate over the sliding window that ejects a backend')
+    parser.add_argument('--outlier-base-ejection', type=float, default=30.0,
+                       help='Seconds of the first ejection; doubles on each re-ejection')
+    parser.add_argument('--outlier-max-ejected-percent', type=float, default=50.0,
+                       help='Never eject more than this percentage of backends')
+    parser.add_argument('--concurrency-limit', choices=LIMIT_ALGORITHMS,
+                       help='Adapt a per-backend concurrency limit with this algorithm and shed excess load')
+    parser.add_argument('--initial-limit', type=int, default=20, help='Starting per-backend concurrency limit')
+    parser.add_argument('--max-limit', type=int, default=1000, help='Upper bound on the per-backend limit')
+    parser.add_argument('--queue-size', type=int, default=50,
+                       help='Requests that may wait for a backend at its limit before shedding')
+    parser.add_argument('--queue-timeout', type=float, default=1.0,
+                       help='Seconds a queued request waits before it is shed with 503')
+    parser.add_argument('--rate-limit', type=float,
+                       help='Requests per second allowed per client on every route, per worker process '
+                            '(with --workers N a client spread over several connections may get up to N times this)')
+    parser.add_argument('--rate-limit-burst', type=float, help='Token bucket size for --rate-limit (default: the rate)')
+    parser.add_argument('--rate-limit-key', default='ip',
+                       help="Client key for --rate-limit: ip, header:<name> or cookie:<name>")
+    parser.add_argument('--rate-limits',
+                       help='JSON file of per-route rules: [{"route", "rate", "burst", "key"}] (enforced per worker process)')
+    parser.add_argument('--stats-interval', type=float, default=1.0,
+                       help='Seconds between frames on /lb/stats/stream')
+    parser.add_argument('--compress', action='store_true',
+                       help='Compress proxied responses with gzip or brotli when the client accepts it')
+    parser.add_argument('--compress-min-bytes', type=int, default=1024,
+                       help='Responses smaller than this are not compressed')
+    parser.add_argument('--compress-threads', type=int, default=2,
+                       help='Threads compressing large bodies off the event loop')
+    parser.add_argument('--ws-idle-timeout', type=float, default=300.0,
+                       help='Close a WebSocket tunnel after this many seconds without frames (0: never)')
+    parser.add_argument('--no-history', action='store_true',
+                       help='Do not keep the per-backend time series behind /lb/stats/history')
+    parser.add_argument('--static-dir', default='static', help='Directory served at /static and / (loaded into memory)')
+    parser.add_argument('--watch-static', action='store_true', help='Reload static files when they change on disk')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes sharing the port via SO_REUSEPORT (stats are fleet-wide)')
     
-    args = parser.parse_args()
-    
+    return parser.parse_args()
+
+def create_balancer(args, shared=None, run_health_checks=True):
     # Create load balancer with specified algorithm
-    algorithm = BalancingAlgorithm.ROUND_ROBIN if args.algorithm == 'round_robin' else BalancingAlgorithm.LEAST_CONNECTIONS
-    lb = LoadBalancer(args.servers, algorithm)
-    
-    return lb.get_app(), args.port
+    algorithm = BalancingAlgorithm(args.algorithm)
+    upstream_config = UpstreamConfig(
+        max_connections=args.max_connections,
+        idle_timeout=args.idle_timeout,
+        max_lifetime=args.max_lifetime,
+    )
+    streaming = StreamingConfig(
+        enabled=not args.no_streaming,
+        chunk_size=args.chunk_size,
+        buffer_threshold=args.buffer_threshold,
+    )
+    health_config = HealthCheckConfig(
+        interval=args.health_interval,
+        timeout=args.health_timeout,
+        rise=args.rise,
+        fall=args.fall,
+    )
+    cache = None
+    if args.cache:
+        cache = CacheConfig(max_bytes=args.cache_max_bytes, max_object_bytes=args.cache_max_object_bytes)
+    coalescing = None
+    if args.coalesce:
+        coalescing = CoalescingConfig(
+            vary_headers=tuple(h.strip() for h in args.coalesce_vary.split(',') if h.strip()),
+            max_waiters=args.coalesce_max_waiters,
+            window=args.coalesce_window,
+            max_replay_bytes=args.coalesce_max_replay_bytes,
+        )
+    retry = None
+    if args.retries > 0 or args.hedge:
+        retry = RetryConfig(max_retries=args.retries, budget_ratio=args.retry_budget, hedge=args.hedge)
+    outlier = None
+    if args.outlier_detection:
+        outlier = OutlierConfig(
+            consecutive_errors=args.outlier_consecutive_errors,
+            error_rate=args.outlier_error_rate,
+            base_ejection=args.outlier_base_ejection,
+            max_ejected_percent=args.outlier_max_ejected_percent,
+        )
+    limiter = None
+    if args.concurrency_limit:
+        limiter = LimiterConfig(
+            algorithm=args.concurrency_limit,
+            initial_limit=args.initial_limit,
+            max_limit=args.max_limit,
+            queue_size=args.queue_size,
+            queue_timeout=args.queue_timeout,
+        )
+    compression = None
+    if args.compress:
+        compression = CompressionConfig(min_bytes=args.compress_min_bytes, threads=args.compress_threads)
+    rate_limits = []
+    if args.rate_limits:
+        with open(args.rate_limits) as f:
+            rate_limits = [RateLimitRule(**rule) for rule in json.load(f)]
+    if args.rate_limit:
+        rate_limits.append(RateLimitRule(rate=args.rate_limit, burst=args.rate_limit_burst, key=args.rate_limit_key))
+    lb = LoadBalancer(args.servers, algorithm, upstream_config=upstream_config, streaming=streaming,
+                      health_config=health_config, hash_key=args.hash_key,
+                      hash_table_size=args.hash_table_size, max_sessions=args.max_sessions,
+                      session_timeout=args.session_ttl, shared=shared,
+                      run_health_checks=run_health_checks, cache=cache,
+                      coalescing=coalescing, retry=retry, outlier=outlier,
+                      limiter=limiter, rate_limits=rate_limits,
+                      stats_interval=args.stats_interval, history=not args.no_history,
+                      static=AssetConfig(root=args.static_dir, watch=args.watch_static),
+                      compression=compression,
+                      websocket=WebSocketConfig(idle_timeout=args.ws_idle_timeout))
+    return lb
+
+def create_tcp_app(args, shared=None, run_health_checks=True):
+    """--mode tcp: TCP passthrough on args.port, management endpoints on args.admin_port"""
+    lb = create_balancer(args, shared=shared, run_health_checks=run_health_checks)
+    app = lb.get_admin_app()
+    # Only the workers of one fleet share the port; a lone balancer must fail on a busy one
+    config = TcpConfig(idle_timeout=args.tcp_idle_timeout, reuse_port=shared is not None)
+    TcpProxy(lb, config).attach(app, "localhost", args.port)
+    return app
+
+def run_fleet(args):
+    """Fork args.workers balancers; worker 0 runs the health checks for all of them"""
+    shared = SharedStats(args.workers)
+    for server in load_servers(args.servers):
+        shared.register(f"{server['host']}:{server['port']}", server.get('weight', 1))
+
+    def make_app(worker_id):
+        if args.mode == 'tcp':
+            return create_tcp_app(args, shared=shared, run_health_checks=(worker_id == 0))
+        return create_balancer(args, shared=shared, run_health_checks=(worker_id == 0)).get_app()
+
+    # In tcp mode the aiohttp app is the admin port; each worker also binds args.port itself
+    run_workers(args.workers, make_app, "localhost", args.admin_port if args.mode == 'tcp' else args.port, shared)
 
 if __name__ == "__main__":
-    app, port = create_app()
-    print(f"Starting Advanced Load Balancer on port {port}")
+    args = parse_args()
+    port = args.port
+    admin_port = args.admin_port if args.mode == 'tcp' else port
+    print(f"Starting Advanced Load Balancer on port {port}"
+          + (" (TCP passthrough)" if args.mode == 'tcp' else "")
+          + (f" with {args.workers} workers" if args.workers > 1 else ""))
     print("Management endpoints:")
-    print(f"  - Stats: http://localhost:{port}/lb/stats")
-    print(f"  - Add server: POST http://localhost:{port}/lb/add-server")
-    print(f"  - Remove server: POST http://localhost:{port}/lb/remove-server")
-    web.run_app(app, host="localhost", port=port)
\ No newline at end of file
+    print(f"  - Stats: http://localhost:{admin_port}/lb/stats")
+    print(f"  - Add server: POST http://localhost:{admin_port}/lb/add-server")
+    print(f"  - Remove server: POST http://localhost:{admin_port}/lb/remove-server")
+    if args.workers > 1:
+        run_fleet(args)
+    elif args.mode == 'tcp':
+        web.run_app(create_tcp_app(args), host="localhost", port=admin_port)
+    else:
+        web.run_app(create_balancer(args).get_app(), host="localhost", port=port)
\ No newline at end of file
@@ -8,10 +8,24 @@ import json
 import time
 from datetime import datetime
 
+def merge_patch(target, patch):
+    """Apply a JSON merge patch (RFC 7396), as sent by /lb/stats/stream"""
+    if not isinstance(patch, dict):
+        return patch
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = merge_patch(target.get(key), value)
+    return target
+
 class LoadBalancerMonitor:
     def __init__(self, lb_url="http://localhost:8080"):
         self.lb_url = lb_url
         self.stats_url = f"{lb_url}/lb/stats"
+        self.stream_url = f"{lb_url}/lb/stats/stream"
     
     async def get_stats(self):
         """Fetch current load balancer statistics"""
@@ -27,6 +41,27 @@ class LoadBalancerMonitor:
             print(f"Error connecting to load balancer: {e}")
             return None
     
+    async def stream_stats(self):
+        """Yield the full stats after every snapshot or delta from the SSE stream"""
+        stats = None
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.stream_url, headers={'Accept': 'text/event-stream'}) as resp:
+                if resp.status != 200:
+                    raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                event, data = None, []
+                async for raw in resp.content:
+                    line = raw.decode().rstrip('\r\n')
+                    if line.startswith('event:'):
+                        event = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data.append(line[5:].strip())
+                    elif not line and data:
+                        payload = json.loads('\n'.join(data))
+                        stats = payload if event == 'snapshot' else merge_patch(stats, payload)
+                        event, data = None, []
+                        yield stats
+    
     def display_stats(self, stats):
         """Display statistics in a formatted way"""
         if not stats:
@@ -43,20 +78,29 @@ class LoadBalancerMonitor:
         print(f"Active Sessions: {stats['active_sessions']}")
         
         print("\nSERVER DETAILS:")
-        print("-" * 60)
-        print(f"{'Server':<20} {'Health':<8} {'Connections':<12} {'Requests':<10} {'Errors':<8} {'Avg RT':<10}")
-        print("-" * 60)
+        print("-" * 80)
+        print(f"{'Server':<20} {'Health':<8} {'Connections':<12} {'Requests':<10} {'Errors':<8} {'Avg RT':<10} {'p50/p99 (ms)':<16}")
+        print("-" * 80)
         
         for server_key, server_info in stats['servers'].items():
             health_status = "UP" if server_info['is_healthy'] else "DOWN"
             print(f"{server_key:<20} {health_status:<8} {server_info['active_connections']:<12} "
                   f"{server_info['total_requests']:<10} {server_info['total_errors']:<8} "
-                  f"{server_info['avg_response_time']:<10}")
+                  f"{server_info['avg_response_time']:<10} {self.format_percentiles(server_info):<16}")
+    
+    def format_percentiles(self, server_info):
+        """Rolling-window p50/p99 for one server, if the balancer reports them"""
+        latency = server_info.get('latency_window')
+        if not latency or not latency['count']:
+            return "-"
+        return f"{latency['p50_ms']:.1f}/{latency['p99_ms']:.1f}"
     
-    async def add_server(self, host, port):
+    async def add_server(self, host, port, weight=None):
         """Add a new server to the load balancer"""
         add_url = f"{self.lb_url}/lb/add-server"
         data = {"host": host, "port": port}
+        if weight is not None:
+            data["weight"] = weight
         
         try:
             async with aiohttp.ClientSession() as session:
@@ -68,6 +112,21 @@ class LoadBalancerMonitor:
             print(f"Error adding server: {e}")
             return False
     
+    async def update_server(self, host, port, weight):
+        """Change the weight of an existing server"""
+        update_url = f"{self.lb_url}/lb/update-server"
+        data = {"host": host, "port": port, "weight": weight}
+        
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(update_url, json=data) as resp:
+                    result = await resp.json()
+                    print(f"Update server result: {result}")
+                    return resp.status == 200
+        except Exception as e:
+            print(f"Error updating server: {e}")
+            return False
+    
     async def remove_server(self, host, port):
         """Remove a server from the load balancer"""
         remove_url = f"{self.lb_url}/lb/remove-server"
@@ -90,8 +149,17 @@ class LoadBalancerMonitor:
         
         try:
             while True:
-                stats = await self.get_stats()
-                self.display_stats(stats)
+                # Follow the live stream, redrawing at most once per interval;
+                # if it is unavailable, poll once and try again next interval
+                next_display = 0.0
+                try:
+                    async for stats in self.stream_stats():
+                        if time.monotonic() >= next_display:
+                            self.display_stats(stats)
+                            next_display = time.monotonic() + interval
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    print(f"Stats stream unavailable ({e}); polling")
+                    self.display_stats(await self.get_stats())
                 await asyncio.sleep(interval)
         except KeyboardInterrupt:
             print("\nMonitoring stopped.")
@@ -102,10 +170,11 @@ async def main():
     parser = argparse.ArgumentParser(description='Load Balancer Monitor')
     parser.add_argument('--url', default='http://localhost:8080', help='Load balancer URL')
     parser.add_argument('--interval', type=int, default=5, help='Monitoring interval in seconds')
-    parser.add_argument('--command', choices=['monitor', 'add-server', 'remove-server'], 
+    parser.add_argument('--command', choices=['monitor', 'add-server', 'update-server', 'remove-server'], 
                        default='monitor', help='Command to execute')
     parser.add_argument('--host', help='Server host (for add/remove commands)')
     parser.add_argument('--port', type=int, help='Server port (for add/remove commands)')
+    parser.add_argument('--weight', type=int, help='Server weight (for add/update commands)')
     
     args = parser.parse_args()
     
@@ -117,7 +186,12 @@ async def main():
         if not args.host or not args.port:
             print("Host and port required for add-server command")
             return
-        await monitor.add_server(args.host, args.port)
+        await monitor.add_server(args.host, args.port, args.weight)
+    elif args.command == 'update-server':
+        if not args.host or not args.port or args.weight is None:
+            print("Host, port and weight required for update-server command")
+            return
+        await monitor.update_server(args.host, args.port, args.weight)
     elif args.command == 'remove-server':
         if not args.host or not args.port:
             print("Host and port required for remove-server command")
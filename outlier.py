@@ -0,0 +1,259 @@
+"""
+Per-backend circuit breakers driven by live traffic (outlier ejection)
+"""
+import asyncio
+import time
+import logging
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+@dataclass
+class OutlierConfig:
+    consecutive_errors: int = 5         # Eject after this many failures in a row
+    error_rate: float = 0.5             # Eject when the windowed error rate reaches this...
+    min_requests: int = 20              # ...over at least this many requests
+    window: int = 10                    # Sliding window length in seconds
+    latency_factor: float = 3.0         # Eject when mean latency exceeds this multiple of the peer median
+    latency_min_requests: int = 20      # Window samples needed before latency is judged
+    base_ejection: float = 30.0         # First ejection length; doubles on every re-ejection
+    max_ejection: float = 300.0
+    half_open_trials: int = 3           # Concurrent trial requests, and successes needed to close
+    max_ejected_percent: float = 50.0   # Never eject more than this share of the backends
+    interval: float = 1.0               # Seconds between sweeps
+
+class _Breaker:
+    __slots__ = ('state', 'consecutive_errors', 'requests', 'errors', 'epochs', 'ejections',
+                 'ejected_until', 'changed_at', 'trials', 'trial_successes', 'reason')
+
+    def __init__(self, window: int):
+        self.state = CLOSED
+        self.consecutive_errors = 0
+        # One bucket per second of the sliding window
+        self.requests = [0] * window
+        self.errors = [0] * window
+        self.epochs = [-1] * window
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.changed_at = time.monotonic()
+        self.trials = 0
+        self.trial_successes = 0
+        self.reason: Optional[str] = None
+
+    def window_counts(self, now: float):
+        oldest = int(now) - len(self.epochs) + 1
+        requests = errors = 0
+        for i, epoch in enumerate(self.epochs):
+            if epoch >= oldest:
+                requests += self.requests[i]
+                errors += self.errors[i]
+        return requests, errors
+
+class OutlierDetector:
+    """Ejects backends whose live traffic fails or lags behind their peers
+
+    record() is O(1) per proxied request. An ejected backend leaves the
+    selection index for an exponentially growing period, then goes half-open:
+    up to `half_open_trials` requests at a time are routed to it, and that
+    many successes close the breaker while any failure re-ejects it. Latency
+    outliers and window error rates are evaluated in a periodic sweep.
+    take_trial() only looks at half-open backends with a free trial slot.
+    """
+
+    def __init__(self, servers: Dict, eject: Callable[[str], None], restore: Callable[[str], None],
+                 config: Optional[OutlierConfig] = None):
+        self.servers = servers
+        self.config = config or OutlierConfig()
+        self._eject_cb = eject
+        self._restore_cb = restore
+        self.breakers: Dict[str, _Breaker] = {}
+        self._trial_ready: Dict[str, None] = {}  # Half-open keys with a free trial slot, oldest first
+        self.total_ejections = 0
+        self.ejections_by_reason: Dict[str, int] = {}
+        self.refused = 0   # Ejections skipped by the max-ejected-percent guard
+        for key in servers:
+            self.track(key)
+
+    def track(self, key: str):
+        self.breakers.setdefault(key, _Breaker(self.config.window))
+
+    def untrack(self, key: str):
+        self.breakers.pop(key, None)
+        self._trial_ready.pop(key, None)
+
+    def is_ejected(self, key: str) -> bool:
+        breaker = self.breakers.get(key)
+        return breaker is not None and breaker.state != CLOSED
+
+    def is_half_open(self, key: str) -> bool:
+        breaker = self.breakers.get(key)
+        return breaker is not None and breaker.state == HALF_OPEN
+
+    @property
+    def ejected(self) -> int:
+        return sum(1 for b in self.breakers.values() if b.state != CLOSED)
+
+    def record(self, key: str, success: bool):
+        """Outcome of one proxied request to a backend"""
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            return
+        now = time.monotonic()
+        epoch = int(now)
+        slot = epoch % len(breaker.epochs)
+        if breaker.epochs[slot] != epoch:
+            breaker.epochs[slot] = epoch
+            breaker.requests[slot] = 0
+            breaker.errors[slot] = 0
+        breaker.requests[slot] += 1
+
+        if breaker.state == HALF_OPEN:
+            if not success:
+                self._eject(key, breaker, 'half_open_failure', now, force=True)
+                return
+            breaker.trial_successes += 1
+            if breaker.trial_successes >= self.config.half_open_trials:
+                self._close(key, breaker, now)
+            else:
+                self._trial_done(key, breaker)
+            return
+
+        if success:
+            breaker.consecutive_errors = 0
+            return
+        breaker.errors[slot] += 1
+        breaker.consecutive_errors += 1
+        if breaker.state == CLOSED and breaker.consecutive_errors >= self.config.consecutive_errors:
+            self._eject(key, breaker, 'consecutive_errors', now)
+
+    def take_trial(self, exclude: Collection[str] = ()) -> Optional[str]:
+        """A half-open backend with a free trial slot (not in `exclude`), reserving the slot"""
+        for key in self._trial_ready:
+            if self.servers[key].is_healthy and key not in exclude:
+                breaker = self.breakers[key]
+                breaker.trials += 1
+                if breaker.trials >= self.config.half_open_trials:
+                    del self._trial_ready[key]
+                return key
+        return None
+
+    def abandon(self, key: str):
+        """A trial request ended without an outcome (e.g. a cancelled hedge)"""
+        breaker = self.breakers.get(key)
+        if breaker is not None and breaker.state == HALF_OPEN:
+            self._trial_done(key, breaker)
+
+    def _trial_done(self, key: str, breaker: _Breaker):
+        """Free a half-open backend's trial slot"""
+        breaker.trials = max(0, breaker.trials - 1)
+        self._trial_ready[key] = None
+
+    def _half_open(self, key: str, breaker: _Breaker, now: float):
+        """Start (or restart) a half-open period with every trial slot free"""
+        breaker.state = HALF_OPEN
+        breaker.changed_at = now
+        breaker.trials = 0
+        self._trial_ready[key] = None
+
+    def _eject(self, key: str, breaker: _Breaker, reason: str, now: float, force: bool = False):
+        if not force:
+            allowed = int(len(self.breakers) * self.config.max_ejected_percent / 100)
+            if self.ejected >= allowed:
+                self.refused += 1
+                return
+        breaker.ejections += 1
+        duration = min(self.config.base_ejection * 2 ** (breaker.ejections - 1), self.config.max_ejection)
+        breaker.state = OPEN
+        self._trial_ready.pop(key, None)
+        breaker.ejected_until = now + duration
+        breaker.changed_at = now
+        breaker.consecutive_errors = 0
+        breaker.trials = 0
+        breaker.trial_successes = 0
+        breaker.reason = reason
+        self.total_ejections += 1
+        self.ejections_by_reason[reason] = self.ejections_by_reason.get(reason, 0) + 1
+        logger.warning(f"Ejecting {key} for {duration:.0f}s ({reason})")
+        self._eject_cb(key)
+
+    def _close(self, key: str, breaker: _Breaker, now: float):
+        breaker.state = CLOSED
+        self._trial_ready.pop(key, None)
+        breaker.changed_at = now
+        breaker.consecutive_errors = 0
+        breaker.reason = None
+        breaker.epochs = [-1] * len(breaker.epochs)  # Judge it on fresh traffic only
+        logger.info(f"Restoring {key} after {breaker.trial_successes} successful trials")
+        self._restore_cb(key)
+
+    def _latency_outliers(self, now: float) -> List[str]:
+        """Closed backends whose windowed mean latency is far above the peer median"""
+        means = {}
+        for key, breaker in self.breakers.items():
+            server = self.servers.get(key)
+            if breaker.state != CLOSED or server is None or not server.is_healthy:
+                continue
+            if breaker.ejections and now - breaker.changed_at < server.latency.window:
+                continue  # Recently restored; its window still holds pre-ejection samples
+            total, sum_us = server.latency.window_totals()
+            if total >= self.config.latency_min_requests:
+                means[key] = sum_us / total
+        if len(means) < 3:
+            return []  # Too few peers to call anyone an outlier
+        ordered = sorted(means.values())
+        median = ordered[len(ordered) // 2]
+        return [key for key, mean in means.items() if median and mean > median * self.config.latency_factor]
+
+    def sweep(self):
+        now = time.monotonic()
+        for key, breaker in list(self.breakers.items()):
+            if breaker.state == OPEN and now >= breaker.ejected_until:
+                self._half_open(key, breaker, now)
+                breaker.trial_successes = 0
+                logger.info(f"{key} is half-open; sending trial traffic")
+            elif breaker.state == HALF_OPEN and now - breaker.changed_at >= self.config.base_ejection:
+                # Trials that never reported back must not wedge the breaker
+                self._half_open(key, breaker, now)
+            elif breaker.state == CLOSED:
+                requests, errors = breaker.window_counts(now)
+                if requests >= self.config.min_requests and errors / requests >= self.config.error_rate:
+                    self._eject(key, breaker, 'error_rate', now)
+                elif breaker.ejections and now - breaker.changed_at >= self.config.max_ejection:
+                    # A long clean run earns back one step of backoff
+                    breaker.ejections -= 1
+                    breaker.changed_at = now
+        for key in self._latency_outliers(now):
+            self._eject(key, self.breakers[key], 'latency', now)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.config.interval)
+            self.sweep()
+
+    def get_server_stats(self, key: str) -> Optional[dict]:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            return None
+        now = time.monotonic()
+        requests, errors = breaker.window_counts(now)
+        return {
+            "state": breaker.state,
+            "reason": breaker.reason,
+            "ejections": breaker.ejections,
+            "ejected_for": round(max(0.0, breaker.ejected_until - now), 1) if breaker.state == OPEN else 0,
+            "consecutive_errors": breaker.consecutive_errors,
+            "window_requests": requests,
+            "window_error_rate": round(errors / requests, 4) if requests else 0,
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "ejected": self.ejected,
+            "max_ejected": int(len(self.breakers) * self.config.max_ejected_percent / 100),
+            "total_ejections": self.total_ejections,
+            "by_reason": dict(self.ejections_by_reason),
+            "refused": self.refused,
+        }
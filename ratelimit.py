@@ -0,0 +1,144 @@
+"""
+Per-client token-bucket rate limiting with fixed-memory bucket tables
+"""
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional
+
+from hashing import hash64, parse_hash_key, request_hash_key
+
+@dataclass
+class RateLimitRule:
+    route: str = '/'              # Path prefix the rule applies to (longest prefix wins)
+    rate: float = 100.0           # Tokens added per second
+    burst: Optional[float] = None  # Bucket size (defaults to rate)
+    key: str = 'ip'               # ip, path, header:<name> or cookie:<name>
+    max_keys: int = 65536         # Buckets kept; the idlest is overwritten when full
+
+class TokenBucketTable:
+    """Token buckets in three flat arrays (24 bytes per client key)
+
+    Keys are hashed into 4-way sets, so a lookup touches at most four slots.
+    A new key takes an empty slot or the least recently used slot of its set.
+    A bucket idle for burst/rate seconds would be full anyway, so overwriting
+    it loses nothing; only overwriting a busier bucket (counted in
+    `evictions`) forgets state, which errs on the side of admitting.
+    Fingerprints come from a fixed hash, not the per-process salted hash(),
+    so a key maps to the same slot in every worker.
+    """
+
+    WAYS = 4
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 65536):
+        self.rate = rate
+        self.burst = burst
+        size = max(self.WAYS, 1 << max(0, (max_keys - 1).bit_length()))
+        self._mask = (size - 1) & ~(self.WAYS - 1)
+        self._fingerprints = array('q', bytes(8 * size))  # 0 marks an empty slot
+        self._tokens = array('d', bytes(8 * size))
+        self._stamps = array('d', bytes(8 * size))        # Last refill (monotonic seconds)
+        self.capacity = size
+        self.size = 0
+        self.evictions = 0
+        self._full_after = burst / rate if rate else math.inf
+
+    def take(self, key: str, now: Optional[float] = None) -> float:
+        """Spend one token for `key`; 0.0 if allowed, else seconds until a token is due"""
+        now = time.monotonic() if now is None else now
+        fingerprint = (hash64(key) >> 1) or 1  # 63 bits, so it fits the signed array
+        base = fingerprint & self._mask
+        fingerprints, tokens, stamps = self._fingerprints, self._tokens, self._stamps
+
+        victim = -1
+        oldest = math.inf
+        for slot in range(base, base + self.WAYS):
+            current = fingerprints[slot]
+            if current == fingerprint:
+                level = min(self.burst, tokens[slot] + (now - stamps[slot]) * self.rate)
+                stamps[slot] = now
+                if level >= 1:
+                    tokens[slot] = level - 1
+                    return 0.0
+                tokens[slot] = level
+                return (1 - level) / self.rate if self.rate else math.inf
+            if current == 0:
+                if oldest >= 0:
+                    victim, oldest = slot, -1.0  # Prefer an empty slot
+            elif stamps[slot] < oldest:
+                victim, oldest = slot, stamps[slot]
+
+        if oldest < 0:
+            self.size += 1
+        elif now - oldest < self._full_after:
+            self.evictions += 1
+        fingerprints[victim] = fingerprint
+        tokens[victim] = self.burst - 1
+        stamps[victim] = now
+        return 0.0 if self.burst >= 1 else 1 / self.rate
+
+class _CompiledRule:
+    __slots__ = ('rule', 'source', 'name', 'table', 'allowed', 'limited')
+
+    def __init__(self, rule: RateLimitRule):
+        self.rule = rule
+        self.source, self.name = parse_hash_key(rule.key)
+        burst = rule.burst if rule.burst is not None else rule.rate
+        # A rule that can never refill, or never hold a whole token, would reject forever
+        if not rule.rate > 0:
+            raise ValueError(f"Rate limit rule for '{rule.route}': rate must be positive, got {rule.rate}")
+        if not burst >= 1:
+            raise ValueError(f"Rate limit rule for '{rule.route}': burst must be at least 1, got {burst}")
+        self.table = TokenBucketTable(rule.rate, burst, rule.max_keys)
+        self.allowed = 0
+        self.limited = 0
+
+class RateLimiter:
+    """Admission control in front of the proxy path, one bucket table per rule
+
+    Tables are per process: under --workers N a client whose connections
+    land on several workers can get up to N times a rule's rate.
+    """
+
+    def __init__(self, rules: List[RateLimitRule]):
+        # Longest route prefix first, so the first match is the most specific
+        self._rules = [_CompiledRule(rule) for rule in sorted(rules, key=lambda r: len(r.route), reverse=True)]
+
+    def _match(self, path: str) -> Optional[_CompiledRule]:
+        for compiled in self._rules:
+            if path.startswith(compiled.rule.route):
+                return compiled
+        return None
+
+    def check(self, request) -> float:
+        """0.0 to admit the request, else the Retry-After delay in seconds"""
+        compiled = self._match(request.path)
+        if compiled is None:
+            return 0.0
+        key = request_hash_key(request, compiled.source, compiled.name)
+        wait = compiled.table.take(key)
+        if wait:
+            compiled.limited += 1
+        else:
+            compiled.allowed += 1
+        return wait
+
+    def get_stats(self) -> dict:
+        return {
+            "rules": [
+                {
+                    "route": c.rule.route,
+                    "key": c.rule.key,
+                    "rate": c.rule.rate,
+                    "burst": c.table.burst,
+                    "allowed": c.allowed,
+                    "limited": c.limited,
+                    "tracked_keys": c.table.size,
+                    "capacity": c.table.capacity,
+                    "evictions": c.table.evictions,
+                }
+                for c in self._rules
+            ],
+            "limited": sum(c.limited for c in self._rules),
+        }
@@ -0,0 +1,193 @@
+"""
+Retry and hedging policy for the proxy path
+"""
+import math
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Methods whose repetition has the same effect as a single request (RFC 9110 section 9.2.2)
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'})
+
+# Backend statuses worth another attempt elsewhere; anything else is the backend's answer
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Clients mark other requests as safe to repeat with this header (IETF httpapi draft)
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Route latency buckets: quarter octaves (+/- 9%) from 0.1 ms, the last one open-ended (past ~6.5 s)
+ROUTE_BUCKETS = 64
+ROUTE_MIN_SECONDS = 0.0001
+ROUTE_DEPTH = 3  # Path segments that tell routes apart
+
+_HEX = frozenset('0123456789abcdefABCDEF-')
+
+@dataclass
+class RetryConfig:
+    max_retries: int = 1            # Extra attempts after the first, each on a different backend
+    budget_ratio: float = 0.1       # Retries + hedges allowed per proxied request
+    budget_min_per_second: float = 5.0  # Floor so low-traffic balancers can still retry
+    budget_burst: float = 20.0      # Cap on saved-up retry tokens
+    hedge: bool = False
+    hedge_quantile: float = 0.95    # Hedge once the first attempt exceeds this route quantile
+    hedge_min_samples: int = 20     # Route needs this many samples before hedging kicks in
+    hedge_min_delay: float = 0.005  # Never hedge sooner than this (seconds)
+    max_routes: int = 256           # Routes with their own latency estimate (LRU, ~1 KB each)
+    route_window: float = 60.0      # Seconds of latency a route's hedge delay is based on
+
+def is_retryable(request, body) -> bool:
+    """Idempotent (or explicitly marked) requests whose body can be sent again"""
+    if body is not None and not isinstance(body, (bytes, bytearray)):
+        return False  # Streamed bodies are consumed by the first attempt
+    return request.method in IDEMPOTENT_METHODS or IDEMPOTENCY_HEADER in request.headers
+
+class RetryBudget:
+    """Token bucket capping retries at a fraction of traffic (Finagle-style)
+
+    Every proxied request deposits `ratio` tokens, time adds `min_per_second`,
+    and each retry or hedge spends one. Under a broad outage the bucket drains
+    and requests fail fast instead of multiplying load on the survivors.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 5.0, burst: float = 20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.exhausted = 0
+        self._refilled = time.monotonic()
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.min_per_second)
+        self._refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+def _is_identifier(segment: str) -> bool:
+    """Numbers, UUIDs, long hex strings and opaque tokens vary per resource, not per route"""
+    if segment.isdigit() or len(segment) > 32:
+        return True
+    return len(segment) >= 8 and any(c.isdigit() for c in segment) and all(c in _HEX for c in segment)
+
+def route_key(path: str) -> str:
+    """'/users/6f1c0e2a-.../orders/17' -> '/users/{id}/orders': up to ROUTE_DEPTH segments, IDs folded"""
+    segments = path.split('/', ROUTE_DEPTH + 1)[1:ROUTE_DEPTH + 1]
+    return '/' + '/'.join('{id}' if _is_identifier(segment) else segment for segment in segments)
+
+class _RouteEstimate:
+    """Latency counts for one route in ROUTE_BUCKETS buckets, over two half-window generations"""
+    __slots__ = ('current', 'previous', 'rotates_at', 'cached', 'expires')
+
+    def __init__(self):
+        self.current = array('I', bytes(4 * ROUTE_BUCKETS))
+        self.previous = array('I', bytes(4 * ROUTE_BUCKETS))
+        self.rotates_at = 0.0
+        self.cached: Optional[float] = None
+        self.expires = 0.0
+
+    def rotate(self, now: float, half_window: float):
+        if now >= self.rotates_at:
+            # A route idle for a whole window starts over rather than keeping stale counts
+            self.previous = self.current if now < self.rotates_at + half_window else array('I', bytes(4 * ROUTE_BUCKETS))
+            self.current = array('I', bytes(4 * ROUTE_BUCKETS))
+            self.rotates_at = now + half_window
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        """Upper bound of the bucket holding quantile q, or None with fewer than min_samples"""
+        counts = [a + b for a, b in zip(self.current, self.previous)]
+        total = sum(counts)
+        if total < min_samples:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return ROUTE_MIN_SECONDS * 2 ** ((index + 1) / 4)
+        return ROUTE_MIN_SECONDS * 2 ** (ROUTE_BUCKETS / 4)
+
+class RouteLatency:
+    """Per-route latency estimates for hedge delays, bounded by LRU
+
+    Routes are normalised path prefixes (route_key), so /items/1 and /items/2
+    share one estimate instead of each pushing real routes out of the table.
+    An estimate is two arrays of ROUTE_BUCKETS 32-bit counters (about 1 KB
+    per route with its table entry, so ~256 KB at the default 256 routes)
+    covering the last half to full `window` seconds. Quantiles are cached
+    per route and recomputed at most once per `refresh` seconds, so the hot
+    path is a dict lookup.
+    """
+
+    def __init__(self, quantile: float = 0.95, min_samples: int = 20, max_routes: int = 256,
+                 refresh: float = 1.0, window: float = 60.0):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_routes = max_routes
+        self.refresh = refresh
+        self.half_window = window / 2
+        self._routes: 'OrderedDict[str, _RouteEstimate]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def record(self, path: str, seconds: float):
+        route = route_key(path)
+        estimate = self._routes.get(route)
+        if estimate is None:
+            estimate = self._routes[route] = _RouteEstimate()
+            if len(self._routes) > self.max_routes:
+                self._routes.popitem(last=False)
+        else:
+            self._routes.move_to_end(route)
+        estimate.rotate(time.monotonic(), self.half_window)
+        index = int(4 * math.log2(seconds / ROUTE_MIN_SECONDS)) if seconds > ROUTE_MIN_SECONDS else 0
+        estimate.current[min(index, ROUTE_BUCKETS - 1)] += 1
+
+    def delay(self, path: str) -> Optional[float]:
+        """Current windowed quantile for the path's route, or None with too few samples"""
+        estimate = self._routes.get(route_key(path))
+        if estimate is None:
+            return None
+        now = time.monotonic()
+        if now >= estimate.expires:
+            estimate.rotate(now, self.half_window)
+            estimate.cached = estimate.quantile(self.quantile, self.min_samples)
+            estimate.expires = now + self.refresh
+        return estimate.cached
+
+class RetryPolicy:
+    """Bundles the config, budget and hedge latencies used by forward_request"""
+
+    def __init__(self, config: Optional[RetryConfig] = None):
+        self.config = config or RetryConfig()
+        self.budget = RetryBudget(self.config.budget_ratio, self.config.budget_min_per_second,
+                                  self.config.budget_burst)
+        self.routes = RouteLatency(self.config.hedge_quantile, self.config.hedge_min_samples,
+                                   self.config.max_routes, window=self.config.route_window)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0   # Hedged attempts that answered before the original
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        if not self.config.hedge:
+            return None
+        delay = self.routes.delay(route)
+        return None if delay is None else max(delay, self.config.hedge_min_delay)
+
+    def get_stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_tokens": round(self.budget.tokens, 2),
+            "budget_exhausted": self.budget.exhausted,
+        }
@@ -0,0 +1,366 @@
+"""
+Incrementally maintained indexes over the healthy server set
+"""
+import heapq
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from hashing import MaglevTable
+
+class RoundRobinRing:
+    """Circular linked list of server keys
+
+    Insertion, removal and next() are O(1). New servers join at the end of the
+    current rotation and removing a server never shifts the others, so the
+    rotation neither skips nor repeats when the healthy set changes.
+    """
+
+    def __init__(self):
+        self._next: Dict[str, str] = {}
+        self._prev: Dict[str, str] = {}
+        self._cursor: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._next
+
+    def add(self, key: str):
+        if key in self._next:
+            return
+        if self._cursor is None:
+            self._next[key] = self._prev[key] = key
+            self._cursor = key
+            return
+        # Link in just before the cursor, i.e. last in the current rotation
+        after = self._cursor
+        before = self._prev[after]
+        self._next[before] = key
+        self._prev[key] = before
+        self._next[key] = after
+        self._prev[after] = key
+
+    def remove(self, key: str):
+        if key not in self._next:
+            return
+        after = self._next.pop(key)
+        before = self._prev.pop(key)
+        if after == key:
+            self._cursor = None
+            return
+        self._next[before] = after
+        self._prev[after] = before
+        if self._cursor == key:
+            self._cursor = after
+
+    def next(self) -> Optional[str]:
+        key = self._cursor
+        if key is not None:
+            self._cursor = self._next[key]
+        return key
+
+class LeastConnectionsHeap:
+    """Indexed binary min-heap of server keys ordered by active connections
+
+    peek() is O(1); add, remove and update are O(log N). Ties go to the server
+    whose count changed least recently, so idle servers take turns.
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []  # [connections, tick, key]
+        self._pos: Dict[str, int] = {}
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pos
+
+    @staticmethod
+    def _less(a: list, b: list) -> bool:
+        return a[0] < b[0] or (a[0] == b[0] and a[1] < b[1])
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][2]] = i
+        self._pos[heap[j][2]] = j
+
+    def _sift_up(self, i: int):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not self._less(heap[i], heap[parent]):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self._less(heap[child], heap[smallest]):
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def add(self, key: str, connections: int = 0):
+        if key in self._pos:
+            self.update(key, connections)
+            return
+        self._tick += 1
+        self._heap.append([connections, self._tick, key])
+        self._pos[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self, key: str):
+        i = self._pos.pop(key, None)
+        if i is None:
+            return
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last[2]] = i
+            self._sift_up(i)
+            self._sift_down(self._pos[last[2]])
+
+    def update(self, key: str, connections: int):
+        i = self._pos.get(key)
+        if i is None:
+            return
+        self._tick += 1
+        entry = self._heap[i]
+        entry[0] = connections
+        entry[1] = self._tick
+        self._sift_up(i)
+        self._sift_down(self._pos[key])
+
+    def peek(self) -> Optional[str]:
+        return self._heap[0][2] if self._heap else None
+
+class SmoothWeightedRoundRobin:
+    """Smooth weighted round robin over integer weights
+
+    Weights are reduced by their gcd; every server then gets exactly `weight`
+    picks per cycle of sum(weights), spread through the cycle rather than in
+    bursts. When the cycle is cheap to compute (servers x cycle length up to
+    PRECOMPUTE_BUDGET) it is generated once with nginx's smooth WRR and picks
+    are O(1) amortized. Larger cycles are served from a virtual-deadline heap
+    (the k-th pick of a server is due at (2k + 1) / 2w) in O(log N).
+    """
+
+    PRECOMPUTE_BUDGET = 100_000
+
+    def __init__(self):
+        self.weights: Dict[str, int] = {}
+        self._order: Dict[str, int] = {}  # Insertion order, for deterministic ties
+        self._seq = 0
+        self._gcd = 1
+        self._cycle_length = 0
+        self._cycle: Optional[List[str]] = None
+        self._heap: Optional[List[tuple]] = None
+        self._position = 0
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def set(self, key: str, weight: int):
+        if key not in self._order:
+            self._seq += 1
+            self._order[key] = self._seq
+        if self.weights.get(key) != weight:
+            self.weights[key] = weight
+            self._dirty = True
+
+    def remove(self, key: str):
+        if self.weights.pop(key, None) is not None:
+            self._order.pop(key, None)
+            self._dirty = True
+
+    def effective_weight(self, key: str) -> int:
+        """Picks per cycle after gcd reduction (0 when out of rotation)"""
+        if self._dirty:
+            self._rebuild()
+        weight = self.weights.get(key, 0)
+        return weight // self._gcd if weight else 0
+
+    @property
+    def cycle_length(self) -> int:
+        if self._dirty:
+            self._rebuild()
+        return self._cycle_length
+
+    def _reset_heap(self):
+        # (deadline, -weight, insertion order, key, weight, picks so far)
+        self._heap = [
+            (1 / (2 * (weight // self._gcd)), -weight, self._order[key], key, weight // self._gcd, 0)
+            for key, weight in self.weights.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def _pop(self) -> str:
+        deadline, neg_weight, order, key, weight, picks = self._heap[0]
+        picks += 1
+        heapq.heapreplace(self._heap, ((2 * picks + 1) / (2 * weight), neg_weight, order, key, weight, picks))
+        return key
+
+    def _nginx_cycle(self) -> List[str]:
+        keys = sorted(self.weights, key=self._order.__getitem__)
+        weights = [self.weights[key] // self._gcd for key in keys]
+        total = sum(weights)
+        current = [0] * len(keys)
+        cycle = []
+        for _ in range(total):
+            best = 0
+            for i, weight in enumerate(weights):
+                current[i] += weight
+                if current[i] > current[best]:
+                    best = i
+            current[best] -= total
+            cycle.append(keys[best])
+        return cycle
+
+    def _rebuild(self):
+        self._dirty = False
+        self._position = 0
+        self._cycle = None
+        self._cycle_length = 0
+        if not self.weights:
+            self._heap = None
+            return
+        self._gcd = 0
+        for weight in self.weights.values():
+            self._gcd = math.gcd(self._gcd, weight)
+        self._cycle_length = sum(self.weights.values()) // self._gcd
+        if len(self.weights) * self._cycle_length <= self.PRECOMPUTE_BUDGET:
+            self._cycle = self._nginx_cycle()
+            self._heap = None
+        else:
+            self._reset_heap()
+
+    def next(self) -> Optional[str]:
+        if self._dirty:
+            self._rebuild()
+        if self._cycle is not None:
+            key = self._cycle[self._position]
+            self._position = (self._position + 1) % len(self._cycle)
+            return key
+        if self._heap is None:
+            return None
+        key = self._pop()
+        self._position += 1
+        if self._position == self._cycle_length:
+            # Every server has had exactly its weight in picks; start the next cycle
+            self._position = 0
+            self._reset_heap()
+        return key
+
+class PeakEwma:
+    """Peak-sensitive exponentially weighted moving average of response time
+
+    A slower-than-average sample replaces the average outright, faster samples
+    decay it with time constant `decay` seconds, so a backend that slows down is
+    avoided immediately and only slowly trusted again.
+    """
+    __slots__ = ('decay', 'value', 'updated')
+
+    # Cost for a backend with requests in flight but no samples yet, so it gets
+    # one trial request at a time until it has a measurement
+    UNMEASURED_PENALTY = 1e3
+
+    def __init__(self, decay: float = 10.0):
+        self.decay = decay
+        self.value = 0.0
+        self.updated = time.monotonic()
+
+    def observe(self, rtt: float):
+        now = time.monotonic()
+        elapsed = max(now - self.updated, 0.0)
+        self.updated = now
+        if rtt > self.value:
+            self.value = rtt
+        else:
+            weight = math.exp(-elapsed / self.decay)
+            self.value = self.value * weight + rtt * (1 - weight)
+
+    def cost(self, in_flight: int) -> float:
+        if self.value == 0.0:
+            return self.UNMEASURED_PENALTY + in_flight if in_flight else 0.0
+        return self.value * (in_flight + 1)
+
+class SelectionIndex:
+    """Healthy-server index shared by the balancing algorithms
+
+    Membership changes only on health flips, add_server and remove_server;
+    connection counts are pushed in as requests start and finish. The Maglev
+    table (64K slots) is only kept when consistent hashing is in use.
+    """
+
+    def __init__(self, hash_table_size: Optional[int] = None, consistent_hash: bool = False):
+        self.round_robin = RoundRobinRing()
+        self.least_connections = LeastConnectionsHeap()
+        self.weighted = SmoothWeightedRoundRobin()
+        self.consistent_hash: Optional[MaglevTable] = None
+        if consistent_hash:
+            self.consistent_hash = MaglevTable(hash_table_size) if hash_table_size else MaglevTable()
+        self.members: List[str] = []  # Dense array for random sampling and scans
+        self._member_pos: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.round_robin)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.round_robin
+
+    def add(self, key: str, connections: int = 0, weight: int = 1):
+        self.round_robin.add(key)
+        self.least_connections.add(key, connections)
+        self.weighted.set(key, weight)
+        if self.consistent_hash is not None:
+            self.consistent_hash.add(key)
+        if key not in self._member_pos:
+            self._member_pos[key] = len(self.members)
+            self.members.append(key)
+
+    def remove(self, key: str):
+        self.round_robin.remove(key)
+        self.least_connections.remove(key)
+        self.weighted.remove(key)
+        if self.consistent_hash is not None:
+            self.consistent_hash.remove(key)
+        i = self._member_pos.pop(key, None)
+        if i is not None:
+            # Swap-remove keeps the array dense in O(1)
+            last = self.members.pop()
+            if i < len(self.members):
+                self.members[i] = last
+                self._member_pos[last] = i
+
+    def sample_two(self) -> Tuple[Optional[str], Optional[str]]:
+        """Two distinct random members (or one and None if only one exists)"""
+        size = len(self.members)
+        if size == 0:
+            return None, None
+        if size == 1:
+            return self.members[0], None
+        i = random.randrange(size)
+        j = random.randrange(size - 1)
+        if j >= i:
+            j += 1
+        return self.members[i], self.members[j]
+
+    def update_connections(self, key: str, connections: int):
+        self.least_connections.update(key, connections)
+
+    def update_weight(self, key: str, weight: int):
+        if key in self:
+            self.weighted.set(key, weight)
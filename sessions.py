@@ -0,0 +1,167 @@
+"""
+Bounded session-affinity store with LRU eviction and timing-wheel expiry
+"""
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+class _Session:
+    __slots__ = ('server_key', 'last_access', 'wheel_tick')
+
+    def __init__(self, server_key: str, last_access: float, wheel_tick: int):
+        self.server_key = server_key
+        self.last_access = last_access
+        self.wheel_tick = wheel_tick
+
+class SessionStore:
+    """Maps session IDs to server keys
+
+    - At most `max_entries` sessions; the least recently used one is evicted.
+    - A new session starts out provisional, in a separate LRU of at most
+      `max_pending` entries, and only joins the main table when a request
+      comes back with its ID. Clients that never return the cookie (or
+      invent IDs) churn that LRU instead of evicting established sessions.
+    - A session expires `ttl` seconds after its last access. Expiry runs on a
+      timing wheel of `resolution`-second slots: each tick only visits the
+      sessions filed under that slot, and a session that was touched since it
+      was filed is simply re-filed at its new deadline (amortized O(1)).
+    - Server keys are interned so every session pointing at a server shares
+      one string.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl: float = 3600, resolution: float = 1.0,
+                 max_pending: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_pending = max_pending if max_pending is not None else max(1, max_entries // 10)
+        self.ttl = ttl
+        self.resolution = resolution
+        self.evictions = 0
+        self.expirations = 0
+        self.promotions = 0
+        self.pending_evictions = 0
+        self._entries: 'OrderedDict[str, _Session]' = OrderedDict()
+        # Provisional sessions; not on the wheel, so their TTL is checked when they are read
+        self._pending: 'OrderedDict[str, _Session]' = OrderedDict()
+        self._wheel: List[Set[str]] = [set() for _ in range(int(ttl / resolution) + 2)]
+        self._current_tick = self._tick_of(time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def _tick_of(self, timestamp: float) -> int:
+        return int(timestamp // self.resolution)
+
+    def _file(self, session_id: str, entry: _Session):
+        # Never file into a slot the wheel has already passed
+        tick = max(self._tick_of(entry.last_access + self.ttl), self._current_tick + 1)
+        entry.wheel_tick = tick
+        self._wheel[tick % len(self._wheel)].add(session_id)
+
+    def get(self, session_id: str) -> Optional[str]:
+        """Server key for a live session (refreshes its TTL and LRU position)
+
+        A provisional session read here has come back, so it is promoted.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            entry = self._pending.pop(session_id, None)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if now - entry.last_access > self.ttl:
+                self.expirations += 1
+                return None
+            entry.last_access = now
+            self.promotions += 1
+            self._insert(session_id, entry)
+            return entry.server_key
+        now = time.monotonic()
+        if now - entry.last_access > self.ttl:
+            self.discard(session_id)
+            self.expirations += 1
+            return None
+        entry.last_access = now
+        self._entries.move_to_end(session_id)
+        return entry.server_key
+
+    def set(self, session_id: str, server_key: str):
+        """Pin a session to a server; an unknown ID starts out provisional"""
+        server_key = sys.intern(server_key)
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.server_key = server_key
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return
+
+        self._pending[session_id] = _Session(server_key, time.monotonic(), 0)
+        self._pending.move_to_end(session_id)
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.pending_evictions += 1
+
+    def _insert(self, session_id: str, entry: _Session):
+        self._entries[session_id] = entry
+        self._file(session_id, entry)
+        while len(self._entries) > self.max_entries:
+            # Its wheel slot still names it; the tick skips IDs that are gone
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, session_id: str):
+        self._entries.pop(session_id, None)
+        self._pending.pop(session_id, None)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Advance the wheel to `now`, expiring or re-filing due sessions"""
+        now = time.monotonic() if now is None else now
+        target = self._tick_of(now)
+        size = len(self._wheel)
+        # Never spin more than one full revolution, however long we slept
+        start = max(self._current_tick + 1, target - size + 1)
+        expired = 0
+        for tick in range(start, target + 1):
+            self._current_tick = tick
+            slot = tick % size
+            due = self._wheel[slot]
+            if not due:
+                continue
+            self._wheel[slot] = set()
+            for session_id in due:
+                entry = self._entries.get(session_id)
+                if entry is None or entry.wheel_tick % size != slot:
+                    continue  # Evicted, deleted, or filed in another slot
+                if entry.wheel_tick > tick:
+                    self._wheel[slot].add(session_id)  # Due on a later revolution
+                elif now - entry.last_access >= self.ttl:
+                    del self._entries[session_id]
+                    expired += 1
+                else:
+                    self._file(session_id, entry)
+        self._current_tick = max(self._current_tick, target)
+        self.expirations += expired
+        return expired
+
+    async def run(self):
+        """Background task driving the timing wheel"""
+        while True:
+            await asyncio.sleep(self.resolution)
+            self.expire()
+
+    def get_stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "capacity": self.max_entries,
+            "pending": len(self._pending),
+            "pending_capacity": self.max_pending,
+            "promotions": self.promotions,
+            "pending_evictions": self.pending_evictions,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
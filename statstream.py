@@ -0,0 +1,151 @@
+"""
+Push-based stats stream: one shared snapshot per tick, sent as JSON deltas over SSE
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Callable, Optional, Set
+
+# Frames buffered per subscriber; a subscriber this far behind is resynced
+QUEUE_FRAMES = 8
+
+_MISSING = object()
+
+class NullValue(Exception):
+    """A value became null, which a merge patch can only say by deleting the key"""
+
+def _has_null(value) -> bool:
+    # Arrays are replaced whole, so only null object members are lost
+    return value is None or (isinstance(value, dict) and any(_has_null(v) for v in value.values()))
+
+def diff(previous, current):
+    """JSON merge patch (RFC 7396) turning `previous` into `current`, or _MISSING if equal
+
+    Raises NullValue when `current` has a null the patch would turn into a
+    deletion (a field set to None, or a new object holding one).
+    """
+    if isinstance(previous, dict) and isinstance(current, dict):
+        patch = {}
+        for key, value in current.items():
+            change = diff(previous.get(key, _MISSING), value)
+            if change is not _MISSING:
+                patch[key] = change
+        for key in previous:
+            if key not in current:
+                patch[key] = None
+        return patch if patch else _MISSING
+    if previous is _MISSING or previous != current or type(previous) is not type(current):
+        # Nested dicts inside a replaced value are sent whole
+        if _has_null(current):
+            raise NullValue()
+        return current
+    return _MISSING
+
+def sse_frame(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+class _Subscriber:
+    __slots__ = ('queue', 'resync')
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_FRAMES)
+        self.resync = False
+
+class StatsBroadcaster:
+    """Builds stats once per tick and fans the same encoded frame out to every subscriber
+
+    The ticker only runs while someone is subscribed. Each subscriber first gets
+    a full `snapshot` event, then `delta` events holding a merge patch of what
+    changed since the previous tick; ticks where nothing changed send a comment
+    line as a keep-alive, and ticks where a field became null send a snapshot
+    (a null in a merge patch would delete the field). A subscriber whose queue
+    fills up (a slow client) skips ahead to a fresh snapshot instead of
+    stalling everyone else.
+    """
+
+    def __init__(self, build: Callable[[], dict], interval: float = 1.0):
+        self.build = build
+        self.interval = interval
+        self.ticks = 0
+        self.frames_sent = 0
+        self.resyncs = 0
+        self._subscribers: Set[_Subscriber] = set()
+        self._snapshot: Optional[dict] = None
+        self._snapshot_frame: Optional[bytes] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _full_frame(self) -> bytes:
+        if self._snapshot_frame is None:
+            self._snapshot_frame = sse_frame('snapshot', self._snapshot)
+        return self._snapshot_frame
+
+    def _publish(self, subscriber: _Subscriber, frame: bytes):
+        if subscriber.resync:
+            frame = self._full_frame()
+            subscriber.resync = False
+        try:
+            subscriber.queue.put_nowait(frame)
+            self.frames_sent += 1
+        except asyncio.QueueFull:
+            subscriber.resync = True
+            self.resyncs += 1
+
+    def tick(self):
+        """Build one snapshot and queue its delta for every subscriber"""
+        current = self.build()
+        self.ticks += 1
+        try:
+            patch = diff(self._snapshot, current) if self._snapshot is not None else current
+        except NullValue:
+            patch = None
+        self._snapshot = current
+        self._snapshot_frame = None  # Encoded lazily, only if someone needs a full frame
+        if patch is _MISSING:
+            frame = b": idle\n\n"
+        elif patch is None:
+            frame = self._full_frame()
+        else:
+            frame = sse_frame('delta', patch)
+        for subscriber in self._subscribers:
+            self._publish(subscriber, frame)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                await asyncio.sleep(self.interval)
+                self.tick()
+        finally:
+            self._task = None
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        """Frames for one client: a snapshot, then deltas until the caller stops iterating"""
+        if self._snapshot is None or self._task is None:
+            # Idle until now: start from a fresh snapshot rather than a stale one
+            self._snapshot = self.build()
+            self._snapshot_frame = None
+        subscriber = _Subscriber()
+        self._subscribers.add(subscriber)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            yield self._full_frame()
+            while True:
+                yield await subscriber.queue.get()
+        finally:
+            self._subscribers.discard(subscriber)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "frames_sent": self.frames_sent,
+            "resyncs": self.resyncs,
+        }
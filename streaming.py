@@ -0,0 +1,87 @@
+"""
+Streaming helpers for the proxy path
+"""
+import asyncio
+import aiohttp
+from aiohttp import web
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional, Union
+from multidict import CIMultiDict
+
+# Hop-by-hop headers (RFC 7230 section 6.1) are never relayed between connections
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade',
+})
+
+# Statuses that never carry a body, so there is nothing to stream
+BODYLESS_STATUSES = frozenset({204, 304})
+
+@dataclass
+class StreamingConfig:
+    enabled: bool = True
+    chunk_size: int = 64 * 1024         # Bytes per read/write when streaming
+    buffer_threshold: int = 64 * 1024   # Bodies up to this size are still buffered
+
+def filter_headers(headers) -> CIMultiDict:
+    """Copy headers, dropping hop-by-hop ones and any named in Connection"""
+    connection_tokens = {
+        token.strip().lower()
+        for value in headers.getall('Connection', [])
+        for token in value.split(',')
+    }
+    return CIMultiDict(
+        (name, value) for name, value in headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() not in connection_tokens
+    )
+
+async def _iter_body(request: web.Request, chunk_size: int) -> AsyncIterator[bytes]:
+    async for chunk in request.content.iter_chunked(chunk_size):
+        yield chunk
+
+async def request_body(request: web.Request, config: StreamingConfig) -> Union[bytes, AsyncIterator[bytes], None]:
+    """Return the client body buffered when small, or as a chunk iterator when large or unsized"""
+    if not request.body_exists:
+        return None
+    length = request.content_length
+    if not config.enabled or (length is not None and length <= config.buffer_threshold):
+        return await request.read()
+    return _iter_body(request, config.chunk_size)
+
+def is_upstream_error(error: BaseException) -> bool:
+    """Whether a failure while relaying a response is the backend's doing
+    
+    Reading the backend's body raises aiohttp client errors or timeouts;
+    writing to a client that went away raises ConnectionResetError, which
+    says nothing about the backend.
+    """
+    if isinstance(error, ConnectionResetError):
+        return False
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+def should_stream(resp, config: StreamingConfig, method: str) -> bool:
+    """Decide whether a backend response is relayed chunk by chunk"""
+    if not config.enabled or method == 'HEAD' or resp.status in BODYLESS_STATUSES:
+        return False
+    length: Optional[int] = resp.content_length
+    return length is None or length > config.buffer_threshold
+
+async def relay_body(request: web.Request, resp, response: web.StreamResponse, chunk_size: int,
+                     on_chunk: Optional[Callable[[bytes], None]] = None, encoder=None):
+    """Copy backend chunks to the client; write() waits for the socket to drain
+
+    on_chunk sees the backend's bytes; an encoder (feed/finish coroutines)
+    transforms only what is written to this client.
+    """
+    await response.prepare(request)
+    async for chunk in resp.content.iter_chunked(chunk_size):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        if encoder is not None:
+            chunk = await encoder.feed(chunk)
+            if not chunk:
+                continue
+        await response.write(chunk)
+    if encoder is not None:
+        await response.write(await encoder.finish())
+    await response.write_eof()
@@ -0,0 +1,240 @@
+"""
+Layer-4 passthrough: balance TCP connections and splice bytes without parsing them
+"""
+import asyncio
+import logging
+import socket
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from workers import REQUESTS, listening_socket
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TcpConfig:
+    buffer_size: int = 64 * 1024   # Bytes per direction per connection, allocated once and reused
+    connect_timeout: float = 5.0
+    connect_attempts: int = 2      # Backends tried before a client connection is dropped
+    idle_timeout: float = 300.0    # Close a connection after this long with no bytes either way (0: never)
+    drain_timeout: float = 5.0     # Seconds shutdown lets open connections finish
+    max_free_buffers: int = 1024   # Released buffers kept for reuse
+    accept_backoff: float = 0.1    # Pause after accept() fails (e.g. out of file descriptors)
+    reuse_port: bool = False       # Share the port with the other workers of a fleet (--workers)
+
+class _Connection:
+    __slots__ = ('last_activity',)
+
+    def __init__(self):
+        self.last_activity = time.monotonic()
+
+class TcpProxy:
+    """Accepts TCP connections and splices each one to a backend chosen by the balancer
+
+    Backends are picked with lb.pick_server (consistent hashing keys on the
+    client IP; there are no sessions at this layer, so half-open backends get
+    their trial connections), and each connection counts as one active
+    connection on its backend until it closes. Connect outcomes feed the
+    health checker and outlier detector like proxied requests do. Bytes
+    move with loop.sock_recv_into into a buffer that belongs to the
+    direction, and the filled slice is sent with sock_sendall through a
+    memoryview, so nothing is copied or re-framed along the way; the next
+    read waits until the previous write is done, which is the backpressure.
+    A side that reaches EOF half-closes the other, so protocols that signal
+    completion with a FIN keep working. Buffers are recycled through a free
+    list rather than allocated per connection.
+    """
+
+    def __init__(self, lb, config: Optional[TcpConfig] = None):
+        self.lb = lb
+        self.config = config or TcpConfig()
+        self._listener: Optional[socket.socket] = None
+        self._accept_task: Optional[asyncio.Task] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._free: List[bytearray] = []
+        self.accepted = 0
+        self.refused = 0       # No healthy backend
+        self.failed = 0        # Backend connect failed
+        self.idle_closed = 0
+        self.accept_errors = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+        lb.tcp = self
+
+    def attach(self, app, host: str, port: int):
+        """Listen on host:port for the lifetime of the (admin) aiohttp app"""
+        async def start(app):
+            self.start(host, port)
+
+        async def stop(app):
+            await self.close()
+
+        app.on_startup.append(start)
+        app.on_shutdown.append(stop)
+
+    def start(self, host: str, port: int):
+        self._listener = listening_socket(host, port, reuse_port=self.config.reuse_port)
+        self._accept_task = asyncio.create_task(self._accept_loop())
+        logger.info(f"TCP passthrough listening on {host}:{port}")
+
+    async def _accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                client, address = await loop.sock_accept(self._listener)
+            except OSError as e:
+                # EMFILE/ENFILE, ECONNABORTED...: the listener is fine, so keep accepting
+                # once the pressure may have eased rather than spinning or giving up
+                self.accept_errors += 1
+                logger.warning(f"TCP accept failed: {e!r}")
+                await asyncio.sleep(self.config.accept_backoff)
+                continue
+            client.setblocking(False)
+            task = asyncio.create_task(self._handle(client, address))
+            self._connections.add(task)
+            task.add_done_callback(self._connections.discard)
+
+    def _buffer(self) -> bytearray:
+        return self._free.pop() if self._free else bytearray(self.config.buffer_size)
+
+    def _release(self, buffer: bytearray):
+        if len(self._free) < self.config.max_free_buffers:
+            self._free.append(buffer)
+
+    async def _connect(self, server) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(server.host, server.port, type=socket.SOCK_STREAM)
+        family, kind, proto, _, address = infos[0]
+        backend = socket.socket(family, kind, proto)
+        backend.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(backend, address), self.config.connect_timeout)
+        except BaseException:
+            backend.close()
+            raise
+        return backend
+
+    async def _handle(self, client: socket.socket, address):
+        lb = self.lb
+        hash_key = address[0]
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            server = lb.pick_server(hash_key=hash_key)
+            if server is None:
+                self.refused += 1
+                return
+            tried = set()
+            while server is not None:
+                server_key = lb.get_server_key(server)
+                tried.add(server_key)
+                lb.connection_started(server)
+                try:
+                    backend = await self._open(server, server_key)
+                    if backend is not None:
+                        try:
+                            await self._splice(client, backend)
+                        finally:
+                            backend.close()
+                        return
+                finally:
+                    lb.connection_finished(server)
+                # Nothing has been sent yet, so another backend is always safe to try
+                server = lb.pick_server(tried, hash_key) if len(tried) < self.config.connect_attempts else None
+        finally:
+            client.close()
+
+    async def _open(self, server, server_key: str) -> Optional[socket.socket]:
+        """Connect to a backend, recording the outcome like a proxied request; None on failure"""
+        lb = self.lb
+        server.total_requests += 1
+        if lb.shared:
+            lb.shared.add(server_key, REQUESTS)
+        start_time = time.time()
+        try:
+            backend = await self._connect(server)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.failed += 1
+            lb.record_failure(server, start_time)
+            logger.error(f"Backend error for {server_key}: {e!r}")
+            return None
+        except asyncio.CancelledError:
+            # Shutting down mid-connect: no outcome, so give back a trial slot if this was one
+            if lb.outliers is not None:
+                lb.outliers.abandon(server_key)
+            raise
+        # Connect time is the only latency a byte stream has
+        lb.record_success(server, start_time)
+        self.accepted += 1
+        backend.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return backend
+
+    async def _splice(self, client: socket.socket, backend: socket.socket):
+        connection = _Connection()
+        pumps = [asyncio.create_task(self._pump(connection, client, backend, upstream=True)),
+                 asyncio.create_task(self._pump(connection, backend, client, upstream=False))]
+        try:
+            # Both directions finish on EOF; an error or idle timeout in either ends both
+            done, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_EXCEPTION)
+            for pump in done:
+                if pump.exception() is not None and not isinstance(pump.exception(), (OSError, asyncio.TimeoutError)):
+                    raise pump.exception()
+        finally:
+            for pump in pumps:
+                pump.cancel()
+
+    async def _pump(self, connection: _Connection, source: socket.socket, sink: socket.socket, upstream: bool):
+        loop = asyncio.get_running_loop()
+        idle_timeout = self.config.idle_timeout or None
+        buffer = self._buffer()
+        view = memoryview(buffer)
+        try:
+            while True:
+                try:
+                    count = await asyncio.wait_for(loop.sock_recv_into(source, buffer), idle_timeout)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - connection.last_activity < idle_timeout:
+                        continue  # The other direction is still busy
+                    self.idle_closed += 1
+                    raise
+                if not count:
+                    try:
+                        sink.shutdown(socket.SHUT_WR)  # Pass the FIN along
+                    except OSError:
+                        pass
+                    return
+                connection.last_activity = time.monotonic()
+                await loop.sock_sendall(sink, view[:count])
+                if upstream:
+                    self.bytes_up += count
+                else:
+                    self.bytes_down += count
+        finally:
+            view.release()
+            self._release(buffer)
+
+    async def close(self):
+        """Stop accepting, then give open connections drain_timeout to finish"""
+        if self._accept_task is not None:
+            self._accept_task.cancel()
+            self._accept_task = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._connections:
+            _, pending = await asyncio.wait(list(self._connections), timeout=self.config.drain_timeout)
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            "active": len(self._connections),
+            "accepted": self.accepted,
+            "refused": self.refused,
+            "failed": self.failed,
+            "idle_closed": self.idle_closed,
+            "accept_errors": self.accept_errors,
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "free_buffers": len(self._free),
+        }
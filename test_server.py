@@ -12,9 +12,11 @@ class TestServer:
         self.port = port
         self.delay = delay
         self.request_count = 0
+        self.bodies = {}
     
     async def handle_request(self, request):
         self.request_count += 1
+        body = await request.read()
         
         # Simulate processing delay
         if self.delay > 0:
@@ -25,11 +27,23 @@ class TestServer:
             "request_count": self.request_count,
             "path": str(request.rel_url),
             "method": request.method,
+            "body_bytes": len(body),
             "message": f"Hello from server on port {self.port}!"
         }
         
         return web.json_response(response_data)
     
+    async def handle_bytes(self, request):
+        """Fixed-size binary body, for large-response benchmarks"""
+        self.request_count += 1
+        size = int(request.match_info['size'])
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        body = self.bodies.get(size)
+        if body is None:
+            body = self.bodies[size] = b'x' * size
+        return web.Response(body=body, content_type='application/octet-stream')
+    
     async def health_check(self, request):
         """Health check endpoint"""
         return web.json_response({
@@ -39,8 +53,9 @@ class TestServer:
         })
     
     def create_app(self):
-        app = web.Application()
+        app = web.Application(client_max_size=64 * 1024 * 1024)
         app.router.add_get('/health', self.health_check)
+        app.router.add_get('/bytes/{size:\\d+}', self.handle_bytes)
         app.router.add_route('*', '/{tail:.*}', self.handle_request)
         return app
 
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+from aiohttp.streams import EmptyStreamReader
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def make_request():
+    """Mocked aiohttp request without a body"""
+    def make(method='GET', path='/', headers=None, **kwargs):
+        kwargs.setdefault('payload', EmptyStreamReader())
+        return make_mocked_request(method, path, headers=headers or {}, **kwargs)
+    return make
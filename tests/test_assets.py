@@ -0,0 +1,97 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from yarl import URL
+
+from assets import AssetConfig, StaticAssets, choose_encoding
+from balancer import LoadBalancer
+
+SCRIPT = b"function tick() { return 1; }\n" * 40  # Compressible and over min_compress_bytes
+
+@pytest.fixture
+def root(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'js').mkdir(parents=True)
+    (static / 'js' / 'app.js').write_bytes(SCRIPT)
+    (static / 'big.bin').write_bytes(b'\x00' * 5000)
+    (tmp_path / 'secret.txt').write_text('do not serve')
+    return static
+
+def load(root, **config):
+    assets = StaticAssets(AssetConfig(root=str(root), max_memory_bytes=4096, **config))
+    assets.load()
+    return assets
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('GZIP;q=0.5', 'gzip'),
+    ('*', 'br'),  # Ties go to the preferred coding
+    ('*;q=0', None),
+    ('br;q=1, gzip;q=0.1', 'br'),
+    ('br;q=0.1, gzip;q=0.2', 'gzip'),
+    ('gzip;q=nonsense', None),
+])
+def test_choose_encoding_by_qvalue(header, expected):
+    assert choose_encoding(header, ('br', 'gzip')) == expected
+
+def test_variant_follows_accept_encoding(root, make_request):
+    assets = load(root)
+    response = assets.serve(make_request(headers={'Accept-Encoding': 'gzip'}), 'js/app.js')
+    assert response.headers['Content-Encoding'] == 'gzip' and response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.body) == SCRIPT
+    for header in ('gzip;q=0', 'identity'):
+        response = assets.serve(make_request(headers={'Accept-Encoding': header}), 'js/app.js')
+        assert 'Content-Encoding' not in response.headers and response.body == SCRIPT
+
+def test_each_variant_has_its_own_strong_etag(root, make_request):
+    assets = load(root)
+    plain = assets.serve(make_request(), 'js/app.js').headers['ETag']
+    gzipped = assets.serve(make_request(headers={'Accept-Encoding': 'gzip'}), 'js/app.js').headers['ETag']
+    assert plain != gzipped and not plain.startswith('W/') and not gzipped.startswith('W/')
+    assert len({plain, gzipped}) == 1 + len(assets.assets['js/app.js'].variants)
+
+    response = assets.serve(make_request(headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzipped}), 'js/app.js')
+    assert response.status == 304 and 'Content-Encoding' not in response.headers
+    # The gzip ETag does not validate the identity representation
+    assert assets.serve(make_request(headers={'If-None-Match': gzipped}), 'js/app.js').status == 200
+    assert assets.not_modified == 1
+
+def test_large_files_go_out_through_sendfile(root, make_request):
+    assets = load(root)
+    assert assets.assets['big.bin'].body is None
+    response = assets.serve(make_request(), 'big.bin')
+    assert isinstance(response, web.FileResponse) and assets.sendfile == 1
+    assert assets.get_stats()["memory_bytes"] < 5000
+
+def test_names_outside_the_scan_are_not_served(root, make_request):
+    assets = load(root)
+    for name in ('../secret.txt', 'js/../../secret.txt', '/etc/passwd', 'js'):
+        assert assets.serve(make_request(), name) is None
+
+@pytest.mark.parametrize('path', [
+    '/static/../secret.txt',
+    '/static/%2e%2e/secret.txt',
+    '/static/..%2fsecret.txt',
+    '/static/js/%2e%2e%2f%2e%2e%2fsecret.txt',
+    '/static/%2e%2e%5csecret.txt',
+])
+def test_traversal_returns_404(tmp_path, root, path):
+    servers = tmp_path / 'servers.json'
+    servers.write_text(json.dumps([{"host": "127.0.0.1", "port": 1}]))
+    lb = LoadBalancer(str(servers), run_health_checks=False, history=False, static=AssetConfig(root=str(root)))
+
+    async def run():
+        async with TestClient(TestServer(lb.get_admin_app())) as client:
+            ok = await client.get('/static/js/app.js')
+            assert ok.status == 200 and await ok.read() == SCRIPT
+            response = await client.get(URL(path, encoded=True))
+            assert response.status == 404
+            assert b'do not serve' not in await response.read()
+
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+from balancer import BalancingAlgorithm, LoadBalancer, load_servers
+
+class JsonRequest:
+    """Just enough of a request for the management endpoints"""
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+def write_servers(tmp_path, servers):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps(servers))
+    return str(path)
+
+def response_json(response):
+    return json.loads(response.body)
+
+@pytest.mark.parametrize('weight', [0, -1, 1.5, '2', True])
+def test_invalid_config_weight_is_rejected(tmp_path, weight):
+    path = write_servers(tmp_path, [{"host": "a", "port": 1, "weight": weight}])
+    with pytest.raises(ValueError):
+        load_servers(path)
+    with pytest.raises(ValueError):
+        LoadBalancer(path, BalancingAlgorithm.WEIGHTED_ROUND_ROBIN)
+
+def test_config_weights_are_used(tmp_path):
+    path = write_servers(tmp_path, [{"host": "a", "port": 1, "weight": 3}, {"host": "b", "port": 2}])
+    lb = LoadBalancer(path, BalancingAlgorithm.WEIGHTED_ROUND_ROBIN)
+    picks = [lb.get_next_server().host for _ in range(8)]
+    assert picks.count('a') == 6 and picks.count('b') == 2
+
+def test_re_adding_a_server_without_weight_keeps_its_weight(tmp_path):
+    path = write_servers(tmp_path, [{"host": "a", "port": 1, "weight": 5}])
+    lb = LoadBalancer(path)
+    response = asyncio.run(lb.add_server_endpoint(JsonRequest({"host": "a", "port": 1})))
+    assert response.status == 200
+    assert lb.servers["a:1"].weight == 5
+
+def test_re_adding_a_server_with_weight_updates_it(tmp_path):
+    path = write_servers(tmp_path, [{"host": "a", "port": 1, "weight": 5}])
+    lb = LoadBalancer(path)
+    asyncio.run(lb.add_server_endpoint(JsonRequest({"host": "a", "port": 1, "weight": 2})))
+    assert lb.servers["a:1"].weight == 2
+
+def test_endpoint_rejects_invalid_weight(tmp_path):
+    lb = LoadBalancer(write_servers(tmp_path, [{"host": "a", "port": 1}]))
+    response = asyncio.run(lb.add_server_endpoint(JsonRequest({"host": "b", "port": 2, "weight": 0})))
+    assert response.status == 400
+    assert "b:2" not in lb.servers
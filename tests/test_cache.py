@@ -0,0 +1,82 @@
+from multidict import CIMultiDict
+
+import cache
+from cache import FRESH, MISS, STALE, CacheConfig, ResponseCache, etag_matches, parse_cache_control
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def headers(**values):
+    return CIMultiDict((name.replace('_', '-'), value) for name, value in values.items())
+
+def test_parse_cache_control():
+    assert parse_cache_control('max-age=60, no-cache, stale-while-revalidate="30"') == {
+        'max-age': '60', 'no-cache': None, 'stale-while-revalidate': '30'}
+    assert parse_cache_control(None) == {}
+
+def test_etag_matches_weakly():
+    assert etag_matches('W/"a", "b"', '"a"')
+    assert etag_matches('*', '"x"')
+    assert not etag_matches('"a"', None)
+
+def test_fresh_then_stale_then_miss(make_request, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    store = ResponseCache()
+    request = make_request(path='/a')
+    assert store.lookup(request) == (MISS, None)
+    store.store(request, 200, headers(Cache_Control='max-age=10, stale-while-revalidate=5'), b'body')
+    assert store.lookup(request)[0] == FRESH
+    clock.now += 12
+    assert store.lookup(request)[0] == STALE
+    assert store.begin_revalidation(request) is not None
+    assert store.begin_revalidation(request) is None  # One refresh at a time
+    clock.now += 5
+    assert store.lookup(request) == (MISS, None)
+
+def test_uncacheable_responses_are_not_stored(make_request):
+    store = ResponseCache()
+    request = make_request(path='/a')
+    assert store.store(request, 200, headers(), b'x') is None  # No explicit freshness
+    assert store.store(request, 200, headers(Cache_Control='private, max-age=60'), b'x') is None
+    assert store.store(request, 200, headers(Cache_Control='max-age=60', Set_Cookie='a=b'), b'x') is None
+    assert store.store(request, 500, headers(Cache_Control='max-age=60'), b'x') is None
+    assert store.store(request, 200, headers(Cache_Control='max-age=60', Vary='*'), b'x') is None
+    assert len(store) == 0
+
+def test_vary_keeps_separate_variants(make_request):
+    store = ResponseCache()
+    english = make_request(path='/a', headers={'Accept-Language': 'en'})
+    french = make_request(path='/a', headers={'Accept-Language': 'fr'})
+    store.store(english, 200, headers(Cache_Control='max-age=60', Vary='Accept-Language'), b'hello')
+    assert store.lookup(english)[1].body == b'hello'
+    assert store.lookup(french) == (MISS, None)
+    store.invalidate(french)
+    assert store.lookup(english) == (MISS, None)
+
+def test_byte_budget_evicts_least_recently_used(make_request):
+    store = ResponseCache(CacheConfig(max_bytes=300))
+    fresh = headers(Cache_Control='max-age=60')
+    for name in 'abc':
+        store.store(make_request(path=f'/{name}'), 200, fresh, b'x' * 100)
+    assert store.lookup(make_request(path='/a'))[0] == MISS
+    assert store.lookup(make_request(path='/c'))[0] == FRESH
+    assert store.bytes <= 300 and store.evictions >= 1
+
+def test_if_none_match_is_answered_locally(make_request):
+    store = ResponseCache()
+    request = make_request(path='/a')
+    entry = store.store(request, 200, headers(Cache_Control='max-age=60', ETag='"v1"'), b'body')
+    response = store.respond(make_request(path='/a', headers={'If-None-Match': '"v1"'}), entry)
+    assert response.status == 304 and response.headers['ETag'] == '"v1"' and 'Age' in response.headers
+    assert store.respond(make_request(method='HEAD', path='/a'), entry).body == b''
+
+def test_requests_that_bypass_the_cache(make_request):
+    assert not ResponseCache.accepts(make_request(method='POST'))
+    assert not ResponseCache.accepts(make_request(headers={'Authorization': 'x'}))
+    assert not ResponseCache.accepts(make_request(headers={'Cache-Control': 'no-store'}))
+    assert ResponseCache.accepts(make_request())
@@ -0,0 +1,88 @@
+import asyncio
+
+from multidict import CIMultiDict
+
+from coalesce import CoalescingConfig, Flight, RequestCoalescer
+
+def collect(flight, reader):
+    async def run():
+        return [chunk async for chunk in flight.iter_chunks(reader)]
+    return run()
+
+def test_identical_requests_share_a_flight(make_request):
+    coalescer = RequestCoalescer(CoalescingConfig())
+    leader, is_leader = coalescer.join(make_request(path='/a'))
+    follower, is_follower_leader = coalescer.join(make_request(path='/a'))
+    assert is_leader and not is_follower_leader
+    assert follower is leader
+
+def test_cookie_and_authorization_requests_are_never_shared(make_request):
+    coalescer = RequestCoalescer(CoalescingConfig())
+    for headers in ({'Cookie': 'sid=alice'}, {'Authorization': 'Bearer x'}, {'Range': 'bytes=0-1'}):
+        assert coalescer.join(make_request(path='/me', headers=headers)) == (None, False)
+
+def test_followers_do_not_get_the_leaders_set_cookie(make_request):
+    async def run():
+        coalescer = RequestCoalescer(CoalescingConfig())
+        flight, _ = coalescer.join(make_request(path='/page'))
+        follower_request = make_request(path='/page')
+        coalescer.join(follower_request)
+        following = asyncio.create_task(coalescer.follow(follower_request, flight))
+        await asyncio.sleep(0)
+        flight.start(200, CIMultiDict({'Set-Cookie': 'sid=leader', 'Content-Type': 'text/plain'}), streamed=False)
+        flight.finish(b'hello')
+        response = await following
+        assert response.body == b'hello'
+        assert 'Set-Cookie' not in response.headers
+        assert flight.headers['Set-Cookie'] == 'sid=leader'  # The leader's own copy is untouched
+    asyncio.run(run())
+
+def test_streamed_flight_without_followers_keeps_nothing_past_the_limit():
+    async def run():
+        flight = Flight(('GET',), max_replay_bytes=100)
+        flight.start(200, CIMultiDict(), streamed=True)
+        for _ in range(50):
+            flight.feed(b'x' * 40)
+        assert not flight.joinable
+        assert flight.retained <= 100
+    asyncio.run(run())
+
+def test_attached_follower_still_gets_the_whole_body():
+    async def run():
+        flight = Flight(('GET',), max_replay_bytes=100)
+        flight.start(200, CIMultiDict(), streamed=True)
+        reader = flight.attach()
+        reading = asyncio.create_task(collect(flight, reader))
+        for i in range(20):
+            flight.feed(bytes([i]) * 40)
+            await asyncio.sleep(0)
+        flight.finish()
+        chunks = await reading
+        assert b''.join(chunks) == b''.join(bytes([i]) * 40 for i in range(20))
+        assert flight.retained <= 100
+    asyncio.run(run())
+
+def test_follower_too_far_behind_is_cut_off():
+    async def run():
+        flight = Flight(('GET',), max_replay_bytes=100)
+        flight.start(200, CIMultiDict(), streamed=True)
+        reader = flight.attach()
+        for _ in range(10):
+            flight.feed(b'x' * 40)
+        assert reader.cut_off
+        assert flight.retained <= 100
+        flight.finish()
+        try:
+            await collect(flight, reader)
+        except ConnectionError:
+            return
+        raise AssertionError("lagging follower was not cut off")
+    asyncio.run(run())
+
+def test_full_flight_sends_new_requests_upstream(make_request):
+    coalescer = RequestCoalescer(CoalescingConfig(max_replay_bytes=10))
+    flight, _ = coalescer.join(make_request(path='/big'))
+    flight.start(200, CIMultiDict(), streamed=True)
+    flight.feed(b'x' * 20)
+    second, is_leader = coalescer.join(make_request(path='/big'))
+    assert is_leader and second is not flight
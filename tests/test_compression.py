@@ -0,0 +1,58 @@
+import asyncio
+import gzip
+import zlib
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+from assets import choose_encoding, parse_accept_encoding
+from compression import CompressionConfig, ResponseCompressor
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding('gzip;q=0.5, br , identity;q=0') == {'gzip': 0.5, 'br': 1.0, 'identity': 0.0}
+    assert parse_accept_encoding(None) == {}
+
+def test_choose_encoding_prefers_highest_q_then_order():
+    assert choose_encoding('gzip, br', ('br', 'gzip')) == 'br'
+    assert choose_encoding('gzip;q=1, br;q=0.5', ('br', 'gzip')) == 'gzip'
+    assert choose_encoding('*;q=0.1', ('gzip',)) == 'gzip'
+    assert choose_encoding('gzip;q=0', ('gzip',)) is None
+    assert choose_encoding(None, ('gzip',)) is None
+
+def test_encoding_for_skips_what_must_not_be_compressed(make_request):
+    compressor = ResponseCompressor(CompressionConfig(min_bytes=100))
+    request = make_request(headers={'Accept-Encoding': 'gzip'})
+    text = CIMultiDict({'Content-Type': 'text/html'})
+    assert compressor.encoding_for(request, 200, text, 1000) == 'gzip'
+    assert compressor.encoding_for(request, 200, text, 10) is None
+    assert compressor.encoding_for(request, 204, text, None) is None
+    assert compressor.encoding_for(request, 206, text, 1000) is None
+    assert compressor.encoding_for(request, 200, CIMultiDict({'Content-Type': 'image/png'}), 1000) is None
+    assert compressor.encoding_for(request, 200, CIMultiDict({'Content-Type': 'text/html',
+                                                              'Content-Encoding': 'br'}), 1000) is None
+    assert compressor.encoding_for(make_request(), 200, text, 1000) is None
+
+def test_buffered_response_is_compressed_and_marked(make_request):
+    async def run():
+        compressor = ResponseCompressor()
+        request = make_request(headers={'Accept-Encoding': 'gzip'})
+        body = b'hello world ' * 200
+        response = web.Response(body=body, headers={'Content-Type': 'text/plain', 'ETag': '"abc"'})
+        response = await compressor.apply(request, response)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.headers['ETag'] == 'W/"abc"'
+        assert gzip.decompress(response.body) == body
+    asyncio.run(run())
+
+def test_every_streamed_chunk_is_flushed():
+    async def run():
+        encoder = ResponseCompressor().encoder('gzip')
+        decoder = zlib.decompressobj(31)
+        for event in (b'data: one\n\n', b'data: two\n\n'):
+            output = await encoder.feed(event)
+            # A small chunk must come out whole, not wait in the encoder
+            assert decoder.decompress(output) == event
+        decoder.decompress(await encoder.finish())
+        assert decoder.eof
+    asyncio.run(run())
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import balancer
+from balancer import BalancingAlgorithm, LoadBalancer
+from retry import RetryConfig
+
+async def start_backends(tmp_path, *handlers, **options):
+    """Test servers for `handlers` and a started balancer in front of them"""
+    servers = []
+    for handler in handlers:
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        server = TestServer(app)
+        await server.start_server()
+        servers.append(server)
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": server.port} for server in servers]))
+    lb = LoadBalancer(str(path), BalancingAlgorithm.ROUND_ROBIN, **options)
+    lb.start_upstream()
+    return lb, servers
+
+async def stop(lb, servers):
+    await lb.shutdown()
+    for server in servers:
+        await server.close()
+
+def active(lb):
+    return [server.active_connections for server in lb.servers.values()]
+
+def test_connection_is_counted_while_the_backend_works(tmp_path, make_request):
+    seen = []
+
+    async def handler(request):
+        seen.append(active(lb))
+        return web.Response(text='ok')
+
+    async def run():
+        nonlocal lb
+        lb, servers = await start_backends(tmp_path, handler)
+        try:
+            response = await lb.forward_request(make_request(path='/x'))
+            assert response.status == 200
+            assert seen == [[1]]
+            assert active(lb) == [0]
+        finally:
+            await stop(lb, servers)
+
+    lb = None
+    asyncio.run(run())
+
+def test_connection_is_counted_from_selection(tmp_path, make_request, monkeypatch):
+    seen = []
+
+    async def handler(request):
+        return web.Response(text='ok')
+
+    async def slow_client_body(request, config):
+        seen.append(active(lb))  # Another request picking now must see this one
+        raise ConnectionResetError('client went away')
+
+    async def run():
+        nonlocal lb
+        lb, servers = await start_backends(tmp_path, handler)
+        monkeypatch.setattr(balancer, 'request_body', slow_client_body)
+        try:
+            response = await lb.forward_request(make_request(method='POST', path='/x'))
+            assert response.status == 502
+            assert seen == [[1]]
+            assert active(lb) == [0]
+            assert list(lb.servers.values())[0].total_errors == 0
+        finally:
+            await stop(lb, servers)
+
+    lb = None
+    asyncio.run(run())
+
+def test_retry_releases_both_backends(tmp_path, make_request):
+    async def failing(request):
+        return web.Response(status=503)
+
+    async def working(request):
+        return web.Response(text='ok')
+
+    async def run():
+        lb, servers = await start_backends(tmp_path, failing, working, retry=RetryConfig())
+        try:
+            statuses = [(await lb.forward_request(make_request(path='/x'))).status for _ in range(4)]
+            assert statuses == [200] * 4
+            assert active(lb) == [0, 0]
+        finally:
+            await stop(lb, servers)
+
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+
+import pytest
+
+from hashing import MaglevTable, is_prime, parse_hash_key
+from main import prime
+
+SIZE = 1009  # Small prime keeps the tests fast
+
+def table_with(count, size=SIZE):
+    table = MaglevTable(size)
+    for i in range(count):
+        table.add(f"10.0.0.{i}:80")
+    return table
+
+@pytest.mark.parametrize('size', [64, 100, 1000, 65536])
+def test_non_prime_table_size_is_rejected(size):
+    with pytest.raises(ValueError):
+        MaglevTable(size)
+    with pytest.raises(argparse.ArgumentTypeError):
+        prime(str(size))
+
+def test_is_prime():
+    assert [n for n in range(30) if is_prime(n)] == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    assert is_prime(65537)
+
+def test_slots_are_spread_evenly():
+    stats = table_with(10).get_stats()
+    assert sum(stats["slots"].values()) == SIZE
+    assert stats["imbalance"] < 1.1
+
+def test_table_does_not_depend_on_insertion_order():
+    forward, backward = MaglevTable(SIZE), MaglevTable(SIZE)
+    keys = [f"h{i}:80" for i in range(5)]
+    for key in keys:
+        forward.add(key)
+    for key in reversed(keys):
+        backward.add(key)
+    assert all(forward.lookup(str(n)) == backward.lookup(str(n)) for n in range(500))
+
+def test_removing_a_backend_mostly_moves_its_own_keys():
+    table = table_with(5)
+    before = {str(n): table.lookup(str(n)) for n in range(2000)}
+    table.remove("10.0.0.2:80")
+    moved = [key for key, member in before.items() if table.lookup(key) != member]
+    assert all(key in moved for key, member in before.items() if member == "10.0.0.2:80")
+    others_moved = sum(1 for key in moved if before[key] != "10.0.0.2:80")
+    assert others_moved < len(before) * 0.05
+
+def test_membership_changes_rebuild_off_the_request_path():
+    async def run():
+        table = table_with(3)
+        table.lookup('warm')  # Built once; later changes rebuild in a thread
+        builds = table.rebuilds
+        table.remove("10.0.0.1:80")
+        # The old table is still served, minus the backend that left
+        assert all(table.lookup(str(n)) in ("10.0.0.0:80", "10.0.0.2:80") for n in range(300))
+        assert table.rebuilds == builds
+        while table._rebuild_task is not None:
+            await asyncio.sleep(0.01)
+        assert table.rebuilds == builds + 1
+        assert set(table.get_stats()["slots"]) == {"10.0.0.0:80", "10.0.0.2:80"}
+    asyncio.run(run())
+
+def test_empty_table_returns_none():
+    table = table_with(1)
+    table.remove("10.0.0.0:80")
+    assert table.lookup('x') is None
+
+def test_parse_hash_key():
+    assert parse_hash_key('header:X-User') == ('header', 'X-User')
+    with pytest.raises(ValueError):
+        parse_hash_key('cookie')
+
+def test_rebuild_yields_to_the_event_loop():
+    async def run():
+        table = table_with(3, size=65537)  # Several BUILD_CHUNKs of work
+        table.lookup('warm')
+        ticks = 0
+        table.remove("10.0.0.1:80")
+        while table._rebuild_task is not None:
+            ticks += 1
+            await asyncio.sleep(0)
+        assert ticks > 1  # Other tasks ran between build steps
+        assert set(table.get_stats()["slots"]) == {"10.0.0.0:80", "10.0.0.2:80"}
+    asyncio.run(run())
+
+def test_lookup_probes_a_bounded_number_of_departed_slots():
+    async def run():
+        table = table_with(20)
+        table.lookup('warm')
+        for i in range(1, 20):
+            table.remove(f"10.0.0.{i}:80")  # Rebuild pending; the old table is ~95% departed slots
+        assert table._rebuild_task is not None
+        assert all(table.lookup(str(n)) == "10.0.0.0:80" for n in range(500))
+    asyncio.run(run())
+
+def test_table_is_only_kept_for_consistent_hash(tmp_path):
+    from balancer import BalancingAlgorithm, LoadBalancer
+    path = tmp_path / 'servers.json'
+    path.write_text('[{"host": "127.0.0.1", "port": 1}]')
+    assert LoadBalancer(str(path)).index.consistent_hash is None
+    lb = LoadBalancer(str(path), algorithm=BalancingAlgorithm.CONSISTENT_HASH)
+    assert lb.index.consistent_hash.lookup('x') == '127.0.0.1:1'
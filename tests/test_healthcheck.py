@@ -0,0 +1,82 @@
+import asyncio
+
+from balancer import ServerStats
+from healthcheck import HealthCheckConfig, HealthChecker
+
+def make_checker(**config):
+    servers = {'a:1': ServerStats(host='a', port=1)}
+    changes = []
+
+    def set_health(server, healthy):
+        server.is_healthy = healthy
+        changes.append(healthy)
+
+    checker = HealthChecker(servers, set_health, HealthCheckConfig(jitter=0.0, **config))
+    return checker, servers['a:1'], changes
+
+def record(checker, *outcomes):
+    state = checker._states['a:1']
+    for healthy in outcomes:
+        checker._record('a:1', state, healthy)
+    return state
+
+def test_fall_then_rise_thresholds():
+    checker, server, changes = make_checker(rise=2, fall=3)
+    record(checker, False, False)
+    assert server.is_healthy and changes == []
+    record(checker, False)
+    assert not server.is_healthy and changes == [False]
+    record(checker, True)
+    assert changes == [False]
+    record(checker, True)
+    assert server.is_healthy and changes == [False, True]
+
+def test_a_success_resets_the_failure_count():
+    checker, server, changes = make_checker(fall=2)
+    record(checker, False, True, False, True)
+    assert server.is_healthy and changes == []
+
+def test_passive_failures_mark_down():
+    checker, server, changes = make_checker(passive_fall=3, failing_interval=2.0)
+    checker.report_failure('a:1')
+    checker.report_failure('a:1')
+    checker.report_success('a:1')  # A success in between starts the count over
+    checker.report_failure('a:1')
+    checker.report_failure('a:1')
+    assert changes == []
+    checker.report_failure('a:1')
+    assert changes == [False]
+    state = checker._states['a:1']
+    assert state.interval == 2.0 and state.failures == checker.config.fall
+    assert checker._schedule[0][1] == 'a:1' and len(checker._schedule) == 2  # Re-probed soon
+
+def test_interval_backs_off_while_stable_and_resets_on_failure():
+    checker, _, _ = make_checker(interval=10.0, stable_interval=30.0, failing_interval=2.0,
+                                 backoff=1.5, rise=2, fall=3)
+    intervals = [record(checker, True).interval for _ in range(5)]
+    assert intervals == [10.0, 15.0, 22.5, 30.0, 30.0]
+    assert record(checker, False).interval == 2.0
+    assert record(checker, True).interval == 10.0  # Still up, so back to the normal interval
+
+def test_stale_heap_entries_are_skipped():
+    checker, _, _ = make_checker(failing_interval=0.0)
+    checker.track('b:2')
+    checker.servers['b:2'] = ServerStats(host='b', port=2)
+    started = []
+
+    async def probe(key, state):
+        started.append(key)
+
+    checker._probe = probe
+
+    async def run():
+        checker.untrack('a:1')
+        # A reschedule leaves the earlier entry behind in the heap
+        state = checker._states['b:2']
+        checker._schedule_probe('b:2', state, 0.0)
+        assert len(checker._schedule) == 3
+        assert checker._dispatch_due() == checker.config.stable_interval
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert started == ['b:2'] and checker._schedule == []
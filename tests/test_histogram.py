@@ -0,0 +1,75 @@
+import random
+
+import histogram
+from histogram import LatencyHistogram, bucket_bounds, bucket_index
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_bucket_bounds_contain_their_values():
+    for value_us in [0, 1, 63, 64, 65, 1000, 123456, 2 ** 31]:
+        low, high = bucket_bounds(bucket_index(value_us))
+        assert low <= value_us < high
+
+def test_percentiles_match_sorted_values():
+    values = [random.uniform(0.0001, 2.0) for _ in range(5000)]
+    h = LatencyHistogram()
+    for value in values:
+        h.record(value)
+    ordered = sorted(values)
+    for q, estimate in h.percentiles((0.5, 0.9, 0.99)).items():
+        exact = ordered[int(q * len(ordered)) - 1]
+        assert abs(estimate - exact) / exact < 0.05
+
+def test_window_covers_live_slices_only(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(histogram.time, 'monotonic', clock)
+    h = LatencyHistogram(window=60.0, slices=6)
+    h.record(0.001)
+    clock.now += 30
+    h.record(0.002)
+    h.record(0.003)
+    assert h.summary(windowed=True)["count"] == 3
+    assert h.window_totals() == (3, 6000)
+    clock.now += 35  # The first slice has left the window
+    assert h.window_totals() == (2, 5000)
+    summary = h.summary(windowed=True)
+    assert summary["count"] == 2 and summary["p50_ms"] > 1.5
+    clock.now += 60
+    assert h.summary(windowed=True)["count"] == 0
+    assert h.summary()["count"] == 3
+
+def test_window_matches_a_fresh_merge(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(histogram.time, 'monotonic', clock)
+    h = LatencyHistogram(window=6.0, slices=6)
+    recent = []
+    for second in range(40):
+        clock.now = 1000.0 + second
+        for _ in range(random.randint(0, 5)):
+            value = random.uniform(0.0001, 0.5)
+            h.record(value)
+            recent.append((second, value))
+        expected = LatencyHistogram()
+        for when, value in recent:
+            if when > second - 6:
+                expected.record(value)
+        counts, total, sum_us, _ = h.snapshot(windowed=True)
+        assert total == expected.total and sum_us == expected.sum_us
+        assert list(counts) == list(expected.counts)
+
+def test_summary_is_reused_until_something_changes():
+    h = LatencyHistogram()
+    h.record(0.01)
+    first = h.summary()
+    assert h.summary() == first
+    h.record(1.0)
+    assert h.summary()["count"] == 2 and h.summary()["max_ms"] == 1000.0
+    merged = LatencyHistogram()
+    merged.summary()
+    merged.merge(h)
+    assert merged.summary()["count"] == 2
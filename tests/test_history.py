@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from balancer import LoadBalancer
+from histogram import LatencyHistogram
+from history import AGGREGATE, StatsHistory, bucket_quantiles, delta_quantiles
+
+START = 1_800_000_000  # A multiple of 600, so every level's points start together
+
+def feed(history, seconds, per_second=2, latency=0.01, start=START):
+    """Sample one backend 'b' for `seconds`, completing `per_second` requests each second"""
+    backend = LatencyHistogram()
+    aggregate = LatencyHistogram()
+    requests = 0
+    for offset in range(seconds + 1):
+        history.sample([('b', requests, 0, 3, backend)], aggregate, now=start + offset)
+        for _ in range(per_second):
+            backend.record(latency)
+            aggregate.record(latency)
+        requests += per_second
+    return history
+
+def test_bucket_quantiles_interpolate_within_buckets():
+    p50, p95, p99 = bucket_quantiles([0, 10, 0] + [0] * 30)
+    assert 0 < p50 < p95 < p99
+    assert delta_quantiles([5, 10], [5, 0], 10) == bucket_quantiles([0, 10])
+
+def test_one_second_points():
+    result = feed(StatsHistory(), 10).query('b', START, START + 20)
+    assert result["resolution"] == 1
+    assert result["timestamps"] == list(range(START, START + 10))
+    assert set(result["requests_per_sec"]) == {2}
+    assert set(result["in_flight"]) == {3}
+    assert all(5 < value <= 10 for value in result["p50_ms"])  # Within the 5-10 ms export bucket
+
+def test_minute_rollups_sum_the_seconds_they_cover():
+    history = feed(StatsHistory(), 3 * 60 + 1)  # The sample after a minute ends closes it
+    result = history.query('b', START, START + 3 * 60, step=60)
+    assert result["resolution"] == 60
+    assert result["timestamps"] == [START, START + 60, START + 120]
+    assert result["requests_per_sec"] == [2, 2, 2]
+    assert set(result["in_flight"]) == {3}
+
+def test_idle_seconds_have_no_latency():
+    history = feed(StatsHistory(), 5, per_second=0)
+    result = history.query('b', START, START + 10)
+    assert result["requests_per_sec"] and set(result["p99_ms"]) == {None}
+
+@pytest.mark.parametrize('start', [-1e18, 0, START - 10 ** 9])
+def test_query_range_is_clamped_to_retained_history(start):
+    history = feed(StatsHistory(), 30)
+    result = history.query(AGGREGATE, start, START + 10 ** 9, step=1)
+    assert result["from"] >= START - 600 * 144
+    assert result["to"] == START + 30
+    assert len(result["timestamps"]) <= 1440
+
+def test_query_with_huge_step_is_bounded():
+    history = feed(StatsHistory(), 30)
+    result = history.query('b', START, START + 30, step=10 ** 15)
+    assert len(result["timestamps"]) <= 1
+
+def test_empty_range_after_clamping():
+    history = feed(StatsHistory(), 30)
+    assert history.query('b', START + 100, START + 200)["timestamps"] == []
+
+@pytest.mark.parametrize('query', ['from=nan&to=100', 'from=0&to=inf', 'from=-inf', 'from=x'])
+def test_endpoint_rejects_non_finite_bounds(tmp_path, query):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "a", "port": 1}]))
+    lb = LoadBalancer(str(path))
+    feed(lb.history, 5)
+    response = asyncio.run(lb.history_endpoint(make_mocked_request('GET', f'/lb/stats/history?{query}')))
+    assert response.status == 400
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from limiter import ConcurrencyLimiter, ConcurrencyLimits, LimiterConfig, LoadShed
+
+def test_queue_hands_slots_over_in_order():
+    async def run():
+        limiter = ConcurrencyLimiter('b', LimiterConfig(initial_limit=1, queue_size=2))
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter(name)) for name in ('first', 'second')]
+        await asyncio.sleep(0)
+        assert limiter.queued == 2
+        with pytest.raises(LoadShed):
+            await limiter.acquire()  # Queue full
+        limiter.release()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == ['first', 'second'] and limiter.in_flight == 1 and limiter.shed == 1
+
+    asyncio.run(run())
+
+def test_queue_timeout_sheds():
+    async def run():
+        limiter = ConcurrencyLimiter('b', LimiterConfig(initial_limit=1, queue_timeout=0.01))
+        await limiter.acquire()
+        with pytest.raises(LoadShed) as raised:
+            await limiter.acquire()
+        assert raised.value.retry_after == limiter.config.retry_after
+        assert limiter.queue_timeouts == 1 and limiter.queued == 0 and limiter.in_flight == 1
+
+    asyncio.run(run())
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = ConcurrencyLimiter('b', LimiterConfig(initial_limit=1))
+        await limiter.acquire()
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        limiter.release()
+        assert limiter.queued == 0 and limiter.in_flight == 0
+
+    asyncio.run(run())
+
+def test_aimd_backs_off_and_grows():
+    limiter = ConcurrencyLimiter('b', LimiterConfig(algorithm='aimd', initial_limit=10))
+    limiter.observe(0.01, dropped=True)
+    assert limiter.limit == pytest.approx(9.0)
+    limiter.in_flight = 9
+    limiter.observe(0.01)
+    assert limiter.limit == pytest.approx(9.0 + 1 / 9)
+
+def test_gradient_shrinks_when_latency_inflates():
+    limiter = ConcurrencyLimiter('b', LimiterConfig(initial_limit=100, tolerance=1.0))
+    limiter.in_flight = 100
+    limiter.observe(0.01)
+    start = limiter.limit
+    for _ in range(50):
+        limiter.observe(0.1)
+    assert limiter.limit < start
+
+def test_unknown_algorithm_is_rejected():
+    with pytest.raises(ValueError):
+        ConcurrencyLimits(LimiterConfig(algorithm='nope'))
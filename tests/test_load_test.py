@@ -0,0 +1,54 @@
+import asyncio
+import sys
+
+import pytest
+
+import load_test
+from load_test import parse_stages, process_share, send_times
+
+def test_parse_stages():
+    assert parse_stages('100:10, 100-1000:30,0:5') == [(100, 100, 10), (100, 1000, 30), (0, 0, 5)]
+
+@pytest.mark.parametrize('spec', ['10:0', '-5:10', '10--5:10', '10', 'x:10', '10:x', 'nan:10', 'inf:10', '10:inf', ''])
+def test_parse_stages_rejects_bad_stages(spec):
+    with pytest.raises(ValueError):
+        parse_stages(spec)
+
+def test_constant_rate_is_evenly_spaced():
+    times = list(send_times([(10, 10, 2)]))
+    assert len(times) == 20
+    assert times[0] == pytest.approx(0.1) and times[-1] == pytest.approx(2.0)
+    assert all(b - a == pytest.approx(0.1) for a, b in zip(times, times[1:]))
+
+def test_ramp_up_sends_the_area_under_the_rate():
+    times = list(send_times([(0, 10, 10)]))
+    assert len(times) == 50  # (0 + 10) / 2 * 10
+    assert times == sorted(times) and times[-1] == pytest.approx(10.0)
+    assert times[1] - times[0] > times[-1] - times[-2]  # Sends get closer as the rate rises
+
+def test_ramp_down_to_zero():
+    times = list(send_times([(10, 0, 10), (0, 0, 5), (2, 2, 1)]))
+    assert len(times) == 52
+    assert times[49] == pytest.approx(10.0)
+    assert times[50:] == pytest.approx([15.5, 16.0])  # Nothing during the idle stage
+
+def test_fractional_requests_carry_into_the_next_stage():
+    times = list(send_times([(1.5, 1.5, 1), (1.5, 1.5, 1)]))
+    assert times == pytest.approx([2 / 3, 4 / 3, 2.0])
+    assert len(list(send_times([(0.3, 0.3, 1)] * 10))) == 3
+
+def test_processes_split_the_schedule_without_overlap():
+    stages = [(0, 100, 3), (100, 100, 1)]
+    everything = list(enumerate(send_times(stages)))
+    shares = [list(process_share(stages, index, 3)) for index in range(3)]
+    assert sorted(sum(shares, [])) == everything
+    for index, share in enumerate(shares):
+        assert all(request_id % 3 == index for request_id, _ in share)
+    assert max(map(len, shares)) - min(map(len, shares)) <= 1
+
+@pytest.mark.parametrize('argv', [['--rate', '10', '--duration', '0'], ['--rate', '-5'], ['--ramp', '10:-1']])
+def test_bad_rate_options_are_usage_errors(monkeypatch, argv):
+    monkeypatch.setattr(sys, 'argv', ['load_test.py'] + argv)
+    with pytest.raises(SystemExit) as exit:
+        asyncio.run(load_test.main())
+    assert exit.value.code == 2
@@ -0,0 +1,53 @@
+import json
+
+from balancer import LoadBalancer
+
+def make_balancer(tmp_path, count=3):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "h", "port": port} for port in range(count)]))
+    return LoadBalancer(str(path))
+
+def lines(lb):
+    return lb.metrics.render().decode().splitlines()
+
+def test_backend_lines_and_histogram(tmp_path):
+    lb = make_balancer(tmp_path)
+    server = lb.servers['h:1']
+    server.total_requests = 7
+    server.latency.record(0.003)
+    server.latency.record(100.0)
+    text = lines(lb)
+    assert 'lb_backend_requests_total{backend="h:1"} 7' in text
+    assert 'lb_backend_healthy{backend="h:0"} 1' in text
+    assert 'lb_backend_request_duration_seconds_bucket{backend="h:1",le="0.0025"} 0' in text
+    assert 'lb_backend_request_duration_seconds_bucket{backend="h:1",le="0.005"} 1' in text
+    assert 'lb_backend_request_duration_seconds_bucket{backend="h:1",le="+Inf"} 2' in text
+    assert 'lb_backend_request_duration_seconds_count{backend="h:1"} 2' in text
+    assert text.count('# TYPE lb_backend_requests_total counter') == 1
+
+def test_unchanged_backends_reuse_the_cached_section(tmp_path):
+    lb = make_balancer(tmp_path)
+    lb.metrics.render()
+    section = lb.metrics._section
+    lb.metrics.render()
+    assert lb.metrics._section is section
+
+def test_changed_values_are_re_rendered(tmp_path):
+    lb = make_balancer(tmp_path)
+    lines(lb)
+    server = lb.servers['h:2']
+    server.active_connections = 4
+    server.is_healthy = False
+    server.latency.record(0.2)
+    text = lines(lb)
+    assert 'lb_backend_in_flight{backend="h:2"} 4' in text
+    assert 'lb_backend_healthy{backend="h:2"} 0' in text
+    assert 'lb_backend_request_duration_seconds_count{backend="h:2"} 1' in text
+
+def test_membership_changes_are_reflected(tmp_path):
+    lb = make_balancer(tmp_path)
+    lines(lb)
+    lb.add_server('h', 9)
+    lb.remove_server('h', 0)
+    text = '\n'.join(lines(lb))
+    assert 'backend="h:9"' in text and 'backend="h:0"' not in text
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import balancer
+from balancer import BalancingAlgorithm, LoadBalancer, ServerStats
+from limiter import LimiterConfig
+from outlier import CLOSED, HALF_OPEN, OPEN, OutlierConfig, OutlierDetector
+
+def make_detector(count=4, **config):
+    servers = {f"h:{port}": ServerStats(host='h', port=port) for port in range(count)}
+    events = []
+    detector = OutlierDetector(servers, lambda key: events.append(('eject', key)),
+                               lambda key: events.append(('restore', key)),
+                               OutlierConfig(base_ejection=0.0, **config))
+    return detector, events
+
+def eject(detector, key):
+    for _ in range(detector.config.consecutive_errors):
+        detector.record(key, False)
+
+def test_consecutive_errors_eject_then_trials_restore():
+    detector, events = make_detector()
+    eject(detector, 'h:0')
+    assert detector.breakers['h:0'].state == OPEN and events == [('eject', 'h:0')]
+    assert detector.take_trial() is None
+    detector.sweep()
+    assert detector.breakers['h:0'].state == HALF_OPEN
+    for _ in range(detector.config.half_open_trials):
+        assert detector.take_trial() == 'h:0'
+        detector.record('h:0', True)
+    assert detector.breakers['h:0'].state == CLOSED and events[-1] == ('restore', 'h:0')
+    assert detector.take_trial() is None
+
+def test_trial_slots_are_limited_and_freed():
+    detector, _ = make_detector(half_open_trials=2)
+    eject(detector, 'h:0')
+    detector.sweep()
+    assert [detector.take_trial() for _ in range(3)] == ['h:0', 'h:0', None]
+    detector.abandon('h:0')
+    assert detector.take_trial() == 'h:0'
+    assert detector.take_trial() is None
+
+def test_trial_failure_re_ejects():
+    detector, _ = make_detector()
+    eject(detector, 'h:0')
+    detector.sweep()
+    assert detector.take_trial() == 'h:0'
+    detector.record('h:0', False)
+    assert detector.breakers['h:0'].state == OPEN
+    assert detector.take_trial() is None
+
+def test_unhealthy_half_open_backend_gets_no_trials():
+    detector, _ = make_detector()
+    eject(detector, 'h:0')
+    eject(detector, 'h:1')
+    detector.sweep()
+    detector.servers['h:0'].is_healthy = False
+    assert detector.take_trial() == 'h:1'
+
+def test_max_ejected_percent_is_respected():
+    detector, _ = make_detector(count=4, max_ejected_percent=50.0)
+    for key in ('h:0', 'h:1', 'h:2'):
+        eject(detector, key)
+    assert detector.ejected == 2 and detector.refused == 1
+
+def half_open_balancer(tmp_path, algorithm=BalancingAlgorithm.ROUND_ROBIN, **options):
+    """Balancer over a:1 and b:2 with a:1 half-open"""
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "a", "port": 1}, {"host": "b", "port": 2}]))
+    lb = LoadBalancer(str(path), algorithm, outlier=OutlierConfig(consecutive_errors=1, base_ejection=0.0),
+                      **options)
+    lb.outliers.record('a:1', False)
+    lb.outliers.sweep()
+    assert lb.outliers.breakers['a:1'].state == HALF_OPEN
+    return lb
+
+def test_unpinned_request_takes_a_trial(tmp_path, make_request):
+    lb = half_open_balancer(tmp_path)
+    server, session_id, _ = lb._route(make_request())
+    assert lb.get_server_key(server) == 'a:1'
+    assert lb.sessions._pending[session_id].server_key == 'b:2'  # The session still goes to rotation
+
+def test_sticky_session_keeps_its_backend(tmp_path, make_request):
+    lb = half_open_balancer(tmp_path)
+    lb.sessions.set('s1', 'b:2')
+    lb.sessions.get('s1')
+    for _ in range(5):
+        server, _, _ = lb._route(make_request(headers={'Cookie': 'lb_session_id=s1'}))
+        assert lb.get_server_key(server) == 'b:2'
+    assert lb.outliers.breakers['a:1'].trials == 0
+
+def test_consistent_hash_keeps_its_backend(tmp_path, make_request):
+    lb = half_open_balancer(tmp_path, BalancingAlgorithm.CONSISTENT_HASH)
+    for _ in range(5):
+        server, _, hash_key = lb._route(make_request())
+        assert hash_key is not None and lb.get_server_key(server) == 'b:2'
+    assert lb.outliers.breakers['a:1'].trials == 0
+
+def test_websocket_never_takes_a_trial(tmp_path, make_request):
+    lb = half_open_balancer(tmp_path)
+    urls = []
+
+    async def connect(request, url, headers):
+        urls.append(url)
+        raise ConnectionRefusedError()
+
+    lb.websockets.connect = connect
+    request = make_request(headers={'Connection': 'Upgrade', 'Upgrade': 'websocket'})
+    response = asyncio.run(lb.forward_request(request))
+    assert response.status == 502 and urls == ['http://b:2/']
+    assert lb.outliers.breakers['a:1'].trials == 0
+
+def test_shed_trial_gives_its_slot_back(tmp_path, make_request):
+    lb = half_open_balancer(tmp_path, limiter=LimiterConfig(initial_limit=1, queue_size=0))
+    lb.limits.get('a:1').in_flight = 1  # At its limit with no queue: the next request is shed
+    response = asyncio.run(lb.forward_request(make_request()))
+    assert response.status == 503 and lb.limits.get('a:1').shed == 1
+    breaker = lb.outliers.breakers['a:1']
+    assert breaker.state == HALF_OPEN and breaker.trials == 0
+    assert lb.servers['a:1'].active_connections == 0
+
+def test_trial_rejected_before_its_attempt_gives_its_slot_back(tmp_path, make_request, monkeypatch):
+    async def client_body(request, config):
+        raise ConnectionResetError('client went away')
+
+    monkeypatch.setattr(balancer, 'request_body', client_body)
+    lb = half_open_balancer(tmp_path)
+    assert asyncio.run(lb.forward_request(make_request(method='POST'))).status == 502
+    assert lb.outliers.breakers['a:1'].trials == 0
+    assert [lb.outliers.take_trial() for _ in range(3)] == ['a:1'] * 3
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from balancer import BalancingAlgorithm, LoadBalancer
+from selection import PeakEwma
+
+def test_peak_ewma_jumps_up_and_decays_down():
+    ewma = PeakEwma(decay=10.0)
+    assert ewma.cost(0) == 0.0 and ewma.cost(1) > 100  # Unmeasured, busy
+    ewma.observe(0.5)
+    assert ewma.value == 0.5
+    ewma.observe(0.1)
+    assert 0.1 <= ewma.value <= 0.5
+    assert ewma.cost(2) == pytest.approx(ewma.value * 3)
+
+def test_busy_backend_costs_more():
+    ewma = PeakEwma()
+    ewma.observe(0.1)
+    assert ewma.cost(0) < ewma.cost(1) < ewma.cost(5)
+
+@pytest.mark.parametrize('algorithm', [BalancingAlgorithm.PEAK_EWMA, BalancingAlgorithm.P2C])
+def test_latency_aware_algorithms_prefer_the_faster_backend(tmp_path, algorithm):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "slow", "port": 1}, {"host": "fast", "port": 2}]))
+    lb = LoadBalancer(str(path), algorithm)
+    lb.servers['slow:1'].peak_ewma.observe(0.5)
+    lb.servers['fast:2'].peak_ewma.observe(0.01)
+    assert {lb.get_next_server().host for _ in range(10)} == {'fast'}
+    # Enough requests in flight outweigh the latency difference
+    lb.servers['fast:2'].active_connections = 100
+    assert lb.get_next_server().host == 'slow'
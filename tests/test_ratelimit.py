@@ -0,0 +1,56 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from balancer import LoadBalancer
+from ratelimit import RateLimiter, RateLimitRule, TokenBucketTable
+
+def test_bucket_allows_burst_then_refills():
+    table = TokenBucketTable(rate=2.0, burst=3.0)
+    assert [table.take('k', now=100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert table.take('k', now=100.0) == pytest.approx(0.5)
+    assert table.take('k', now=100.6) == 0.0
+    assert table.take('other', now=100.6) == 0.0
+
+def test_full_table_reuses_idle_slots_without_counting_evictions():
+    table = TokenBucketTable(rate=1.0, burst=1.0, max_keys=4)
+    for n in range(4):
+        table.take(f'k{n}', now=0.0)
+    table.take('new', now=10.0)
+    assert table.evictions == 0
+
+def test_longest_route_prefix_wins(make_request):
+    limiter = RateLimiter([RateLimitRule(route='/', rate=100), RateLimitRule(route='/api', rate=1, burst=1)])
+    request = make_request(path='/api/x')
+    assert limiter.check(request) == 0.0
+    assert limiter.check(request) > 0
+    assert limiter.check(make_request(path='/other')) == 0.0
+
+@pytest.mark.parametrize('rule', [RateLimitRule(rate=0), RateLimitRule(rate=-1),
+                                  RateLimitRule(rate=float('nan')), RateLimitRule(rate=10, burst=0.5)])
+def test_rules_that_would_reject_forever_are_refused(rule):
+    with pytest.raises(ValueError):
+        RateLimiter([rule])
+
+def test_limited_request_gets_429_with_retry_after(tmp_path, make_request):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": 1}]))
+    lb = LoadBalancer(str(path), rate_limits=[RateLimitRule(rate=0.5, burst=1)])
+    request = make_request(path='/x')
+    lb.rate_limiter.check(request)
+    response = asyncio.run(lb.forward_request(request))
+    assert response.status == 429 and response.headers['Retry-After'] == '2'
+
+def test_bucket_slots_do_not_depend_on_the_hash_seed():
+    script = ("import sys; sys.path.insert(0, sys.argv[1]); from ratelimit import TokenBucketTable; "
+              "t = TokenBucketTable(1.0, 1.0); t.take('203.0.113.7', now=0.0); "
+              "print([(i, f) for i, f in enumerate(t._fingerprints) if f])")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs = {subprocess.run([sys.executable, '-c', script, root], capture_output=True, text=True, check=True,
+                              env={**os.environ, 'PYTHONHASHSEED': seed}).stdout
+               for seed in ('1', '2')}
+    assert len(outputs) == 1
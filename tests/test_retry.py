@@ -0,0 +1,45 @@
+import pytest
+
+import retry
+from retry import ROUTE_BUCKETS, RouteLatency, route_key
+
+@pytest.mark.parametrize('path, route', [
+    ('/test/1', '/test/{id}'),
+    ('/users/6f1c0e2a-93b4-4d6e-8c2a-0b9d2f6a1e47/orders/17', '/users/{id}/orders'),
+    ('/static/app.js', '/static/app.js'),
+    ('/a/b/c/d/e', '/a/b/c'),
+    ('/', '/'),
+])
+def test_route_key_folds_identifiers_and_depth(path, route):
+    assert route_key(path) == route
+
+def test_paths_with_ids_share_one_route_and_keep_real_routes():
+    routes = RouteLatency(min_samples=1, max_routes=2, refresh=0)
+    routes.record('/search', 0.5)
+    for n in range(1000):
+        routes.record(f'/items/{n}', 0.01)
+    assert len(routes) == 2
+    assert routes.delay('/search') is not None
+    assert routes.delay('/items/12345') is not None
+
+def test_delay_is_the_bucket_above_the_quantile():
+    routes = RouteLatency(quantile=0.9, min_samples=20, refresh=0)
+    for _ in range(19):
+        routes.record('/api', 0.010)
+    assert routes.delay('/api') is None
+    for _ in range(81):
+        routes.record('/api', 0.010)
+    assert 0.010 <= routes.delay('/api') <= 0.010 * 2 ** 0.25
+    routes.record('/api', 1000.0)  # Clamped into the last bucket, not an IndexError
+    assert routes._routes['/api'].current[ROUTE_BUCKETS - 1] == 1
+
+def test_old_samples_leave_after_a_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retry.time, 'monotonic', lambda: now[0])
+    routes = RouteLatency(min_samples=5, refresh=0, window=60.0)
+    for _ in range(10):
+        routes.record('/api', 0.5)
+    now[0] += 31
+    assert routes.delay('/api') is not None  # Previous half-window still counts
+    now[0] += 31
+    assert routes.delay('/api') is None
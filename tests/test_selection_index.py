@@ -0,0 +1,38 @@
+from selection import LeastConnectionsHeap, RoundRobinRing, SelectionIndex
+
+def picks(selector, count):
+    return [selector.next() for _ in range(count)]
+
+def test_round_robin_ring_survives_membership_changes():
+    ring = RoundRobinRing()
+    for key in 'abc':
+        ring.add(key)
+    assert picks(ring, 4) == ['a', 'b', 'c', 'a']
+    ring.remove('b')
+    ring.add('d')  # Joins at the end of the current rotation
+    assert picks(ring, 4) == ['c', 'a', 'd', 'c']
+    for key in 'acd':
+        ring.remove(key)
+    assert ring.next() is None
+
+def test_least_connections_heap_tracks_updates():
+    heap = LeastConnectionsHeap()
+    for key, connections in (('a', 3), ('b', 1), ('c', 2)):
+        heap.add(key, connections)
+    assert heap.peek() == 'b'
+    heap.update('b', 5)
+    assert heap.peek() == 'c'
+    heap.remove('c')
+    assert heap.peek() == 'a'
+
+def test_index_members_and_sampling():
+    index = SelectionIndex()
+    for key in 'abcd':
+        index.add(key, weight=2)
+    index.remove('b')
+    assert sorted(index.members) == ['a', 'c', 'd'] and len(index) == 3
+    for _ in range(20):
+        first, second = index.sample_two()
+        assert first != second and {first, second} <= {'a', 'c', 'd'}
+    index.update_weight('b', 5)  # Not a member: ignored
+    assert 'b' not in index.weighted.weights
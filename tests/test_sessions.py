@@ -0,0 +1,76 @@
+import json
+import sys
+
+from aiohttp import web
+
+import sessions
+from balancer import LoadBalancer
+from main import parse_args
+from sessions import SessionStore
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def established(store, session_id, server_key='a:1'):
+    store.set(session_id, server_key)
+    assert store.get(session_id) == server_key  # The client came back
+    return session_id
+
+def test_new_sessions_are_provisional_until_returned():
+    store = SessionStore(max_entries=10, max_pending=5)
+    store.set('s1', 'a:1')
+    assert len(store) == 0 and store.get_stats()["pending"] == 1
+    assert store.get('s1') == 'a:1'
+    assert len(store) == 1 and store.get_stats()["promotions"] == 1
+
+def test_first_seen_flood_does_not_evict_established_sessions():
+    store = SessionStore(max_entries=3, max_pending=5)
+    for session_id in ('s1', 's2', 's3'):
+        established(store, session_id)
+    for n in range(1000):
+        store.set(f'drive-by-{n}', 'b:2')
+    assert [store.get(session_id) for session_id in ('s1', 's2', 's3')] == ['a:1'] * 3
+    assert store.get_stats()["pending"] == 5 and store.evictions == 0
+
+def test_lru_eviction_of_established_sessions():
+    store = SessionStore(max_entries=2)
+    for session_id in ('s1', 's2'):
+        established(store, session_id)
+    store.get('s1')
+    established(store, 's3')
+    assert 's2' not in store and 's1' in store and store.evictions == 1
+
+def test_timing_wheel_expires_idle_sessions(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, 'monotonic', clock)
+    store = SessionStore(ttl=10, resolution=1.0)
+    established(store, 'idle')
+    established(store, 'busy')
+    for _ in range(15):
+        clock.now += 1
+        store.get('busy')
+        store.expire()
+    assert 'busy' in store
+    assert store.get_stats()["size"] == 1 and store.expirations == 1
+
+def test_provisional_sessions_expire_when_read(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, 'monotonic', clock)
+    store = SessionStore(ttl=10)
+    store.set('late', 'a:1')
+    clock.now += 11
+    assert store.get('late') is None
+
+def test_session_ttl_is_an_integer_max_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['main.py', '--session-ttl', '600'])
+    assert parse_args().session_ttl == 600
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": 1}]))
+    lb = LoadBalancer(str(path), session_timeout=600.0)
+    response = web.Response()
+    response.set_cookie('lb_session_id', 'x', max_age=lb.session_timeout)
+    assert 'Max-Age=600;' in response.cookies['lb_session_id'].output() + ';'
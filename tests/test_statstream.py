@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import pytest
+
+from statstream import _MISSING, QUEUE_FRAMES, NullValue, StatsBroadcaster, diff
+
+def parse(frame: bytes):
+    event, data = frame.decode().strip().split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+def test_diff_sends_only_changed_leaves():
+    previous = {"a": 1, "servers": {"x": {"requests": 1, "healthy": True}}}
+    current = {"a": 1, "servers": {"x": {"requests": 2, "healthy": True}}}
+    assert diff(previous, current) == {"servers": {"x": {"requests": 2}}}
+    assert diff(current, current) is _MISSING
+
+def test_diff_deletes_removed_keys_and_adds_new_objects_whole():
+    previous = {"servers": {"x": {"requests": 1}, "y": {"requests": 1}}}
+    current = {"servers": {"x": {"requests": 1}, "z": {"requests": 0}}}
+    assert diff(previous, current) == {"servers": {"y": None, "z": {"requests": 0}}}
+
+def test_diff_treats_a_type_change_as_a_change():
+    assert diff({"a": 1}, {"a": 1.0}) == {"a": 1.0}
+    assert diff({"a": [1, None]}, {"a": [2, None]}) == {"a": [2, None]}  # Arrays are replaced whole
+
+@pytest.mark.parametrize('previous, current', [
+    ({"p99": 5.0}, {"p99": None}),
+    ({}, {"p99": None}),
+    ({"servers": {}}, {"servers": {"x": {"last_health_check": None}}}),
+])
+def test_diff_refuses_nulls(previous, current):
+    with pytest.raises(NullValue):
+        diff(previous, current)
+
+def test_unchanged_null_is_not_a_change():
+    assert diff({"p99": None}, {"p99": None}) is _MISSING
+
+def broadcaster(states):
+    states = iter(states)
+    return StatsBroadcaster(lambda: next(states), interval=3600)
+
+def test_subscriber_gets_a_snapshot_then_deltas():
+    async def run():
+        stream = broadcaster([{"n": 1, "p99": 2.0}, {"n": 2, "p99": 2.0}, {"n": 2, "p99": 2.0},
+                              {"n": 2, "p99": None}])
+        frames = stream.subscribe()
+        assert parse(await frames.__anext__()) == ('snapshot', {"n": 1, "p99": 2.0})
+        stream.tick()
+        assert parse(await frames.__anext__()) == ('delta', {"n": 2})
+        stream.tick()
+        assert await frames.__anext__() == b": idle\n\n"
+        stream.tick()
+        assert parse(await frames.__anext__()) == ('snapshot', {"n": 2, "p99": None})
+        await frames.aclose()
+        await stream.close()
+
+    asyncio.run(run())
+
+def test_slow_subscriber_is_resynced_with_a_snapshot():
+    async def run():
+        stream = broadcaster([{"n": n} for n in range(QUEUE_FRAMES + 4)])
+        frames = stream.subscribe()
+        await frames.__anext__()
+        for _ in range(QUEUE_FRAMES + 2):
+            stream.tick()
+        assert stream.resyncs == 2
+        received = [parse(await frames.__anext__()) for _ in range(QUEUE_FRAMES)]
+        assert all(event == 'delta' for event, _ in received)
+        stream.tick()  # The first frame after falling behind is a full snapshot
+        assert parse(await frames.__anext__()) == ('snapshot', {"n": QUEUE_FRAMES + 3})
+        await frames.aclose()
+        await stream.close()
+
+    asyncio.run(run())
@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from multidict import CIMultiDict
+
+from balancer import LoadBalancer
+from streaming import StreamingConfig, filter_headers, is_upstream_error
+
+def test_filter_headers_drops_hop_by_hop_and_connection_tokens():
+    headers = CIMultiDict([('Connection', 'keep-alive, X-Private'), ('X-Private', '1'),
+                           ('Transfer-Encoding', 'chunked'), ('Accept', '*/*')])
+    assert list(filter_headers(headers).items()) == [('Accept', '*/*')]
+
+def test_backend_read_failures_are_upstream_errors():
+    assert is_upstream_error(aiohttp.ClientPayloadError('truncated'))
+    assert is_upstream_error(aiohttp.ServerDisconnectedError())
+    assert is_upstream_error(asyncio.TimeoutError())
+
+def test_client_side_failures_are_not_upstream_errors():
+    assert not is_upstream_error(ConnectionResetError('Cannot write to closing transport'))
+    assert not is_upstream_error(ValueError('bad chunk'))
+
+THRESHOLD = 1024
+TIMEOUT = aiohttp.ClientTimeout(total=5)  # A proxy that buffers where it should stream fails rather than hangs
+
+async def start_proxy(tmp_path, handler):
+    """A backend running `handler` behind a proxy that buffers bodies up to THRESHOLD bytes"""
+    backend_app = web.Application()
+    backend_app.router.add_route('*', '/{tail:.*}', handler)
+    backend = TestServer(backend_app)
+    await backend.start_server()
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": backend.port}]))
+    lb = LoadBalancer(str(path), history=False, streaming=StreamingConfig(chunk_size=256, buffer_threshold=THRESHOLD))
+    lb.start_upstream()
+    front = TestServer(lb.get_app())
+    await front.start_server()
+    return lb, backend, front
+
+async def stop(lb, backend, front):
+    await front.close()
+    await lb.shutdown()
+    await backend.close()
+
+@pytest.mark.parametrize('sized', [True, False])
+def test_large_or_unsized_request_bodies_are_streamed_upstream(tmp_path, sized):
+    first_half = asyncio.Event()
+    seen = {}
+
+    async def backend(request):
+        seen['length'] = request.headers.get('Content-Length')
+        seen['encoding'] = request.headers.get('Transfer-Encoding')
+        start = await request.content.readexactly(2 * THRESHOLD)
+        first_half.set()  # The client only sends the rest once this arrived
+        seen['body'] = start + await request.read()
+        return web.Response(text='ok')
+
+    async def upload():
+        yield b'a' * 2 * THRESHOLD
+        await asyncio.wait_for(first_half.wait(), 2)
+        yield b'b' * 2 * THRESHOLD
+
+    async def run():
+        lb, server, front = await start_proxy(tmp_path, backend)
+        headers = {'Content-Length': str(4 * THRESHOLD)} if sized else {}
+        try:
+            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+                async with session.post(front.make_url('/upload'), data=upload(), headers=headers) as resp:
+                    assert resp.status == 200
+        finally:
+            await stop(lb, server, front)
+        assert seen['body'] == b'a' * 2 * THRESHOLD + b'b' * 2 * THRESHOLD
+        if sized:
+            assert seen['length'] == str(4 * THRESHOLD)
+        else:
+            assert seen['length'] is None and seen['encoding'] == 'chunked'
+    asyncio.run(run())
+
+def test_request_bodies_at_the_threshold_are_buffered(tmp_path):
+    seen = {}
+
+    async def backend(request):
+        seen['length'] = request.headers.get('Content-Length')
+        seen['body'] = await request.read()
+        return web.Response(text='ok')
+
+    async def run():
+        lb, server, front = await start_proxy(tmp_path, backend)
+        try:
+            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+                async with session.post(front.make_url('/upload'), data=b'x' * THRESHOLD) as resp:
+                    assert resp.status == 200
+        finally:
+            await stop(lb, server, front)
+        assert seen == {'length': str(THRESHOLD), 'body': b'x' * THRESHOLD}
+    asyncio.run(run())
+
+@pytest.mark.parametrize('sized', [True, False])
+def test_large_or_unsized_responses_are_relayed_chunk_by_chunk(tmp_path, sized):
+    release = asyncio.Event()
+
+    async def backend(request):
+        response = web.StreamResponse()
+        if sized:
+            response.content_length = 4 * THRESHOLD
+        await response.prepare(request)
+        await response.write(b'a' * 2 * THRESHOLD)
+        await release.wait()  # The rest only comes once the client has the first half
+        await response.write(b'b' * 2 * THRESHOLD)
+        await response.write_eof()
+        return response
+
+    async def run():
+        lb, server, front = await start_proxy(tmp_path, backend)
+        try:
+            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+                async with session.get(front.make_url('/big')) as resp:
+                    assert resp.headers.get('Content-Length') == (str(4 * THRESHOLD) if sized else None)
+                    first = await asyncio.wait_for(resp.content.readexactly(2 * THRESHOLD), 2)
+                    release.set()
+                    rest = await resp.read()
+        finally:
+            release.set()
+            await stop(lb, server, front)
+        assert first == b'a' * 2 * THRESHOLD and rest == b'b' * 2 * THRESHOLD
+    asyncio.run(run())
+
+def test_responses_at_the_threshold_are_buffered(tmp_path):
+    release = asyncio.Event()
+
+    async def backend(request):
+        response = web.StreamResponse()
+        response.content_length = THRESHOLD
+        await response.prepare(request)
+        await response.write(b'a' * (THRESHOLD // 2))
+        await release.wait()
+        await response.write(b'b' * (THRESHOLD // 2))
+        await response.write_eof()
+        return response
+
+    async def run():
+        lb, server, front = await start_proxy(tmp_path, backend)
+        try:
+            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
+                fetch = asyncio.create_task(session.get(front.make_url('/small')))
+                await asyncio.sleep(0.1)
+                assert not fetch.done()  # Nothing is sent until the whole body is in
+                release.set()
+                async with await fetch as resp:
+                    assert resp.headers['Content-Length'] == str(THRESHOLD)
+                    assert await resp.read() == b'a' * (THRESHOLD // 2) + b'b' * (THRESHOLD // 2)
+        finally:
+            release.set()
+            await stop(lb, server, front)
+    asyncio.run(run())
@@ -0,0 +1,160 @@
+import asyncio
+import errno
+import json
+import socket
+
+import pytest
+
+from balancer import LoadBalancer
+from outlier import CLOSED, HALF_OPEN, OPEN, OutlierConfig
+from tcpproxy import TcpConfig, TcpProxy
+from workers import listening_socket
+
+async def echo(reader, writer):
+    while data := await reader.read(1024):
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+def make_balancer(tmp_path, ports, **kwargs):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": port} for port in ports]))
+    return LoadBalancer(str(path), **kwargs)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_bytes_are_spliced_to_a_backend(tmp_path):
+    async def run():
+        backend = await asyncio.start_server(echo, '127.0.0.1', 0)
+        lb = make_balancer(tmp_path, [backend.sockets[0].getsockname()[1]])
+        proxy = TcpProxy(lb)
+        port = free_port()
+        proxy.start('127.0.0.1', port)
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'hello')
+            writer.write_eof()
+            assert await reader.read() == b'hello'
+            writer.close()
+            await asyncio.sleep(0.05)
+            assert proxy.bytes_up == proxy.bytes_down == 5
+            assert lb.servers[lb.get_server_key(list(lb.servers.values())[0])].active_connections == 0
+        finally:
+            await proxy.close()
+            backend.close()
+
+    asyncio.run(run())
+
+def test_failed_backend_connect_tries_another(tmp_path):
+    async def run():
+        backend = await asyncio.start_server(echo, '127.0.0.1', 0)
+        lb = make_balancer(tmp_path, [free_port(), backend.sockets[0].getsockname()[1]])
+        proxy = TcpProxy(lb)
+        port = free_port()
+        proxy.start('127.0.0.1', port)
+        try:
+            for _ in range(2):
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b'x')
+                writer.write_eof()
+                assert await reader.read() == b'x'
+                writer.close()
+            assert proxy.accepted == 2 and proxy.failed >= 1
+        finally:
+            await proxy.close()
+            backend.close()
+
+    asyncio.run(run())
+
+def test_accept_errors_do_not_stop_the_listener(tmp_path):
+    async def run():
+        lb = make_balancer(tmp_path, [1])
+        proxy = TcpProxy(lb, TcpConfig(accept_backoff=0.0))
+        loop = asyncio.get_running_loop()
+        failures = [OSError(errno.EMFILE, 'Too many open files'), ConnectionAbortedError()]
+        retried = asyncio.Event()
+
+        async def sock_accept(listener):
+            if failures:
+                raise failures.pop(0)
+            retried.set()
+            await asyncio.Event().wait()
+
+        loop.sock_accept = sock_accept
+        proxy._accept_task = asyncio.create_task(proxy._accept_loop())
+        await asyncio.wait_for(retried.wait(), 1.0)
+        assert proxy.accept_errors == 2
+        await proxy.close()
+
+    asyncio.run(run())
+
+def test_single_process_bind_fails_on_a_busy_port():
+    port = free_port()
+    first = listening_socket('127.0.0.1', port)
+    try:
+        with pytest.raises(OSError) as error:
+            listening_socket('127.0.0.1', port)
+        assert error.value.errno == errno.EADDRINUSE
+    finally:
+        first.close()
+
+def test_fleet_workers_share_the_port():
+    port = free_port()
+    sockets = [listening_socket('127.0.0.1', port, reuse_port=True) for _ in range(2)]
+    for sock in sockets:
+        sock.close()
+
+async def roundtrip(port, payload=b'x'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(payload)
+    writer.write_eof()
+    data = await reader.read()
+    writer.close()
+    return data
+
+def test_connect_failures_eject_the_backend(tmp_path):
+    async def run():
+        backend = await asyncio.start_server(echo, '127.0.0.1', 0)
+        dead = free_port()
+        lb = make_balancer(tmp_path, [dead, backend.sockets[0].getsockname()[1]],
+                           outlier=OutlierConfig(consecutive_errors=2))
+        proxy = TcpProxy(lb)
+        port = free_port()
+        proxy.start('127.0.0.1', port)
+        try:
+            for _ in range(4):
+                assert await roundtrip(port) == b'x'
+            assert lb.outliers.breakers[f"127.0.0.1:{dead}"].state == OPEN
+            assert f"127.0.0.1:{dead}" not in lb.index
+        finally:
+            await proxy.close()
+            backend.close()
+
+    asyncio.run(run())
+
+def test_half_open_backend_gets_trial_connections(tmp_path):
+    async def run():
+        backends = [await asyncio.start_server(echo, '127.0.0.1', 0) for _ in range(2)]
+        keys = [f"127.0.0.1:{b.sockets[0].getsockname()[1]}" for b in backends]
+        lb = make_balancer(tmp_path, [int(key.split(':')[1]) for key in keys],
+                           outlier=OutlierConfig(consecutive_errors=1, base_ejection=0.0))
+        lb.outliers.record(keys[0], False)
+        lb.outliers.sweep()
+        assert lb.outliers.breakers[keys[0]].state == HALF_OPEN
+        proxy = TcpProxy(lb)
+        port = free_port()
+        proxy.start('127.0.0.1', port)
+        try:
+            for _ in range(lb.outliers.config.half_open_trials):
+                assert await roundtrip(port) == b'x'
+            assert lb.outliers.breakers[keys[0]].state == CLOSED
+            assert keys[0] in lb.index
+        finally:
+            await proxy.close()
+            for backend in backends:
+                backend.close()
+
+    asyncio.run(run())
@@ -0,0 +1,52 @@
+import asyncio
+
+from upstream import BackendPool, UpstreamConfig, UpstreamManager
+
+def test_in_flight_counts_borrowed_sessions():
+    async def run():
+        pool = BackendPool('127.0.0.1', 1, UpstreamConfig())
+        async with pool.session():
+            async with pool.session():
+                assert pool.in_flight == 2
+            assert pool.in_flight == 1
+        assert pool.in_flight == 0
+        await pool.aclose()
+
+    asyncio.run(run())
+
+def test_recycled_idle_generation_is_closed_in_a_referenced_task():
+    async def run():
+        pool = BackendPool('127.0.0.1', 1, UpstreamConfig(max_lifetime=0.0))
+        async with pool.session() as first:
+            pass
+        async with pool.session() as second:
+            assert second is not first
+            assert pool.recycled == 1 and len(pool._closing) == 1
+            await asyncio.gather(*pool._closing)
+            assert first.closed and not pool._closing
+        await pool.aclose()
+
+    asyncio.run(run())
+
+def test_generation_retired_while_busy_closes_after_its_last_request():
+    async def run():
+        pool = BackendPool('127.0.0.1', 1, UpstreamConfig())
+        async with pool.session() as session:
+            pool.close()
+            assert not session.closed and pool.in_flight == 1
+        assert session.closed and pool.in_flight == 0
+
+    asyncio.run(run())
+
+def test_manager_totals():
+    async def run():
+        manager = UpstreamManager()
+        manager.add_pool('127.0.0.1', 1)
+        manager.add_pool('127.0.0.1', 2)
+        async with manager.get_pool('127.0.0.1:1').session():
+            assert manager.get_stats()["in_flight"] == 1
+        manager.remove_pool('127.0.0.1', 2)
+        assert list(manager.pools) == ['127.0.0.1:1']
+        await manager.close()
+
+    asyncio.run(run())
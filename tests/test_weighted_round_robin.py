@@ -0,0 +1,96 @@
+import asyncio
+import json
+from collections import Counter
+
+import pytest
+
+from balancer import BalancingAlgorithm, LoadBalancer
+from selection import SmoothWeightedRoundRobin
+
+def picks(selector, count):
+    return [selector.next() for _ in range(count)]
+
+def test_swrr_is_smooth_and_exact():
+    wrr = SmoothWeightedRoundRobin()
+    wrr.set('a', 5)
+    wrr.set('b', 1)
+    wrr.set('c', 1)
+    cycle = picks(wrr, 7)
+    assert cycle == ['a', 'a', 'b', 'a', 'c', 'a', 'a']  # nginx's sequence for 5:1:1
+    assert Counter(picks(wrr, 70)) == {'a': 50, 'b': 10, 'c': 10}
+
+def test_swrr_reduces_weights_by_gcd():
+    wrr = SmoothWeightedRoundRobin()
+    wrr.set('a', 300)
+    wrr.set('b', 200)
+    assert wrr.cycle_length == 5 and wrr.effective_weight('a') == 3 and wrr.effective_weight('b') == 2
+    reduced = SmoothWeightedRoundRobin()
+    reduced.set('a', 3)
+    reduced.set('b', 2)
+    assert picks(wrr, 10) == picks(reduced, 10)
+    wrr.set('b', 150)  # gcd 150: 2:1
+    assert wrr.cycle_length == 3 and picks(wrr, 3) == ['a', 'b', 'a']
+
+def test_swrr_heap_path_matches_weights(monkeypatch):
+    monkeypatch.setattr(SmoothWeightedRoundRobin, 'PRECOMPUTE_BUDGET', 0)
+    wrr = SmoothWeightedRoundRobin()
+    for key, weight in (('a', 7), ('b', 3), ('c', 1)):
+        wrr.set(key, weight)
+    assert Counter(picks(wrr, 22)) == {'a': 14, 'b': 6, 'c': 2}
+    first = picks(wrr, 11)
+    assert 'c' not in first[:3]  # Spread out, not front-loaded
+
+def test_large_cycle_falls_back_to_the_deadline_heap():
+    wrr = SmoothWeightedRoundRobin()
+    weights = {'a': 50_000, 'b': 30_001, 'c': 1}
+    for key, weight in weights.items():
+        wrr.set(key, weight)
+    assert wrr.cycle_length == 80_002
+    assert len(weights) * wrr.cycle_length > SmoothWeightedRoundRobin.PRECOMPUTE_BUDGET
+    cycle = picks(wrr, wrr.cycle_length)
+    assert wrr._cycle is None and wrr._heap is not None  # Never materialised
+    assert Counter(cycle) == weights
+    assert abs(cycle.index('c') - len(cycle) / 2) < len(cycle) * 0.01  # Its one pick lands mid-cycle
+    assert Counter(picks(wrr, wrr.cycle_length)) == weights  # And again on the next cycle
+
+def test_swrr_weight_change_and_removal():
+    wrr = SmoothWeightedRoundRobin()
+    wrr.set('a', 1)
+    wrr.set('b', 1)
+    wrr.set('b', 3)
+    assert Counter(picks(wrr, 8)) == {'a': 2, 'b': 6}
+    wrr.remove('b')
+    assert picks(wrr, 2) == ['a', 'a']
+    wrr.remove('a')
+    assert wrr.next() is None
+
+class JsonRequest:
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+def test_update_server_endpoint_changes_the_rotation(tmp_path):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "a", "port": 1}, {"host": "b", "port": 2}]))
+    lb = LoadBalancer(str(path), BalancingAlgorithm.WEIGHTED_ROUND_ROBIN)
+    assert Counter(lb.get_next_server().host for _ in range(4)) == {'a': 2, 'b': 2}
+
+    response = asyncio.run(lb.update_server_endpoint(JsonRequest({"host": "a", "port": 1, "weight": 3})))
+    assert response.status == 200 and lb.servers['a:1'].weight == 3
+    assert Counter(lb.get_next_server().host for _ in range(8)) == {'a': 6, 'b': 2}
+
+@pytest.mark.parametrize('data, status', [
+    ({"host": "a", "port": 1}, 400),
+    ({"host": "a", "port": 1, "weight": 0}, 400),
+    ({"host": "a", "port": 1, "weight": 2.5}, 400),
+    ({"host": "a", "port": 1, "weight": True}, 400),
+    ({"host": "z", "port": 9, "weight": 2}, 404),
+])
+def test_update_server_endpoint_rejects_bad_requests(tmp_path, data, status):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "a", "port": 1}]))
+    lb = LoadBalancer(str(path), BalancingAlgorithm.WEIGHTED_ROUND_ROBIN)
+    response = asyncio.run(lb.update_server_endpoint(JsonRequest(data)))
+    assert response.status == status and lb.servers['a:1'].weight == 1
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from balancer import LoadBalancer
+from workers import ACTIVE, ERRORS, REQUESTS, SharedStats, sync_loop
+
+def test_register_reuses_the_slot_of_a_known_key():
+    shared = SharedStats(workers=1, max_servers=2)
+    assert shared.register('a:1') == 0
+    assert shared.register('a:1') == 0
+    assert shared.register('b:2', weight=3) == 1
+    assert shared.members() == {'a:1': 1, 'b:2': 3}
+
+def test_full_table_raises_until_a_slot_is_freed():
+    shared = SharedStats(workers=1, max_servers=2)
+    shared.register('a:1')
+    shared.register('b:2')
+    shared.add('a:1', REQUESTS, 5)
+    with pytest.raises(RuntimeError):
+        shared.register('c:3')
+    shared.unregister('a:1')
+    assert shared.register('c:3') == 0
+    assert shared.total('c:3', REQUESTS) == 0  # A reused slot starts from zero
+    assert shared.members() == {'c:3': 1, 'b:2': 1}
+
+def test_totals_sum_every_workers_column():
+    shared = SharedStats(workers=3)
+    shared.register('a:1')
+    for worker_id, count in enumerate((1, 2, 4)):
+        shared.worker_id = worker_id
+        shared.add('a:1', REQUESTS, count)
+        shared.add('a:1', ACTIVE)
+    shared.add('a:1', ERRORS)
+    assert shared.total('a:1', REQUESTS) == 7
+    assert shared.total('a:1', ACTIVE) == 3
+    assert shared.total('a:1', ERRORS) == 1
+    assert shared.total('unknown:0', REQUESTS) == 0
+
+def test_membership_version_tracks_changes():
+    shared = SharedStats(workers=1)
+    shared.register('a:1')
+    assert shared.changed()
+    shared.members()
+    assert not shared.changed()
+    shared.set_healthy('a:1', False)  # Health is polled, not versioned
+    assert not shared.changed() and shared.is_healthy('a:1') is False
+    shared.set_weight('a:1', 4)
+    assert shared.changed()
+    assert shared.members() == {'a:1': 4} and not shared.changed()
+    shared.unregister('a:1')
+    assert shared.changed() and shared.members() == {}
+
+def test_sync_loop_applies_other_workers_changes(tmp_path):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "a", "port": 1}, {"host": "b", "port": 2}, {"host": "c", "port": 3}]))
+    shared = SharedStats(workers=2)
+    for key in ('a:1', 'b:2', 'c:3'):
+        shared.register(key)
+    lb = LoadBalancer(str(path), shared=shared, run_health_checks=False)
+    shared.members()
+
+    # Another worker adds, removes, re-weights and marks down backends
+    shared.register('d:4', weight=2)
+    shared.unregister('c:3')
+    shared.set_weight('a:1', 5)
+    shared.set_healthy('b:2', False)
+    shared.worker_id = 1
+    shared.add('a:1', ACTIVE, 7)
+    shared.worker_id = 0
+
+    async def run():
+        task = asyncio.create_task(sync_loop(lb, shared, interval=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert sorted(lb.servers) == ['a:1', 'b:2', 'd:4']
+    assert lb.servers['a:1'].weight == 5 and lb.servers['d:4'].weight == 2
+    assert not lb.servers['b:2'].is_healthy and 'b:2' not in lb.index
+    assert lb.index.least_connections.peek() == 'd:4'  # a:1 carries the other worker's 7 connections
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from balancer import LoadBalancer
+from wsproxy import is_websocket
+
+async def echo(request):
+    if request.headers.get('Upgrade', '').lower() != 'websocket':
+        return web.Response(status=403, text='no')
+    ws = web.WebSocketResponse(protocols=('chat',))
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type == aiohttp.WSMsgType.TEXT:
+            await ws.send_str(msg.data.upper())
+        elif msg.type == aiohttp.WSMsgType.BINARY:
+            await ws.send_bytes(msg.data[::-1])
+    return ws
+
+async def refuse(request):
+    return web.Response(status=403, text='no')
+
+async def start(tmp_path, handler):
+    backend_app = web.Application()
+    backend_app.router.add_get('/{tail:.*}', handler)
+    backend = TestServer(backend_app)
+    await backend.start_server()
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{"host": "127.0.0.1", "port": backend.port}]))
+    lb = LoadBalancer(str(path), history=False)
+    front = TestServer(lb.get_app())
+    await front.start_server()
+    return lb, backend, front
+
+def test_is_websocket(make_request):
+    assert is_websocket(make_request(headers={'Connection': 'keep-alive, Upgrade', 'Upgrade': 'websocket'}))
+    assert not is_websocket(make_request(headers={'Connection': 'Upgrade', 'Upgrade': 'h2c'}))
+    assert not is_websocket(make_request(method='POST', headers={'Connection': 'Upgrade', 'Upgrade': 'websocket'}))
+
+def test_frames_are_relayed_both_ways(tmp_path):
+    async def run():
+        lb, backend, front = await start(tmp_path, echo)
+        server = next(iter(lb.servers.values()))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(front.make_url('/ws'), protocols=('chat',)) as ws:
+                    assert ws.protocol == 'chat'
+                    assert server.active_connections == 1
+                    await ws.send_str('hello')
+                    assert (await ws.receive()).data == 'HELLO'
+                    await ws.send_bytes(b'abc')
+                    assert (await ws.receive()).data == b'cba'
+            await asyncio.sleep(0.05)
+            assert server.active_connections == 0
+            stats = lb.websockets.get_stats()
+            assert stats["opened"] == 1 and stats["frames_up"] == 2 and stats["frames_down"] == 2
+        finally:
+            await front.close()
+            await backend.close()
+
+    asyncio.run(run())
+
+def test_backend_refusal_is_passed_back(tmp_path):
+    async def run():
+        lb, backend, front = await start(tmp_path, refuse)
+        try:
+            async with aiohttp.ClientSession() as session:
+                try:
+                    await session.ws_connect(front.make_url('/ws'))
+                except aiohttp.WSServerHandshakeError as e:
+                    assert e.status == 403
+                else:
+                    raise AssertionError('upgrade should have been refused')
+            assert lb.websockets.refused == 1
+            assert next(iter(lb.servers.values())).active_connections == 0
+        finally:
+            await front.close()
+            await backend.close()
+
+    asyncio.run(run())
@@ -0,0 +1,203 @@
+"""
+Long-lived upstream client pools for the load balancer
+"""
+import asyncio
+import aiohttp
+import time
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class UpstreamConfig:
+    max_connections: int = 100     # Per-backend connection cap
+    idle_timeout: float = 30.0     # Seconds an idle keep-alive connection is kept
+    max_lifetime: float = 300.0    # Seconds before a pool generation is recycled
+    connect_timeout: float = 5.0
+    request_timeout: Optional[float] = None
+
+class _Generation:
+    """One ClientSession plus the number of requests still using it"""
+    __slots__ = ('session', 'created', 'in_flight', 'retired')
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.created = time.monotonic()
+        self.in_flight = 0
+        self.retired = False
+
+class BackendPool:
+    """Keep-alive connection pool for a single backend"""
+
+    def __init__(self, host: str, port: int, config: UpstreamConfig):
+        self.host = host
+        self.port = port
+        self.config = config
+        self.hits = 0       # Requests served on a reused keep-alive connection
+        self.misses = 0     # Requests that had to open a new connection
+        self.opened = 0     # Connections successfully established
+        self.recycled = 0   # Generations retired after max_lifetime
+        self._current: Optional[_Generation] = None
+        self._retired: List[_Generation] = []
+        self._closing: Set[asyncio.Task] = set()  # Keeps idle retired sessions' close() referenced
+        self._closed = False
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_reuse(session, ctx, params):
+            self.hits += 1
+
+        async def on_create_start(session, ctx, params):
+            self.misses += 1
+
+        async def on_create_end(session, ctx, params):
+            self.opened += 1
+
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        return trace_config
+
+    def _new_generation(self) -> _Generation:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.max_connections,
+            keepalive_timeout=self.config.idle_timeout,
+            ttl_dns_cache=self.config.max_lifetime,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.request_timeout,
+            sock_connect=self.config.connect_timeout,
+        )
+        # A shared session must not carry one client's cookies into another
+        # client's request, and must relay bodies exactly as the backend sent them
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            auto_decompress=False,
+            trace_configs=[self._trace_config()],
+        )
+        return _Generation(session)
+
+    def _retire(self, generation: _Generation):
+        generation.retired = True
+        if generation.in_flight == 0:
+            task = asyncio.ensure_future(generation.session.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        else:
+            self._retired.append(generation)
+
+    def _generation(self) -> _Generation:
+        if self._closed:
+            raise RuntimeError(f"Upstream pool for {self.host}:{self.port} is closed")
+
+        generation = self._current
+        if generation and time.monotonic() - generation.created > self.config.max_lifetime:
+            # Recycle so connections don't live forever (DNS changes, LB drains)
+            self._retire(generation)
+            self.recycled += 1
+            generation = None
+
+        if generation is None:
+            generation = self._current = self._new_generation()
+        return generation
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrow the pooled session for the duration of one proxied request"""
+        generation = self._generation()
+        generation.in_flight += 1
+        try:
+            yield generation.session
+        finally:
+            generation.in_flight -= 1
+            if generation.retired and generation.in_flight == 0:
+                if generation in self._retired:
+                    self._retired.remove(generation)
+                await generation.session.close()
+
+    def close(self):
+        """Stop handing out sessions; close each one once its requests finish"""
+        self._closed = True
+        if self._current:
+            self._retire(self._current)
+            self._current = None
+
+    async def aclose(self):
+        """Close every session immediately (used on shutdown)"""
+        self._closed = True
+        generations = self._retired + ([self._current] if self._current else [])
+        self._retired = []
+        self._current = None
+        for generation in generations:
+            await generation.session.close()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    @property
+    def in_flight(self) -> int:
+        """Requests using the pool right now; each holds one upstream connection"""
+        total = self._current.in_flight if self._current else 0
+        return total + sum(generation.in_flight for generation in self._retired)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "opened": self.opened,
+            "recycled": self.recycled,
+            "in_flight": self.in_flight,
+            "hit_rate": f"{(self.hits / lookups) if lookups else 0:.2%}",
+        }
+
+class UpstreamManager:
+    """Owns one BackendPool per backend server"""
+
+    def __init__(self, config: Optional[UpstreamConfig] = None):
+        self.config = config or UpstreamConfig()
+        self.pools: Dict[str, BackendPool] = {}
+
+    def add_pool(self, host: str, port: int) -> BackendPool:
+        key = f"{host}:{port}"
+        if key not in self.pools:
+            self.pools[key] = BackendPool(host, port, self.config)
+            logger.info(f"Created upstream pool for {key}")
+        return self.pools[key]
+
+    def remove_pool(self, host: str, port: int):
+        pool = self.pools.pop(f"{host}:{port}", None)
+        if pool:
+            pool.close()
+            logger.info(f"Closed upstream pool for {host}:{port}")
+
+    def get_pool(self, key: str) -> BackendPool:
+        pool = self.pools.get(key)
+        if pool is None:
+            raise KeyError(f"No upstream pool for {key}")
+        return pool
+
+    async def close(self):
+        pools = list(self.pools.values())
+        self.pools.clear()
+        for pool in pools:
+            await pool.aclose()
+
+    def get_stats(self) -> dict:
+        totals = {"hits": 0, "misses": 0, "opened": 0, "in_flight": 0}
+        for pool in self.pools.values():
+            totals["hits"] += pool.hits
+            totals["misses"] += pool.misses
+            totals["opened"] += pool.opened
+            totals["in_flight"] += pool.in_flight
+        totals.update({
+            "max_connections": self.config.max_connections,
+            "idle_timeout": self.config.idle_timeout,
+            "max_lifetime": self.config.max_lifetime,
+        })
+        return totals
@@ -2,6 +2,7 @@ import os
 import sys
 import time
 import signal
+import shlex
 import subprocess
 import socket
 import webbrowser
@@ -9,7 +10,7 @@ import webbrowser
 class WebDashboardDemo:
     def __init__(self):
         self.processes = []
-        self.python_cmd = "/Users/abinas/Desktop/all/code/updated_load_balancer/.venv/bin/python"
+        self.python_cmd = shlex.quote(sys.executable)
         self.port = None
         self.dashboard_url = None
     
@@ -0,0 +1,240 @@
+"""
+Multi-process worker mode: SO_REUSEPORT listeners and shared-memory stats
+"""
+import asyncio
+import mmap
+import multiprocessing
+import os
+import signal
+import socket
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-backend counters aggregated across workers
+ACTIVE, REQUESTS, ERRORS = range(3)
+COUNTER_FIELDS = 3
+
+# Per-slot metadata (int64 each)
+META_IN_USE, META_HEALTHY, META_WEIGHT = range(3)
+META_FIELDS = 3
+
+KEY_SIZE = 64  # Bytes reserved for a "host:port" key
+
+class SharedStats:
+    """Fixed-size shared-memory table of backends, created before forking
+
+    Layout (all int64 except keys):
+      header:   [membership version, next never-used slot]
+      meta:     max_servers x [in_use, healthy, weight]
+      counters: max_servers x workers x [active, requests, errors]
+      keys:     max_servers x KEY_SIZE bytes
+
+    Each worker only ever writes its own counter column, so increments need no
+    locks; readers sum the columns. Membership and health changes are rare and
+    go through a process-shared lock plus the version number.
+    """
+
+    HEADER_FIELDS = 2
+
+    def __init__(self, workers: int, max_servers: int = 1024):
+        self.workers = workers
+        self.max_servers = max_servers
+        self.worker_id = 0
+        ints = self.HEADER_FIELDS + max_servers * META_FIELDS + max_servers * workers * COUNTER_FIELDS
+        self._keys_offset = ints * 8
+        # Anonymous MAP_SHARED memory is inherited by forked children
+        self._buffer = mmap.mmap(-1, self._keys_offset + max_servers * KEY_SIZE)
+        self._ints = memoryview(self._buffer)[:self._keys_offset].cast('q')
+        self._meta_base = self.HEADER_FIELDS
+        self._counter_base = self.HEADER_FIELDS + max_servers * META_FIELDS
+        self._lock = multiprocessing.Lock()
+        self._slots: Dict[str, int] = {}  # This process's view of key -> slot
+        self._seen_version = -1
+
+    # -- layout helpers --
+
+    def _meta(self, slot: int, field: int) -> int:
+        return self._meta_base + slot * META_FIELDS + field
+
+    def _counter(self, slot: int, worker: int, field: int) -> int:
+        return self._counter_base + (slot * self.workers + worker) * COUNTER_FIELDS + field
+
+    def _read_key(self, slot: int) -> str:
+        start = self._keys_offset + slot * KEY_SIZE
+        return self._buffer[start:start + KEY_SIZE].rstrip(b'\0').decode()
+
+    def _write_key(self, slot: int, key: str):
+        encoded = key.encode()
+        if len(encoded) > KEY_SIZE:
+            raise ValueError(f"Server key too long for shared table: {key}")
+        start = self._keys_offset + slot * KEY_SIZE
+        self._buffer[start:start + KEY_SIZE] = encoded.ljust(KEY_SIZE, b'\0')
+
+    @property
+    def version(self) -> int:
+        return self._ints[0]
+
+    # -- membership --
+
+    def register(self, key: str, weight: int = 1) -> int:
+        with self._lock:
+            for slot in range(self._ints[1]):
+                if self._ints[self._meta(slot, META_IN_USE)] and self._read_key(slot) == key:
+                    self._slots[key] = slot
+                    return slot
+            # Prefer never-used slots so stragglers from a removed server's
+            # in-flight requests can't land in a freshly reused slot
+            slot = self._ints[1]
+            if slot < self.max_servers:
+                self._ints[1] = slot + 1
+            else:
+                free = [s for s in range(self.max_servers) if not self._ints[self._meta(s, META_IN_USE)]]
+                if not free:
+                    raise RuntimeError("Shared server table is full")
+                slot = free[0]
+            for worker in range(self.workers):
+                for field in range(COUNTER_FIELDS):
+                    self._ints[self._counter(slot, worker, field)] = 0
+            self._write_key(slot, key)
+            self._ints[self._meta(slot, META_HEALTHY)] = 1
+            self._ints[self._meta(slot, META_WEIGHT)] = weight
+            self._ints[self._meta(slot, META_IN_USE)] = 1
+            self._ints[0] += 1
+            self._slots[key] = slot
+            return slot
+
+    def unregister(self, key: str):
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is not None:
+                self._ints[self._meta(slot, META_IN_USE)] = 0
+                self._ints[0] += 1
+
+    def members(self) -> Dict[str, int]:
+        """Current key -> weight table; also refreshes this process's slot map"""
+        with self._lock:
+            slots = {}
+            weights = {}
+            for slot in range(self._ints[1]):
+                if self._ints[self._meta(slot, META_IN_USE)]:
+                    key = self._read_key(slot)
+                    slots[key] = slot
+                    weights[key] = self._ints[self._meta(slot, META_WEIGHT)]
+            self._slots = slots
+            self._seen_version = self._ints[0]
+            return weights
+
+    def changed(self) -> bool:
+        return self._ints[0] != self._seen_version
+
+    def set_weight(self, key: str, weight: int):
+        slot = self._slots.get(key)
+        if slot is not None:
+            with self._lock:
+                self._ints[self._meta(slot, META_WEIGHT)] = weight
+                self._ints[0] += 1
+
+    # -- health --
+
+    def set_healthy(self, key: str, healthy: bool):
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._ints[self._meta(slot, META_HEALTHY)] = 1 if healthy else 0
+
+    def is_healthy(self, key: str) -> Optional[bool]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        return bool(self._ints[self._meta(slot, META_HEALTHY)])
+
+    # -- counters --
+
+    def add(self, key: str, field: int, delta: int = 1):
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._ints[self._counter(slot, self.worker_id, field)] += delta
+
+    def total(self, key: str, field: int) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            return 0
+        start = self._counter(slot, 0, field)
+        return sum(self._ints[start:start + self.workers * COUNTER_FIELDS:COUNTER_FIELDS])
+
+async def sync_loop(lb, shared: SharedStats, interval: float = 0.1):
+    """Apply other workers' membership, weight and health changes and fleet-wide connection counts"""
+    while True:
+        if shared.changed():
+            weights = shared.members()
+            for key, weight in weights.items():
+                host, _, port = key.rpartition(':')
+                if key not in lb.servers:
+                    lb.add_server(host, int(port), weight, publish=False)
+                elif lb.servers[key].weight != weight:
+                    lb.set_server_weight(host, int(port), weight, publish=False)
+            for key in list(lb.servers):
+                if key not in weights:
+                    server = lb.servers[key]
+                    lb.remove_server(server.host, server.port, publish=False)
+
+        for key, server in lb.servers.items():
+            healthy = shared.is_healthy(key)
+            if healthy is not None and healthy != server.is_healthy:
+                lb.set_server_health(server, healthy, publish=False)
+            if key in lb.index:
+                lb.index.update_connections(key, shared.total(key, ACTIVE))
+
+        await asyncio.sleep(interval)
+
+def listening_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    """Non-blocking listener; reuse_port is for the workers of one fleet, so a busy port still fails otherwise"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Every worker binds the same port; the kernel spreads connections across them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+def run_workers(workers: int, make_app: Callable, host: str, port: int, shared: SharedStats):
+    """Fork `workers` processes, each serving make_app(worker_id) on a SO_REUSEPORT socket"""
+    from aiohttp import web
+
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("SO_REUSEPORT is not available on this platform")
+
+    children = []
+    for worker_id in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            shared.worker_id = worker_id
+            shared.members()
+            app = make_app(worker_id)
+            sock = listening_socket(host, port, reuse_port=True)
+            logger.info(f"Worker {worker_id} (pid {os.getpid()}) serving on {host}:{port}")
+            web.run_app(app, sock=sock, print=None)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
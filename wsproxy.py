@@ -0,0 +1,188 @@
+"""
+WebSocket proxying: handshake with the backend, then relay frames both ways
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Set
+
+import aiohttp
+from aiohttp import WSMsgType, web
+from multidict import CIMultiDict
+
+logger = logging.getLogger(__name__)
+
+# Handshake headers each side negotiates for itself; the rest are forwarded
+HANDSHAKE_HEADERS = frozenset({
+    'host', 'upgrade', 'connection', 'sec-websocket-key', 'sec-websocket-version',
+    'sec-websocket-extensions', 'sec-websocket-protocol', 'content-length',
+})
+
+GOING_AWAY = aiohttp.WSCloseCode.GOING_AWAY
+
+@dataclass
+class WebSocketConfig:
+    idle_timeout: float = 300.0          # Close a tunnel after this long with no frames either way
+    drain_timeout: float = 5.0           # Seconds shutdown waits for tunnels to close cleanly
+    connect_timeout: float = 5.0
+    max_message_bytes: int = 4 * 1024 * 1024
+
+def is_websocket(request: web.Request) -> bool:
+    connection = {token.strip().lower() for token in request.headers.get('Connection', '').split(',')}
+    return (request.method == 'GET' and 'upgrade' in connection
+            and request.headers.get('Upgrade', '').lower() == 'websocket')
+
+class _Tunnel:
+    __slots__ = ('client', 'backend', 'last_activity', 'task')
+
+    def __init__(self, client: web.WebSocketResponse, backend: aiohttp.ClientWebSocketResponse):
+        self.client = client
+        self.backend = backend
+        self.last_activity = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+class WebSocketProxy:
+    """Relays WebSocket connections to backends
+
+    The backend handshake happens first, so a refusal is passed back to the
+    client as a plain HTTP error and the client is only upgraded once the
+    backend has accepted (with the subprotocol it picked). Frames are then
+    relayed as they arrive: payloads are handed over as-is, and each send is
+    awaited, so a slow reader stalls its writer instead of growing a buffer.
+    Pings, pongs and close codes pass through. Tunnels use their own client
+    session so long-lived connections never hold the keep-alive pools' slots.
+    """
+
+    def __init__(self, config: Optional[WebSocketConfig] = None):
+        self.config = config or WebSocketConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tunnels: Set[_Tunnel] = set()
+        self.opened = 0
+        self.refused = 0
+        self.idle_closed = 0
+        self.frames_up = 0
+        self.frames_down = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+
+    def __len__(self) -> int:
+        return len(self._tunnels)
+
+    def _client_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.config.connect_timeout),
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+        return self._session
+
+    async def connect(self, request: web.Request, url: str, headers: CIMultiDict) -> aiohttp.ClientWebSocketResponse:
+        """Open the backend side; raises aiohttp.WSServerHandshakeError if it refuses"""
+        forwarded = CIMultiDict((name, value) for name, value in headers.items()
+                                if name.lower() not in HANDSHAKE_HEADERS)
+        protocols = [p.strip() for p in request.headers.get('Sec-WebSocket-Protocol', '').split(',') if p.strip()]
+        try:
+            return await self._client_session().ws_connect(
+                url, headers=forwarded, protocols=protocols, autoping=False,
+                max_msg_size=self.config.max_message_bytes)
+        except aiohttp.WSServerHandshakeError:
+            self.refused += 1
+            raise
+
+    def accept(self, backend: aiohttp.ClientWebSocketResponse) -> web.WebSocketResponse:
+        """Client-side response agreeing to the subprotocol the backend picked"""
+        return web.WebSocketResponse(protocols=(backend.protocol,) if backend.protocol else (),
+                                     autoping=False, max_msg_size=self.config.max_message_bytes)
+
+    async def relay(self, request: web.Request, backend: aiohttp.ClientWebSocketResponse,
+                    response: web.WebSocketResponse) -> web.WebSocketResponse:
+        """Upgrade the client with `response` and relay frames until either side closes"""
+        await response.prepare(request)
+        tunnel = _Tunnel(response, backend)
+        tunnel.task = asyncio.current_task()
+        self._tunnels.add(tunnel)
+        self.opened += 1
+        pumps = [asyncio.create_task(self._pump(tunnel, response, backend, upstream=True)),
+                 asyncio.create_task(self._pump(tunnel, backend, response, upstream=False))]
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            self._tunnels.discard(tunnel)
+            await backend.close()
+            await response.close()
+        return response
+
+    async def _pump(self, tunnel: _Tunnel, source, sink, upstream: bool):
+        """Copy frames from source to sink; returns when source closes or the tunnel goes idle"""
+        idle_timeout = self.config.idle_timeout or None
+        while True:
+            try:
+                msg = await source.receive(timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                if time.monotonic() - tunnel.last_activity < idle_timeout:
+                    continue  # The other direction is still busy
+                self.idle_closed += 1
+                await sink.close(code=GOING_AWAY, message=b'Idle timeout')
+                return
+            tunnel.last_activity = time.monotonic()
+            kind = msg.type
+            if kind == WSMsgType.TEXT:
+                await sink.send_str(msg.data)
+                size = len(msg.data)
+            elif kind == WSMsgType.BINARY:
+                await sink.send_bytes(msg.data)
+                size = len(msg.data)
+            elif kind == WSMsgType.PING:
+                await sink.ping(msg.data)
+                size = len(msg.data)
+            elif kind == WSMsgType.PONG:
+                await sink.pong(msg.data)
+                size = len(msg.data)
+            elif kind == WSMsgType.CLOSE:
+                await sink.close(code=msg.data or aiohttp.WSCloseCode.OK, message=(msg.extra or '').encode())
+                return
+            else:  # CLOSING, CLOSED or ERROR: nothing more will arrive
+                return
+            if upstream:
+                self.frames_up += 1
+                self.bytes_up += size
+            else:
+                self.frames_down += 1
+                self.bytes_down += size
+
+    async def close(self):
+        """Ask every tunnel to close (1001 both ways) and wait up to drain_timeout for them"""
+        async def going_away(side):
+            try:
+                await side.close(code=GOING_AWAY, message=b'Server shutdown')
+            except Exception:
+                pass
+
+        tunnels = list(self._tunnels)
+        waits = [asyncio.ensure_future(going_away(side)) for tunnel in tunnels
+                 for side in (tunnel.client, tunnel.backend)]
+        waits.extend(tunnel.task for tunnel in tunnels if tunnel.task is not None)
+        if waits:
+            _, pending = await asyncio.wait(waits, timeout=self.config.drain_timeout)
+            for task in pending:
+                task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def get_stats(self) -> dict:
+        return {
+            "active": len(self._tunnels),
+            "opened": self.opened,
+            "refused": self.refused,
+            "idle_closed": self.idle_closed,
+            "frames_up": self.frames_up,
+            "frames_down": self.frames_down,
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "idle_timeout": self.config.idle_timeout,
+        }